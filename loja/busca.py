@@ -0,0 +1,190 @@
+"""
+Índice de busca de produtos.
+
+Mantém uma tabela de termos (TermoBusca) com os tokens normalizados de
+nome e descrição de cada produto. A busca casa cada palavra digitada por
+prefixo (LIKE 'abc%', que usa o índice do banco) em vez de varrer a tabela
+de produtos com `nome__icontains`.
+"""
+import hashlib
+import re
+import unicodedata
+import uuid
+from collections import Counter
+
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import Produto, TermoBusca
+
+# 🔹 Peso de cada campo na relevância
+PESO_NOME = 3
+PESO_DESCRICAO = 1
+
+TAMANHO_MAX_TERMO = TermoBusca._meta.get_field("termo").max_length
+TAMANHO_MIN_PREFIXO = 2
+
+# 🔹 Cache do autocomplete
+LIMITE_AUTOCOMPLETE = 10
+CHAVE_VERSAO_CATALOGO = "busca:versao_catalogo"
+
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "na", "no",
+    "nas", "nos", "um", "uma", "com", "por", "para", "pra", "sem", "ao", "aos",
+}
+
+_RE_TOKEN = re.compile(r"\w+")
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'Almôndega' → 'almondega'."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return texto.lower()
+
+
+def tokenizar(texto):
+    """Quebra o texto em termos normalizados, ignorando stopwords."""
+    return [
+        token[:TAMANHO_MAX_TERMO]
+        for token in _RE_TOKEN.findall(normalizar(texto))
+        if token not in STOPWORDS
+    ]
+
+
+def _termos_do_produto(produto):
+    pesos = Counter()
+    for token in tokenizar(produto.nome):
+        pesos[token] += PESO_NOME
+    for token in tokenizar(produto.descricao):
+        pesos[token] += PESO_DESCRICAO
+
+    return [
+        TermoBusca(produto_id=produto.pk, termo=termo, peso=peso)
+        for termo, peso in pesos.items()
+    ]
+
+
+def indexar_produto(produto):
+    """Reescreve os termos de um único produto (chamado pelo Produto.save)."""
+    with transaction.atomic():
+        TermoBusca.objects.filter(produto_id=produto.pk).delete()
+        TermoBusca.objects.bulk_create(_termos_do_produto(produto))
+
+
+def reindexar(produtos=None, lote=1000):
+    """
+    Reconstrói o índice inteiro (ou só dos produtos informados) em lotes.
+    Retorna a quantidade de produtos indexados.
+    """
+    if produtos is None:
+        produtos = Produto.objects.all()
+    produtos = produtos.only("id", "nome", "descricao").order_by("id")
+
+    total = 0
+    with transaction.atomic():
+        TermoBusca.objects.filter(produto__in=produtos.values("id")).delete()
+
+        termos = []
+        for produto in produtos.iterator(chunk_size=lote):
+            termos.extend(_termos_do_produto(produto))
+            total += 1
+            if len(termos) >= lote:
+                TermoBusca.objects.bulk_create(termos)
+                termos = []
+        TermoBusca.objects.bulk_create(termos)
+
+    return total
+
+
+def _prefixo(token, campo="termo"):
+    """
+    Casa termos que começam com `token`.
+    O intervalo [token, token + U+FFFF) deixa qualquer banco usar o índice de `termo`
+    (o LIKE do SQLite ignora maiúsculas e não usa índice); o startswith garante o resultado.
+    """
+    return Q(**{
+        f"{campo}__gte": token,
+        f"{campo}__lt": token + "\uffff",
+        f"{campo}__startswith": token,
+    })
+
+
+def buscar(queryset, texto):
+    """
+    Filtra `queryset` (de Produto) pelos termos digitados e ordena por relevância.
+
+    - Todas as palavras precisam casar (E lógico), cada uma por prefixo.
+    - Relevância = soma dos pesos dos termos casados (nome pesa mais que descrição).
+    - Palavras de 1 letra são ignoradas quando há outras (ex.: "almondega c" durante a digitação).
+    - Se o texto só tiver stopwords, cai no filtro antigo por nome.
+    """
+    tokens = tokenizar(texto)
+    tokens = [t for t in tokens if len(t) >= TAMANHO_MIN_PREFIXO] or tokens
+    if not tokens:
+        return queryset.filter(nome__icontains=texto.strip())
+
+    casados = Q()
+    for token in tokens:
+        queryset = queryset.filter(
+            id__in=TermoBusca.objects.filter(_prefixo(token)).values("produto_id")
+        )
+        casados |= _prefixo(token, "termos_busca__termo")
+
+    return queryset.annotate(
+        relevancia=Sum("termos_busca__peso", filter=casados)
+    ).order_by("-relevancia", "-id")
+
+
+# -------------------------------
+# 🔧 CACHE DO AUTOCOMPLETE
+# -------------------------------
+
+def versao_catalogo():
+    """
+    Versão atual do catálogo. Faz parte de toda chave do autocomplete,
+    então trocar a versão invalida todas as respostas de uma vez.
+    """
+    versao = cache.get(CHAVE_VERSAO_CATALOGO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO_CATALOGO, uuid.uuid4().hex[:12], timeout=None)
+        versao = cache.get(CHAVE_VERSAO_CATALOGO)
+    return versao
+
+
+def invalidar_catalogo():
+    """Chamado quando nome, descrição, imagem ou ativo de algum produto mudam."""
+    cache.set(CHAVE_VERSAO_CATALOGO, uuid.uuid4().hex[:12], timeout=None)
+
+
+def chave_autocomplete(texto, versao=None):
+    """Chave pelo texto normalizado: 'Almô' e 'almo' usam a mesma entrada."""
+    normalizado = " ".join(tokenizar(texto)) or normalizar(texto).strip()
+    resumo = hashlib.md5(normalizado.encode()).hexdigest()
+    return f"{versao or versao_catalogo()}:{resumo}"
+
+
+def autocomplete(texto):
+    """
+    Resultados do autocomplete (lista de dicts prontos para JSON).
+    Fica no cache "autocomplete" (LRU com MAX_ENTRIES, ver settings.CACHES).
+    """
+    cache_autocomplete = caches["autocomplete"]
+    chave = chave_autocomplete(texto)
+
+    resultados = cache_autocomplete.get(chave)
+    if resultados is None:
+        produtos = buscar(Produto.objects.filter(ativo=True), texto)[:LIMITE_AUTOCOMPLETE]
+        resultados = [
+            {
+                "id": p.id,
+                "nome": p.nome,
+                "imagem": p.imagem.url if p.imagem else None,
+                "url": f"/produto/{p.id}/",
+            }
+            for p in produtos
+        ]
+        cache_autocomplete.set(chave, resultados)
+
+    return resultados
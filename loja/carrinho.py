@@ -0,0 +1,168 @@
+"""
+Carrinho do visitante anônimo, guardado na sessão.
+
+A sessão guarda `{produto_id (str): {"nome", "preco_unitario", "quantidade", "imagem"}}`.
+Os produtos de todas as entradas são lidos numa consulta (`in_bulk`) e, no
+login, o carrinho da sessão é mesclado ao do banco com um `bulk_create` e um
+`bulk_update` — o custo não cresce com a quantidade de itens.
+
+O "adicionar" do usuário logado (`adicionar_unidade`) soma no banco, com a
+chave única (carrinho, produto) e o disponível da linha do produto: cliques
+simultâneos não duplicam o item nem perdem unidades, e a quantidade nunca
+passa do disponível.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+
+from .models import Carrinho, ItemCarrinho, Produto
+
+
+def produtos_da_sessao(carrinho_sessao):
+    """{produto_id (str): Produto} dos produtos que ainda existem, numa consulta só."""
+    ids = [int(produto_id) for produto_id in carrinho_sessao if str(produto_id).isdigit()]
+    return {str(pk): produto for pk, produto in Produto.objects.in_bulk(ids).items()}
+
+
+@transaction.atomic
+def mesclar_carrinho_sessao(carrinho_sessao, usuario):
+    """
+    Soma as quantidades da sessão ao carrinho do usuário (cria os itens que
+    faltam com o preço atual do produto) e recalcula `valor_total` e
+    `total_itens`. Retorna a quantidade total de unidades no carrinho.
+    """
+    carrinho, _ = Carrinho.objects.get_or_create(usuario=usuario)
+    itens = {item.produto_id: item for item in carrinho.itemcarrinho_set.all()}
+
+    novos, alterados = [], []
+    for produto_id, produto in produtos_da_sessao(carrinho_sessao).items():
+        quantidade = carrinho_sessao[produto_id]["quantidade"]
+        item = itens.get(produto.pk)
+        if item:
+            item.quantidade += quantidade
+            alterados.append(item)
+        else:
+            item = ItemCarrinho(
+                carrinho=carrinho, produto=produto, quantidade=quantidade, preco_unitario=produto.preco,
+            )
+            itens[produto.pk] = item
+            novos.append(item)
+
+    if novos:
+        ItemCarrinho.objects.bulk_create(novos)
+    if alterados:
+        ItemCarrinho.objects.bulk_update(alterados, ["quantidade"])
+
+    total = sum((item.subtotal() for item in itens.values()), Decimal("0.00"))
+    total_itens = sum(item.quantidade for item in itens.values())
+    if (carrinho.valor_total, carrinho.total_itens) != (total, total_itens):
+        carrinho.valor_total, carrinho.total_itens = total, total_itens
+        carrinho.save(update_fields=["valor_total", "total_itens"])
+    return total_itens
+
+
+# -------------------------------
+# 🔧 ADICIONAR (USUÁRIO LOGADO)
+# -------------------------------
+
+# 🔹 Um comando só: cria o item com 1 unidade ou soma +1 ao que já existe, lendo
+# preço e disponível da linha do produto. O SELECT não devolve linha quando o
+# item já está no limite (ou o produto não tem estoque), e o rowcount fica 0.
+_SELECIONAR = (
+    "INSERT INTO {item} (carrinho_id, produto_id, quantidade, preco_unitario, data_adicionado) "
+    "SELECT %s, p.id, 1, p.preco, %s FROM {produto} p "
+    "WHERE p.id = %s AND p.quantidade - p.reservado > COALESCE("
+    "(SELECT i.quantidade FROM {item} i WHERE i.carrinho_id = %s AND i.produto_id = p.id), 0) "
+)
+_UPSERT = {
+    # rowcount 1 (criou) ou 2 (somou). O LEAST segura dois cliques que leram o
+    # mesmo item antes do limite: o segundo não passa do disponível.
+    "mysql": _SELECIONAR + (
+        "ON DUPLICATE KEY UPDATE quantidade = LEAST({item}.quantidade + 1, p.quantidade - p.reservado)"
+    ),
+    # rowcount 1 (criou ou somou); o WHERE é conferido com a linha do item travada
+    "postgresql": _SELECIONAR + (
+        "ON CONFLICT (carrinho_id, produto_id) DO UPDATE SET quantidade = {item}.quantidade + 1 "
+        "WHERE {item}.quantidade < (SELECT quantidade - reservado FROM {produto} WHERE id = excluded.produto_id)"
+    ),
+    "sqlite": _SELECIONAR + (
+        "ON CONFLICT (carrinho_id, produto_id) DO UPDATE SET quantidade = {item}.quantidade + 1 "
+        "WHERE {item}.quantidade < (SELECT quantidade - reservado FROM {produto} WHERE id = excluded.produto_id)"
+    ),
+}
+
+
+def _upsert_unidade(sql, carrinho_id, produto_id):
+    """Roda o upsert do banco. Retorna se criou ou somou uma unidade."""
+    sql = sql.format(
+        item=connection.ops.quote_name(ItemCarrinho._meta.db_table),
+        produto=connection.ops.quote_name(Produto._meta.db_table),
+    )
+    agora = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [carrinho_id, agora, produto_id, carrinho_id])
+        return cursor.rowcount > 0
+
+
+def _somar_unidade(carrinho_id, produto_id):
+    """+1 no item se ainda couber no disponível da linha do produto. Retorna se somou."""
+    disponivel = Produto.objects.filter(pk=produto_id).values(disponivel=F("quantidade") - F("reservado"))
+    return bool(
+        ItemCarrinho.objects
+        .filter(carrinho_id=carrinho_id, produto_id=produto_id, quantidade__lt=Subquery(disponivel))
+        .update(quantidade=F("quantidade") + 1)
+    )
+
+
+def _inserir_item(carrinho_id, produto_id):
+    """Cria o item com 1 unidade se houver disponível e ele ainda não existir. Retorna se criou."""
+    produto = Produto.objects.select_for_update().filter(pk=produto_id).only("preco", "quantidade", "reservado").first()
+    if produto is None or produto.disponivel < 1:
+        return False
+    try:
+        with transaction.atomic():
+            ItemCarrinho.objects.create(
+                carrinho_id=carrinho_id, produto=produto, quantidade=1, preco_unitario=produto.preco,
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def adicionar_unidade(usuario, produto):
+    """
+    Põe mais uma unidade de `produto` no carrinho do usuário, limitada ao
+    disponível (quantidade - reservado) lido da linha do produto no próprio
+    comando, nunca de um objeto em memória:
+    - MySQL, PostgreSQL e SQLite: um INSERT ... SELECT com upsert na chave
+      única (carrinho, produto), que cria o item ou soma +1;
+    - outros bancos: UPDATE do item, senão INSERT com o produto travado, e o
+      UPDATE de novo se outro clique criou o item no meio.
+
+    "Adicionado" vem do rowcount desses comandos, e só então os contadores do
+    Carrinho recebem +1 unidade e o preço do item, por delta, na mesma transação.
+
+    Retorna (adicionado, total_itens): `adicionado` é False quando o item já
+    estava no limite do disponível (ou o produto não tem estoque).
+    """
+    carrinho_id = Carrinho.objects.filter(usuario=usuario).values_list("pk", flat=True).first()
+    if carrinho_id is None:
+        carrinho_id = Carrinho.objects.get_or_create(usuario=usuario)[0].pk
+
+    sql = _UPSERT.get(connection.vendor)
+    with transaction.atomic():
+        if sql is not None:
+            adicionado = _upsert_unidade(sql, carrinho_id, produto.pk)
+        else:
+            adicionado = (
+                _somar_unidade(carrinho_id, produto.pk)
+                or _inserir_item(carrinho_id, produto.pk)
+                or _somar_unidade(carrinho_id, produto.pk)
+            )
+        if adicionado:
+            preco = ItemCarrinho.objects.filter(carrinho_id=carrinho_id, produto_id=produto.pk).values("preco_unitario")
+            Carrinho.aplicar_delta(carrinho_id, 1, Subquery(preco))
+        total_itens = Carrinho.objects.filter(pk=carrinho_id).values_list("total_itens", flat=True).get()
+    return adicionado, total_itens
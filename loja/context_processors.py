@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import Carrinho
+
+
+def carrinho(request):
+    """
+    `carrinho_itens` para o contador da navbar, sem escrever na sessão:
+    - logado: `Carrinho.total_itens` (uma consulta, só se o template usar);
+    - anônimo: soma das quantidades do carrinho guardado na sessão.
+    """
+    def contar():
+        usuario = getattr(request, "user", None)
+        if usuario is not None and usuario.is_authenticated:
+            return Carrinho.objects.filter(usuario=usuario).values_list("total_itens", flat=True).first() or 0
+        return sum(item["quantidade"] for item in request.session.get("carrinho", {}).values())
+
+    return {"carrinho_itens": SimpleLazyObject(contar)}
@@ -0,0 +1,243 @@
+"""
+Movimentação de estoque.
+
+As quantidades mudam sempre no banco (`quantidade = quantidade ± n`) com as
+linhas travadas por `select_for_update`, nunca por "ler, somar em Python e
+salvar". Cada mudança gera a MovimentacaoEstoque com o saldo resultante.
+
+Estas funções não passam por `Produto.save()`, então repetem aqui o que ele
+faria: `atualizado_em`, inativar o produto que zerou e avisar a busca
+(`invalidar_catalogo`) quando algum produto sai da vitrine.
+
+Reservas: no checkout as unidades do pedido ficam presas em `Produto.reservado`
+(uma ReservaEstoque por item, com validade). O disponível para venda é
+`quantidade - reservado`. Ao pagar, a reserva é liberada e vira a baixa normal;
+ao cancelar ou vencer (comando `liberar_reservas`), só é liberada.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .exportacao import invalidar_relatorios
+from .models import MovimentacaoEstoque, Produto, ReservaEstoque
+
+
+class EstoqueInsuficiente(Exception):
+    """
+    Saída maior que o saldo. `faltas` traz, por produto, o que havia e o que
+    foi pedido: [{"produto_id", "produto", "disponivel", "necessario"}].
+    """
+
+    def __init__(self, faltas):
+        self.faltas = faltas
+        super().__init__(", ".join(falta["produto"] for falta in faltas))
+
+
+def ler_ajustes(post, observacao_global=""):
+    """
+    [(produto_id, quantidade, observação)] a partir dos campos `qtd_<id>`
+    preenchidos com um inteiro positivo; a observação é `obs_<id>` ou a global.
+    """
+    ajustes = []
+    for campo, valor in post.items():
+        if not campo.startswith("qtd_"):
+            continue
+        try:
+            produto_id = int(campo[4:])
+            quantidade = int((valor or "").strip())
+        except ValueError:
+            continue
+        if quantidade <= 0:
+            continue
+        observacao = (post.get(f"obs_{produto_id}") or "").strip() or observacao_global
+        ajustes.append((produto_id, quantidade, observacao))
+    return ajustes
+
+
+def _somar(campo, deltas):
+    """`campo + delta` de cada produto, com um WHEN por valor de delta (não por produto)."""
+    por_delta = defaultdict(list)
+    for produto_id, delta in deltas.items():
+        por_delta[delta].append(produto_id)
+    return F(campo) + Case(
+        *[When(pk__in=ids, then=Value(delta)) for delta, ids in por_delta.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _aplicar_deltas(deltas):
+    """
+    Um UPDATE com `quantidade = quantidade + delta` para todos os produtos e
+    outro que inativa quem zerou — a mesma regra do `Produto.save()`. As
+    linhas devem estar travadas.
+    """
+    if not deltas:
+        return
+
+    produtos = Produto.objects.filter(pk__in=deltas)
+    produtos.update(quantidade=_somar("quantidade", deltas), atualizado_em=timezone.now())
+    if produtos.filter(quantidade__lte=0, ativo=True).update(ativo=False):
+        from .busca import invalidar_catalogo
+        invalidar_catalogo()
+
+
+def _travar(produto_ids):
+    """Trava os produtos e devolve [(pk, quantidade, reservado)]."""
+    return list(
+        Produto.objects.select_for_update()
+        .filter(pk__in=produto_ids)
+        .order_by("pk")  # trava sempre na mesma ordem: dois lotes não se bloqueiam em cruz
+        .values_list("pk", "quantidade", "reservado")
+    )
+
+
+def _conferir(necessario, disponiveis):
+    """Levanta EstoqueInsuficiente se algum produto precisa de mais do que tem disponível."""
+    faltando = {pk: total for pk, total in necessario.items() if disponiveis[pk] < total}
+    if faltando:
+        nomes = dict(Produto.objects.filter(pk__in=faltando).values_list("pk", "nome"))
+        raise EstoqueInsuficiente([
+            {"produto_id": pk, "produto": nomes[pk], "disponivel": disponiveis[pk], "necessario": total}
+            for pk, total in faltando.items()
+        ])
+
+
+@transaction.atomic
+def movimentar(movimentos, tipo, limitar_a_zero=False):
+    """
+    Registra entradas (`tipo="entrada"`) ou saídas (qualquer outro tipo, ex.:
+    "saida") de estoque. `movimentos` é uma lista de (produto_id, quantidade,
+    observação); o mesmo produto pode aparecer mais de uma vez.
+
+    Os produtos são travados (select_for_update) antes de ler o saldo, então
+    dois admins mexendo no mesmo produto esperam um pelo outro em vez de
+    perder uma das alterações. Uma saída não pode consumir unidades reservadas
+    para outros pedidos; se alguma passaria do disponível:
+    - `limitar_a_zero=False`: levanta EstoqueInsuficiente e nada muda;
+    - `limitar_a_zero=True`: baixa só o que houver (pagamento confirmado à força).
+
+    Retorna as MovimentacaoEstoque criadas, cada uma com o saldo resultante em
+    `estoque_final`. Produtos inexistentes são ignorados.
+    """
+    sinal = 1 if tipo == "entrada" else -1
+    travados = _travar({produto_id for produto_id, _, _ in movimentos})
+    saldos = {pk: quantidade for pk, quantidade, _ in travados}
+
+    if sinal < 0 and not limitar_a_zero:
+        necessario = defaultdict(int)
+        for produto_id, quantidade, _ in movimentos:
+            if produto_id in saldos:
+                necessario[produto_id] += quantidade
+        disponiveis = {pk: max(quantidade - reservado, 0) for pk, quantidade, reservado in travados}
+        _conferir(necessario, disponiveis)
+
+    # 🔹 Linhas travadas: o saldo de cada movimentação é o lido + deltas anteriores, sem reler
+    registros = []
+    deltas = defaultdict(int)
+    for produto_id, quantidade, observacao in movimentos:
+        if produto_id not in saldos:
+            continue
+        if sinal < 0:
+            quantidade = min(quantidade, saldos[produto_id])
+        if quantidade <= 0:
+            continue
+        saldos[produto_id] += sinal * quantidade
+        deltas[produto_id] += sinal * quantidade
+        registros.append(MovimentacaoEstoque(
+            produto_id=produto_id,
+            tipo=tipo,
+            quantidade=quantidade,
+            estoque_final=saldos[produto_id],
+            observacao=observacao,
+        ))
+
+    _aplicar_deltas(deltas)
+    if registros:
+        invalidar_relatorios(Produto, MovimentacaoEstoque)  # bulk_create/update() não disparam sinais
+    return MovimentacaoEstoque.objects.bulk_create(registros, batch_size=1000)
+
+
+# -------------------------------
+# 🔧 RESERVAS
+# -------------------------------
+
+@transaction.atomic
+def reservar(pedido, itens):
+    """
+    Prende no estoque as unidades de um pedido recém-criado. `itens` é uma
+    lista de (produto_id, quantidade). Tudo ou nada: se algum produto não tem
+    disponível (quantidade - reservado) suficiente, levanta EstoqueInsuficiente
+    e nada é reservado. Retorna as ReservaEstoque criadas.
+    """
+    necessario = defaultdict(int)
+    for produto_id, quantidade in itens:
+        if quantidade > 0:
+            necessario[produto_id] += quantidade
+
+    travados = _travar(necessario)
+    disponiveis = {pk: max(quantidade - reservado, 0) for pk, quantidade, reservado in travados}
+    necessario = {pk: total for pk, total in necessario.items() if pk in disponiveis}
+    _conferir(necessario, disponiveis)
+    if not necessario:
+        return []
+
+    Produto.objects.filter(pk__in=necessario).update(reservado=_somar("reservado", necessario))
+    expira_em = timezone.now() + timedelta(seconds=getattr(settings, "RESERVA_ESTOQUE_VALIDADE", 24 * 3600))
+    return ReservaEstoque.objects.bulk_create([
+        ReservaEstoque(pedido=pedido, produto_id=produto_id, quantidade=quantidade, expira_em=expira_em)
+        for produto_id, quantidade in necessario.items()
+    ])
+
+
+@transaction.atomic
+def liberar_reservas(reservas):
+    """
+    Devolve ao disponível as reservas do queryset e as apaga. Retorna
+    quantas foram liberadas.
+    """
+    produto_ids = set(reservas.values_list("produto_id", flat=True))
+    if not produto_ids:
+        return 0
+
+    _travar(produto_ids)
+    # Relê com os produtos já travados: outra liberação pode ter levado parte delas
+    linhas = list(
+        ReservaEstoque.objects.filter(pk__in=list(reservas.values_list("pk", flat=True)))
+        .values_list("pk", "produto_id", "quantidade")
+    )
+    deltas = defaultdict(int)
+    for _, produto_id, quantidade in linhas:
+        deltas[produto_id] -= quantidade
+    if deltas:
+        Produto.objects.filter(pk__in=deltas).update(reservado=Greatest(_somar("reservado", deltas), Value(0)))
+    ReservaEstoque.objects.filter(pk__in=[pk for pk, _, _ in linhas]).delete()
+    return len(linhas)
+
+
+def liberar_expiradas():
+    """Libera as reservas vencidas (pedidos que não foram pagos a tempo). Retorna quantas."""
+    return liberar_reservas(ReservaEstoque.objects.filter(expira_em__lte=timezone.now()))
+
+
+@transaction.atomic
+def recalcular_reservado():
+    """Refaz `Produto.reservado` a partir das ReservaEstoque. Retorna quantos produtos mudaram."""
+    totais = dict(
+        ReservaEstoque.objects.order_by().values("produto_id").annotate(total=Sum("quantidade"))
+        .values_list("produto_id", "total")
+    )
+    produtos = Produto.objects.select_for_update().filter(Q(reservado__gt=0) | Q(pk__in=totais)).order_by("pk")
+    alterados = [
+        produto for produto in produtos.only("pk", "reservado")
+        if produto.reservado != totais.get(produto.pk, 0)
+    ]
+    for produto in alterados:
+        produto.reservado = totais.get(produto.pk, 0)
+    Produto.objects.bulk_update(alterados, ["reservado"], batch_size=1000)
+    return len(alterados)
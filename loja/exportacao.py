@@ -0,0 +1,336 @@
+"""
+Exportação de relatórios em PDF fora do request.
+
+A view só registra um ExportacaoRelatorio e devolve uma página que acompanha
+o progresso; o PDF é montado por um pool de processos local
+(ProcessPoolExecutor, sem broker externo) e gravado em MEDIA_ROOT/relatorios/.
+
+Os PDFs prontos formam um cache endereçado por conteúdo: a chave é o hash de
+tipo + filtros normalizados + versão dos dados (ver `versao_dados`). Pedir de
+novo o mesmo relatório, sem nada ter mudado no banco, custa só a leitura do
+arquivo (ou um 304, pelo ETag). O diretório tem tamanho máximo e descarta
+primeiro os PDFs acessados há mais tempo (LRU pelo mtime).
+
+Configuração (settings, todas opcionais):
+    EXPORTACAO_WORKERS          processos do pool (0 = gera no próprio request)
+    EXPORTACAO_VALIDADE         segundos que o PDF fica disponível desde o último acesso
+    EXPORTACAO_CACHE_MAX_BYTES  tamanho máximo de MEDIA_ROOT/relatorios/
+    EXPORTACAO_TEMPO_MAXIMO     depois disso, um job parado é tratado como abandonado
+
+Este módulo é importado pelos processos do pool antes do `django.setup()`,
+por isso os models são importados dentro das funções.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Parâmetros de tela que não mudam o conteúdo do relatório
+PARAMETROS_IGNORADOS = {"page", "depois", "antes"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def normalizar_parametros(params):
+    """Filtros preenchidos, em ordem estável (QueryDict ou dict → dict simples)."""
+    return {
+        chave: params.get(chave)
+        for chave in sorted(params)
+        if chave not in PARAMETROS_IGNORADOS and params.get(chave) not in (None, "")
+    }
+
+
+def versao_dados(tipo):
+    """
+    Versão de cada tabela que o relatório lê (VersaoDados), numa consulta pelo
+    índice único. Tabela sem linha ainda conta como versão 0.
+    """
+    from .models import VersaoDados
+    from .relatorios_pdf import DEPENDENCIAS_PDF
+
+    tabelas = [modelo._meta.label for modelo in DEPENDENCIAS_PDF[tipo]]
+    versoes = dict(VersaoDados.objects.filter(tabela__in=tabelas).values_list("tabela", "versao"))
+    return [[tabela, versoes.get(tabela, 0)] for tabela in tabelas]
+
+
+def invalidar_relatorios(*modelos):
+    """
+    Soma 1 na versão das tabelas quando a transação atual confirmar (na hora,
+    se não houver uma): os PDFs que as leem deixam de ser servidos do cache.
+    Fora da transação, o contador não vira um ponto de espera entre checkouts.
+
+    As tabelas se acumulam na conexão e o primeiro callback grava todas: uma
+    exclusão em cascata de mil pedidos faz um UPDATE, não mil. (Se a
+    transação for desfeita, as pendentes vão junto com a próxima — uma versão
+    a mais só custa um PDF refeito.)
+    """
+    from django.db import transaction
+    from django.db.models import F
+
+    from .models import VersaoDados
+
+    conexao = transaction.get_connection()
+    pendentes = conexao.__dict__.setdefault("_loja_versoes_pendentes", set())
+    pendentes.update(modelo._meta.label for modelo in modelos)
+
+    def incrementar():
+        tabelas = sorted(conexao.__dict__.pop("_loja_versoes_pendentes", ()))
+        if not tabelas:
+            return
+        versoes = VersaoDados.objects.filter(tabela__in=tabelas)
+        if versoes.update(versao=F("versao") + 1) < len(tabelas):
+            # primeira alteração de alguma tabela: cria a linha e conta de novo (pular versão não faz mal)
+            VersaoDados.objects.bulk_create([VersaoDados(tabela=tabela) for tabela in tabelas], ignore_conflicts=True)
+            versoes.update(versao=F("versao") + 1)
+
+    transaction.on_commit(incrementar)
+
+
+def chave_exportacao(tipo, parametros, versao):
+    bruto = json.dumps([tipo, parametros, versao], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(bruto.encode()).hexdigest()
+
+
+def preparar_exportacao(tipo, params):
+    """Filtros normalizados e a chave (endereço no cache / ETag) do PDF pedido."""
+    parametros = normalizar_parametros(params)
+    return parametros, chave_exportacao(tipo, parametros, versao_dados(tipo))
+
+
+def solicitar_exportacao(tipo, parametros, chave, usuario=None):
+    """
+    Devolve a exportação com esta `chave`: a que já está pronta no cache, a que
+    está na fila/em andamento, ou uma nova (enfileirada quando a transação atual
+    confirmar).
+    """
+    from django.db import transaction
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from .models import ExportacaoRelatorio
+
+    agora = timezone.now()
+    existente = (
+        ExportacaoRelatorio.objects
+        .filter(chave=chave)
+        .filter(
+            Q(status__in=[ExportacaoRelatorio.PENDENTE, ExportacaoRelatorio.PROCESSANDO],
+              criado_em__gte=agora - timedelta(seconds=_config("EXPORTACAO_TEMPO_MAXIMO", 600)))
+            | Q(status=ExportacaoRelatorio.CONCLUIDO, expira_em__gt=agora)
+        )
+        .order_by("-criado_em")
+        .first()
+    )
+    if existente and existente.status == ExportacaoRelatorio.CONCLUIDO and not _arquivo_existe(existente):
+        existente.delete()  # o PDF saiu do cache pelo limite de tamanho
+        existente = None
+    if existente:
+        return existente
+
+    exportacao = ExportacaoRelatorio.objects.create(
+        tipo=tipo, parametros=parametros, chave=chave, usuario=usuario,
+    )
+    transaction.on_commit(lambda: _enfileirar(exportacao.pk))
+    return exportacao
+
+
+# -------------------------------
+# 🔧 CACHE EM DISCO (LRU)
+# -------------------------------
+
+def _arquivo_existe(exportacao):
+    return bool(exportacao.arquivo) and exportacao.arquivo.storage.exists(exportacao.arquivo.name)
+
+
+def registrar_acesso(exportacao):
+    """Marca o PDF como usado agora: renova a validade e o coloca no fim da fila do LRU."""
+    from django.utils import timezone
+
+    from .models import ExportacaoRelatorio
+
+    try:
+        os.utime(exportacao.arquivo.path)
+    except FileNotFoundError:
+        pass
+    ExportacaoRelatorio.objects.filter(pk=exportacao.pk).update(
+        expira_em=timezone.now() + timedelta(seconds=_config("EXPORTACAO_VALIDADE", 24 * 3600))
+    )
+
+
+def aplicar_limite_cache():
+    """
+    Apaga os PDFs menos usados (mtime mais antigo) até o diretório caber em
+    EXPORTACAO_CACHE_MAX_BYTES. Retorna quantos arquivos saíram.
+    """
+    from django.core.files.storage import default_storage
+
+    from .models import ExportacaoRelatorio
+
+    diretorio = default_storage.path(ExportacaoRelatorio._meta.get_field("arquivo").upload_to)
+    try:
+        entradas = [entrada for entrada in os.scandir(diretorio) if entrada.is_file()]
+    except FileNotFoundError:
+        return 0
+
+    arquivos = []
+    for entrada in entradas:
+        try:
+            info = entrada.stat()
+        except FileNotFoundError:  # outro worker acabou de apagar
+            continue
+        arquivos.append((info.st_mtime, info.st_size, entrada.name))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    limite = _config("EXPORTACAO_CACHE_MAX_BYTES", 500 * 1024 * 1024)
+    removidos = []
+    for _, tamanho, nome in sorted(arquivos):
+        if total <= limite:
+            break
+        try:
+            os.remove(os.path.join(diretorio, nome))
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+        removidos.append(nome)
+
+    if removidos:
+        pasta = ExportacaoRelatorio._meta.get_field("arquivo").upload_to
+        ExportacaoRelatorio.objects.filter(arquivo__in=[pasta + nome for nome in removidos]).delete()
+    return len(removidos)
+
+
+# -------------------------------
+# 🔧 POOL DE WORKERS
+# -------------------------------
+
+def _iniciar_worker():
+    """Cada processo do pool sobe o Django uma vez (contexto spawn: processo limpo)."""
+    import django
+    django.setup()
+
+
+def _obter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_config("EXPORTACAO_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_worker,
+            )
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _enfileirar(exportacao_id):
+    if _config("EXPORTACAO_WORKERS", 2) <= 0:
+        executar_exportacao(exportacao_id)
+        return
+
+    try:
+        _obter_pool().submit(executar_exportacao, exportacao_id)
+    except BrokenProcessPool:
+        # Um worker morreu (ex.: falta de memória); sobe um pool novo e tenta de novo
+        _descartar_pool()
+        _obter_pool().submit(executar_exportacao, exportacao_id)
+
+
+# -------------------------------
+# 🔧 EXECUÇÃO (roda dentro do worker)
+# -------------------------------
+
+def _atualizar(exportacao_id, **campos):
+    from .models import ExportacaoRelatorio
+    ExportacaoRelatorio.objects.filter(pk=exportacao_id).update(**campos)
+
+
+def executar_exportacao(exportacao_id):
+    """
+    Gera o PDF de uma exportação. O progresso é por etapa (consulta/HTML,
+    layout, gravação): o weasyprint não informa progresso de página.
+    """
+    import weasyprint
+    from django.core.files import File
+    from django.db import close_old_connections
+    from django.utils import timezone
+
+    from .models import ExportacaoRelatorio
+    from .relatorios_pdf import RELATORIOS_PDF
+
+    close_old_connections()
+    exportacao = ExportacaoRelatorio.objects.get(pk=exportacao_id)
+    _atualizar(exportacao_id, status=ExportacaoRelatorio.PROCESSANDO, progresso=5)
+
+    caminho_tmp = None
+    try:
+        html_string = RELATORIOS_PDF[exportacao.tipo](exportacao.parametros)
+        _atualizar(exportacao_id, progresso=30)
+
+        # 🔹 O PDF vai direto para um arquivo, sem passar por um HttpResponse em memória
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            caminho_tmp = tmp.name
+            weasyprint.HTML(string=html_string).write_pdf(tmp)
+        _atualizar(exportacao_id, progresso=90)
+
+        with open(caminho_tmp, "rb") as pdf:
+            exportacao.arquivo.save(f"{exportacao.chave}.pdf", File(pdf), save=False)
+
+        agora = timezone.now()
+        _atualizar(
+            exportacao_id,
+            arquivo=exportacao.arquivo.name,
+            status=ExportacaoRelatorio.CONCLUIDO,
+            progresso=100,
+            concluido_em=agora,
+            expira_em=agora + timedelta(seconds=_config("EXPORTACAO_VALIDADE", 24 * 3600)),
+        )
+        aplicar_limite_cache()
+    except Exception as exc:
+        logger.exception("Falha ao gerar exportação %s", exportacao_id)
+        _atualizar(exportacao_id, status=ExportacaoRelatorio.ERRO, erro=str(exc)[:1000])
+    finally:
+        if caminho_tmp and os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+        close_old_connections()
+
+
+def limpar_expiradas():
+    """Apaga exportações vencidas (e seus PDFs) e jobs abandonados. Retorna quantas."""
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from .models import ExportacaoRelatorio
+
+    agora = timezone.now()
+    abandonadas = agora - timedelta(seconds=_config("EXPORTACAO_TEMPO_MAXIMO", 600))
+    vencidas = ExportacaoRelatorio.objects.filter(
+        Q(expira_em__lte=agora)
+        | Q(status__in=[ExportacaoRelatorio.PENDENTE, ExportacaoRelatorio.PROCESSANDO], criado_em__lt=abandonadas)
+        | Q(status=ExportacaoRelatorio.ERRO, criado_em__lt=abandonadas)
+    )
+
+    total = 0
+    for exportacao in vencidas.iterator():
+        exportacao.delete()
+        total += 1
+    return total
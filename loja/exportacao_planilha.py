@@ -0,0 +1,167 @@
+"""
+Exportação dos relatórios em planilha (CSV e XLSX).
+
+Usa as mesmas consultas das telas (`RELATORIOS`, em loja/relatorios.py). As linhas são lidas
+em lotes por cursor (`iterar_em_lotes`) e escritas conforme chegam, então a
+memória não cresce com o tamanho do relatório:
+
+- CSV: `StreamingHttpResponse`, uma linha por vez direto para o cliente;
+- XLSX: openpyxl em modo write-only num arquivo temporário (o formato é um
+  zip, não dá para transmitir antes de fechar). O openpyxl é opcional.
+"""
+import csv
+import datetime
+import tempfile
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import CustoProduto
+from .paginacao import iterar_em_lotes
+from .relatorios import RELATORIOS
+
+TAMANHO_LOTE = 2000
+
+
+def _custo_do_produto(produto):
+    try:
+        return produto.custo_info.custo
+    except CustoProduto.DoesNotExist:
+        return None
+
+
+# -------------------------------
+# 🔧 COLUNAS DE CADA RELATÓRIO
+# -------------------------------
+# Cada função devolve (cabeçalho, gerador de linhas).
+
+def _linhas(tipo, params):
+    relatorio = RELATORIOS[tipo]
+    return iterar_em_lotes(relatorio.queryset(params), relatorio.ordenacao(params), TAMANHO_LOTE)
+
+
+def _planilha_produtos(params):
+    linhas = (
+        [p.id, p.nome, p.preco, _custo_do_produto(p), p.quantidade, p.minimo_estoque, p.ideal_estoque, p.ativo]
+        for p in _linhas("produtos", params)
+    )
+    return ["ID", "Produto", "Preço", "Custo", "Quantidade", "Estoque mínimo", "Estoque ideal", "Ativo"], linhas
+
+
+def _planilha_pedidos(params):
+    linhas = (
+        [p.numero_pedido or p.id, p.cliente.username, p.nome_cliente, p.status,
+         p.total, p.custo_total, p.total - p.custo_total, p.data_criacao]
+        for p in _linhas("pedidos", params)
+    )
+    return ["Pedido", "Cliente", "Nome", "Status", "Total", "Custo", "Lucro", "Data"], linhas
+
+
+def _planilha_estoque(params):
+    linhas = (
+        [m.data, m.produto.nome, m.get_tipo_display(), m.quantidade, m.estoque_final, m.observacao]
+        for m in _linhas("estoque", params)
+    )
+    return ["Data", "Produto", "Tipo", "Quantidade", "Estoque final", "Observação"], linhas
+
+
+def _planilha_financeiro(params):
+    # 🔹 Uma linha (dict do .values()) por dia do resumo
+    linhas = (
+        [r["data"], r["receita"], r["custo"], r["fixa"], r["variavel"], r["lucro"]]
+        for r in _linhas("financeiro", params)
+    )
+    return ["Data", "Receita", "Custo", "Despesas fixas", "Despesas variáveis", "Lucro"], linhas
+
+
+def _planilha_feedbacks(params):
+    linhas = (
+        [f.id, f.produto.nome if f.produto else "", f.usuario.username, f.nota, f.comentario, f.visivel, f.data_criacao]
+        for f in _linhas("feedbacks", params)
+    )
+    return ["ID", "Produto", "Usuário", "Nota", "Comentário", "Visível", "Data"], linhas
+
+
+# 🔹 tipo do relatório → colunas/linhas
+PLANILHAS = {
+    "produtos": _planilha_produtos,
+    "pedidos": _planilha_pedidos,
+    "estoque": _planilha_estoque,
+    "financeiro": _planilha_financeiro,
+    "feedbacks": _planilha_feedbacks,
+}
+
+
+# -------------------------------
+# 🔧 CSV
+# -------------------------------
+
+class _Eco:
+    """Arquivo de mentira: o csv.writer "escreve" e recebe a linha pronta de volta."""
+
+    def write(self, valor):
+        return valor
+
+
+def _texto(valor):
+    """Valor no formato que o Excel em pt-BR entende."""
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "Sim" if valor else "Não"
+    if isinstance(valor, (Decimal, float)):
+        return str(valor).replace(".", ",")
+    if isinstance(valor, datetime.datetime):
+        return timezone.localtime(valor).strftime("%d/%m/%Y %H:%M")
+    if isinstance(valor, datetime.date):
+        return valor.strftime("%d/%m/%Y")
+    return valor
+
+
+def resposta_csv(tipo, params):
+    cabecalho, linhas = PLANILHAS[tipo](params)
+    escritor = csv.writer(_Eco(), delimiter=";")
+
+    def gerar():
+        yield "\ufeff"  # BOM: o Excel abre os acentos corretamente
+        yield escritor.writerow(cabecalho)
+        for linha in linhas:
+            yield escritor.writerow([_texto(valor) for valor in linha])
+
+    response = StreamingHttpResponse(gerar(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="relatorio_{tipo}.csv"'
+    return response
+
+
+# -------------------------------
+# 🔧 XLSX
+# -------------------------------
+
+def _celula(valor):
+    # O openpyxl não aceita datetime com fuso
+    if isinstance(valor, datetime.datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+def resposta_xlsx(tipo, params):
+    """Levanta ImportError se o openpyxl não estiver instalado."""
+    from openpyxl import Workbook
+
+    cabecalho, linhas = PLANILHAS[tipo](params)
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(tipo.capitalize())
+    aba.append(cabecalho)
+    for linha in linhas:
+        aba.append([_celula(valor) for valor in linha])
+
+    arquivo = tempfile.TemporaryFile()  # some do disco quando o FileResponse fecha
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=f"relatorio_{tipo}.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
@@ -0,0 +1,245 @@
+"""
+Agregações financeiras feitas no banco.
+
+Receita, custo e despesas somados com SUM/GROUP BY em vez de carregar cada
+PedidoItem/Despesa como objeto. Tudo volta como Decimal (nunca float).
+
+Dias e meses são agrupados pela data local (TIME_ZONE, America/Sao_Paulo):
+um pedido das 22h entra no dia em que foi feito, não no seguinte. No MySQL
+isso exige as tabelas de fuso carregadas (mysql_tzinfo_to_sql).
+
+As telas leem os totais por dia da tabela ResumoFinanceiroDiario, que as
+funções do fim deste arquivo mantêm a partir dos dados brutos.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .exportacao import invalidar_relatorios
+from .models import Despesa, Pedido, PedidoItem, ResumoFinanceiroDiario
+
+ZERO = Decimal("0.00")
+
+_DINHEIRO = DecimalField(max_digits=14, decimal_places=2)
+
+# custo de uma linha de pedido: quantidade × custo congelado no pedido
+CUSTO_ITEM = ExpressionWrapper(F("quantidade") * F("custo_unitario"), output_field=_DINHEIRO)
+
+
+CAMPOS_RESUMO = ("receita", "custo", "despesas_fixas", "despesas_variaveis")
+
+
+def _soma(expressao):
+    return Coalesce(Sum(expressao, output_field=_DINHEIRO), Value(ZERO), output_field=_DINHEIRO)
+
+
+def _itens_de(pedidos):
+    return PedidoItem.objects.filter(pedido__in=pedidos.order_by().values("id"))
+
+
+def custo_por_pedido(pedidos):
+    """{pedido_id: custo} numa única consulta agrupada."""
+    linhas = _itens_de(pedidos).values("pedido_id").annotate(custo=_soma(CUSTO_ITEM)).order_by()
+    return {linha["pedido_id"]: linha["custo"] for linha in linhas}
+
+
+def anotar_custo(pedidos):
+    """Acrescenta `custo_total` a cada pedido (subconsulta correlacionada, sem prefetch)."""
+    custo = (
+        PedidoItem.objects.filter(pedido=OuterRef("pk"))
+        .order_by().values("pedido").annotate(total=Sum(CUSTO_ITEM)).values("total")
+    )
+    return pedidos.annotate(
+        custo_total=Coalesce(Subquery(custo, output_field=_DINHEIRO), Value(ZERO), output_field=_DINHEIRO)
+    )
+
+
+def _dia(campo):
+    return TruncDate(campo)  # no fuso atual
+
+
+def receita_por_dia(pedidos):
+    """{date: receita} agrupado pelo dia do pedido."""
+    linhas = pedidos.annotate(dia=_dia("data_criacao")).values("dia").annotate(receita=_soma("total")).order_by()
+    return {linha["dia"]: linha["receita"] for linha in linhas}
+
+
+def custo_por_dia(pedidos):
+    """{date: custo} agrupado pelo dia do pedido."""
+    linhas = (
+        _itens_de(pedidos)
+        .annotate(dia=_dia("pedido__data_criacao"))
+        .values("dia")
+        .annotate(custo=_soma(CUSTO_ITEM))
+        .order_by()
+    )
+    return {linha["dia"]: linha["custo"] for linha in linhas}
+
+
+def _linha_vazia():
+    return dict.fromkeys(CAMPOS_RESUMO, ZERO)
+
+
+def resumo_por_dia(pedidos, despesas):
+    """
+    {date: {"receita", "custo", "despesas_fixas", "despesas_variaveis"}}
+    montado com três consultas agrupadas, seja qual for o volume de pedidos.
+    """
+    dias = defaultdict(_linha_vazia)
+
+    for dia, receita in receita_por_dia(pedidos).items():
+        if dia is not None:
+            dias[dia]["receita"] = receita
+    for dia, custo in custo_por_dia(pedidos).items():
+        if dia is not None:
+            dias[dia]["custo"] = custo
+    for linha in despesas.values("data", "tipo").annotate(total=_soma("valor")).order_by():
+        campo = "despesas_fixas" if linha["tipo"] == "Fixo" else "despesas_variaveis"
+        dias[linha["data"]][campo] += linha["total"]
+
+    return dict(dias)
+
+
+def agrupar_por_mes(resumo_dias):
+    """Soma as linhas de `resumo_por_dia` por mês: {date(ano, mês, 1): linha}."""
+    meses = defaultdict(_linha_vazia)
+    for dia, linha in resumo_dias.items():
+        mes = meses[dia.replace(day=1)]
+        for campo in CAMPOS_RESUMO:
+            mes[campo] += linha[campo]
+    return dict(meses)
+
+
+def totalizar(linhas):
+    """Soma uma coleção de linhas de resumo num único dict."""
+    total = _linha_vazia()
+    for linha in linhas:
+        for campo in CAMPOS_RESUMO:
+            total[campo] += linha[campo]
+    return total
+
+
+def calcular_lucro(linha):
+    return linha["receita"] - linha["custo"] - linha["despesas_fixas"] - linha["despesas_variaveis"]
+
+
+# -------------------------------
+# 🔧 RESUMO FINANCEIRO DIÁRIO (tabela materializada)
+# -------------------------------
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+
+
+def _pedidos_pagos_entre(inicio=None, fim=None):
+    pedidos = Pedido.objects.filter(status="Pago")
+    if inicio:
+        pedidos = pedidos.filter(data_criacao__gte=_inicio_do_dia(inicio))
+    if fim:
+        pedidos = pedidos.filter(data_criacao__lt=_inicio_do_dia(fim + datetime.timedelta(days=1)))
+    return pedidos
+
+
+def _linhas_do_resumo(resumo):
+    return [
+        ResumoFinanceiroDiario(data=dia, **valores)
+        for dia, valores in resumo.items()
+        if any(valores.values())
+    ]
+
+
+def atualizar_resumo_diario(dias):
+    """Recalcula, a partir de pedidos e despesas, as linhas dos dias informados."""
+    dias = {dia for dia in dias if dia is not None}
+    if not dias:
+        return
+
+    condicao = Q()
+    for dia in dias:
+        condicao |= Q(data_criacao__gte=_inicio_do_dia(dia),
+                      data_criacao__lt=_inicio_do_dia(dia + datetime.timedelta(days=1)))
+    resumo = resumo_por_dia(
+        Pedido.objects.filter(condicao, status="Pago"),
+        Despesa.objects.filter(data__in=dias),
+    )
+
+    linhas = _linhas_do_resumo({dia: valores for dia, valores in resumo.items() if dia in dias})
+    vazios = dias - {linha.data for linha in linhas}
+
+    # MySQL não aceita indicar a coluna do conflito; o UNIQUE de `data` basta
+    alvo = {"unique_fields": ["data"]} if connection.features.supports_update_conflicts_with_target else {}
+
+    with transaction.atomic():
+        if vazios:
+            ResumoFinanceiroDiario.objects.filter(data__in=vazios).delete()
+        if linhas:
+            ResumoFinanceiroDiario.objects.bulk_create(
+                linhas, update_conflicts=True, update_fields=[*CAMPOS_RESUMO, "atualizado_em"], **alvo
+            )
+        invalidar_relatorios(ResumoFinanceiroDiario)
+
+
+def reconstruir_resumo_diario(inicio=None, fim=None, lote=500):
+    """
+    Refaz o resumo do período (ou de todo o histórico) direto dos dados brutos.
+    Retorna a quantidade de dias gravados.
+    """
+    despesas = Despesa.objects.all()
+    existentes = ResumoFinanceiroDiario.objects.all()
+    if inicio:
+        despesas = despesas.filter(data__gte=inicio)
+        existentes = existentes.filter(data__gte=inicio)
+    if fim:
+        despesas = despesas.filter(data__lte=fim)
+        existentes = existentes.filter(data__lte=fim)
+
+    linhas = _linhas_do_resumo(resumo_por_dia(_pedidos_pagos_entre(inicio, fim), despesas))
+
+    with transaction.atomic():
+        existentes.delete()
+        ResumoFinanceiroDiario.objects.bulk_create(linhas, batch_size=lote)
+        invalidar_relatorios(ResumoFinanceiroDiario)
+
+    return len(linhas)
+
+
+def resumo_do_periodo(inicio=None, fim=None):
+    """Queryset de ResumoFinanceiroDiario entre as datas (inclusive)."""
+    resumo = ResumoFinanceiroDiario.objects.all()
+    if inicio:
+        resumo = resumo.filter(data__gte=inicio)
+    if fim:
+        resumo = resumo.filter(data__lte=fim)
+    return resumo
+
+
+def valores_do_resumo(resumo):
+    """
+    Linhas diárias (data, receita, custo, fixa, variavel, lucro) de um queryset
+    de ResumoFinanceiroDiario; "fixa", "variavel" e "lucro" podem ser usados
+    no order_by.
+    """
+    return resumo.values(
+        "data", "receita", "custo",
+        fixa=F("despesas_fixas"),
+        variavel=F("despesas_variaveis"),
+        lucro=F("receita") - F("custo") - F("despesas_fixas") - F("despesas_variaveis"),
+    )
+
+
+def ler_resumo_por_dia(inicio=None, fim=None):
+    """Mesmo formato de `resumo_por_dia`, lido da tabela numa única consulta."""
+    return {
+        linha.pop("data"): linha
+        for linha in resumo_do_periodo(inicio, fim).order_by().values("data", *CAMPOS_RESUMO)
+    }
+
+
+def totais_do_periodo(inicio=None, fim=None):
+    """Soma receita, custo e despesas do período numa única consulta."""
+    return resumo_do_periodo(inicio, fim).aggregate(**{campo: _soma(campo) for campo in CAMPOS_RESUMO})
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from loja.busca import buscar, reindexar
+from loja.models import Produto
+
+SILABAS = ["ba", "ca", "da", "fe", "go", "lha", "ma", "ni", "po", "que", "ri", "sa", "te", "vo", "zé", "ção"]
+
+PALAVRAS = [
+    "almôndega", "frango", "carne", "moída", "bovina", "suína", "linguiça", "toscana",
+    "queijo", "mussarela", "presunto", "coxinha", "pastel", "congelado", "temperado",
+    "picanha", "costela", "hambúrguer", "artesanal", "defumado", "calabresa", "peito",
+    "filé", "sobrecoxa", "pão", "alho", "molho", "tomate", "caseiro", "orgânico",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a latência por tecla da busca de produtos (índice x icontains) "
+        "em uma base sintética. Os dados são criados numa transação e descartados no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--produtos", type=int, default=100_000)
+        parser.add_argument("--consulta", default="almondega caseira")
+        parser.add_argument("--repeticoes", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._popular(options["produtos"])
+            self._medir(options["consulta"], options["repeticoes"])
+            transaction.set_rollback(True)
+
+    def _popular(self, quantidade):
+        rnd = random.Random(42)
+        inicio = time.perf_counter()
+
+        # Vocabulário: palavras reais + palavras sintéticas, para a seletividade parecer com um catálogo real
+        vocabulario = PALAVRAS + [
+            "".join(rnd.choices(SILABAS, k=rnd.randint(2, 4))) for _ in range(5000)
+        ]
+
+        lote = []
+        for i in range(quantidade):
+            nome = " ".join(rnd.sample(vocabulario, 3))
+            descricao = " ".join(rnd.choices(vocabulario, k=12))
+            lote.append(Produto(nome=f"{nome} {i}", descricao=descricao, preco=10, quantidade=10))
+            if len(lote) == 5000:
+                Produto.objects.bulk_create(lote)
+                lote = []
+        Produto.objects.bulk_create(lote)
+        reindexar()
+
+        self.stdout.write(f"Base: {quantidade} produtos criados e indexados em {time.perf_counter() - inicio:.1f}s")
+
+    def _medir(self, consulta, repeticoes):
+        base = Produto.objects.filter(ativo=True)
+        self.stdout.write(f"{'digitado':<24}{'indice (ms)':>14}{'icontains (ms)':>16}")
+
+        # Simula o autocomplete: uma consulta por tecla digitada
+        for fim in range(2, len(consulta) + 1):
+            digitado = consulta[:fim]
+            tempo_indice = self._cronometrar(lambda: list(buscar(base, digitado)[:10]), repeticoes)
+            tempo_like = self._cronometrar(lambda: list(base.filter(nome__icontains=digitado)[:10]), repeticoes)
+            self.stdout.write(f"{digitado!r:<24}{tempo_indice:>14.2f}{tempo_like:>16.2f}")
+
+    @staticmethod
+    def _cronometrar(funcao, repeticoes):
+        melhores = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            melhores.append((time.perf_counter() - inicio) * 1000)
+        return min(melhores)
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from loja.models import Carrinho, ItemCarrinho, Produto
+from loja.views import adicionar_carrinho
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede requisições por segundo do 'adicionar ao carrinho' (AJAX) com cliques simultâneos "
+        "do mesmo usuário e confere que nenhuma unidade se perdeu. Chama a view direto (sem "
+        "middleware). Os dados são gravados (as threads usam conexões próprias) e apagados no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--cliques", type=int, default=200, help="cliques por thread")
+        parser.add_argument("--produtos", type=int, default=5)
+        parser.add_argument("--estoque", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        usuario = User.objects.create_user("benchmark_carrinho")
+        produtos = Produto.objects.bulk_create([
+            Produto(nome=f"Benchmark carrinho {i}", descricao="-", preco=10, quantidade=options["estoque"])
+            for i in range(options["produtos"])
+        ])
+        try:
+            self._medir(usuario, produtos, options["threads"], options["cliques"], options["estoque"])
+        finally:
+            Produto.objects.filter(pk__in=[produto.pk for produto in produtos]).delete()
+            usuario.delete()
+
+    def _medir(self, usuario, produtos, threads, cliques, estoque):
+        fabrica = RequestFactory(headers={"x-requested-with": "XMLHttpRequest"})
+        barreira = threading.Barrier(threads)
+        erros = []
+
+        def clicar(indice):
+            try:
+                barreira.wait()
+                for n in range(cliques):
+                    produto = produtos[(indice + n) % len(produtos)]
+                    request = fabrica.get(f"/carrinho/adicionar/{produto.pk}/")
+                    request.user = usuario
+                    request.session = SessionBase()
+                    response = adicionar_carrinho(request, produto.pk)
+                    if response.status_code != 200:
+                        erros.append(response.status_code)
+            except Exception as exc:
+                erros.append(exc)
+            finally:
+                connection.close()
+
+        trabalhadores = [threading.Thread(target=clicar, args=(i,)) for i in range(threads)]
+        inicio = time.perf_counter()
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        duracao = time.perf_counter() - inicio
+
+        total = threads * cliques
+        esperado = {
+            produto.pk: min(estoque, sum(1 for i in range(threads) for n in range(cliques)
+                                         if (i + n) % len(produtos) == indice))
+            for indice, produto in enumerate(produtos)
+        }
+        quantidades = dict(
+            ItemCarrinho.objects.filter(carrinho__usuario=usuario).values_list("produto_id", "quantidade")
+        )
+        carrinho = Carrinho.objects.get(usuario=usuario)
+
+        self.stdout.write(f"{total} cliques em {threads} threads: {duracao:.2f}s, {total / duracao:.0f} req/s")
+        self.stdout.write(f"erros: {len(erros)}" + (f" (primeiro: {erros[0]!r})" if erros else ""))
+        if quantidades == esperado and carrinho.total_itens == sum(esperado.values()):
+            self.stdout.write(self.style.SUCCESS(f"Carrinho consistente: {carrinho.total_itens} unidades."))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"Carrinho inconsistente: itens {quantidades}, esperado {esperado}, total_itens {carrinho.total_itens}."
+            ))
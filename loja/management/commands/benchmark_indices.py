@@ -0,0 +1,193 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from loja.models import ContagemPedidoStatus, Despesa, Feedback, MovimentacaoEstoque, Pedido, Produto
+
+PREFIXO = "benchmark_indices"
+
+
+def _consultas(clientes, produtos):
+    """
+    (modelo, campos do índice, [(nome, queryset)]) — as consultas das telas
+    que cada índice da migração 0014 atende.
+    """
+    inicio_mes = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    cliente, produto = clientes[len(clientes) // 2], produtos[len(produtos) // 2]
+    return [
+        (Pedido, ["status", "data_criacao", "id"], [
+            ("Pedidos pagos do mês (resumo/dashboard)",
+             lambda: Pedido.objects.filter(status="Pago", data_criacao__gte=inicio_mes)
+             .values_list("data_criacao", "total")),
+            ("Pedidos pendentes, 1ª página do cursor",
+             lambda: Pedido.objects.filter(status="Pendente").order_by("-data_criacao", "-id")[:40]),
+        ]),
+        (Pedido, ["cliente", "data_criacao"], [
+            ("Meus pedidos",
+             lambda: Pedido.objects.filter(cliente=cliente).order_by("-data_criacao")[:10]),
+        ]),
+        (MovimentacaoEstoque, ["tipo", "data", "id"], [
+            ("Movimentações de ajuste, 1ª página do cursor",
+             lambda: MovimentacaoEstoque.objects.filter(tipo="ajuste").order_by("-data", "-id")[:40]),
+        ]),
+        (Feedback, ["produto", "visivel", "data_criacao"], [
+            ("Feedbacks visíveis do produto",
+             lambda: Feedback.objects.filter(produto=produto, visivel=True).order_by("-data_criacao")),
+        ]),
+        (Despesa, ["tipo", "data", "id"], [
+            ("Despesas fixas, 1ª página do cursor",
+             lambda: Despesa.objects.filter(tipo="Fixo").order_by("-data", "-id")[:40]),
+        ]),
+        (Produto, ["ativo", "id"], [
+            ("Vitrine (ativos, mais novos)",
+             lambda: Produto.objects.filter(ativo=True).order_by("-id")[:12]),
+        ]),
+    ]
+
+
+@contextmanager
+def _datas_livres(*campos):
+    """auto_now_add sobrescreve a data no bulk_create; desligado, a base sintética espalha as datas."""
+    for campo in campos:
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo in campos:
+            campo.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede as consultas frequentes das telas sem e com os índices compostos (migração 0014): "
+        "cria uma base sintética, remove cada índice, mostra o EXPLAIN e o tempo, recria o índice "
+        "e mede de novo. Os dados são gravados (o DDL do MySQL confirma a transação) e apagados no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pedidos", type=int, default=100_000)
+        parser.add_argument("--produtos", type=int, default=2_000)
+        parser.add_argument("--clientes", type=int, default=500)
+        parser.add_argument("--repeticoes", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            clientes, produtos = self._popular(options["pedidos"], options["produtos"], options["clientes"])
+            for modelo, campos, consultas in _consultas(clientes, produtos):
+                self._comparar(modelo, campos, consultas, options["repeticoes"])
+        finally:
+            Produto.objects.filter(nome__startswith=PREFIXO).delete()
+            User.objects.filter(username__startswith=PREFIXO).delete()
+            Despesa.objects.filter(categoria=PREFIXO).delete()
+            # os pedidos entraram por bulk_create (sem somar no contador) e saíram pela cascata (subtraindo)
+            ContagemPedidoStatus.reconstruir()
+
+    # -------------------------------
+    # 🔧 BASE SINTÉTICA
+    # -------------------------------
+
+    def _popular(self, pedidos, produtos, clientes):
+        rnd = random.Random(42)
+        inicio = time.perf_counter()
+        agora = timezone.now()
+
+        def quando():
+            # últimos dois anos, com mais movimento nos meses recentes
+            return agora - timedelta(days=730 * rnd.random() ** 2, seconds=rnd.randrange(86_400))
+
+        clientes = User.objects.bulk_create([User(username=f"{PREFIXO}_{i}") for i in range(clientes)])
+        produtos = Produto.objects.bulk_create([
+            Produto(nome=f"{PREFIXO} {i}", descricao="-", preco=10, quantidade=100, ativo=rnd.random() < 0.95)
+            for i in range(produtos)
+        ], batch_size=5000)
+
+        with _datas_livres(Pedido._meta.get_field("data_criacao"), MovimentacaoEstoque._meta.get_field("data")):
+            Pedido.objects.bulk_create((
+                Pedido(
+                    cliente=rnd.choice(clientes), nome_cliente="-", endereco_entrega="-", total=rnd.randint(10, 500),
+                    status=rnd.choices(["Pago", "Pendente", "Cancelado"], [70, 20, 10])[0], data_criacao=quando(),
+                )
+                for _ in range(pedidos)
+            ), batch_size=5000)
+            MovimentacaoEstoque.objects.bulk_create((
+                MovimentacaoEstoque(
+                    produto=rnd.choice(produtos), quantidade=rnd.randint(1, 10), estoque_final=100,
+                    tipo=rnd.choices(["saida", "entrada", "ajuste"], [65, 30, 5])[0], data=quando(),
+                )
+                for _ in range(pedidos * 2)
+            ), batch_size=5000)
+
+        Feedback.objects.bulk_create((
+            Feedback(
+                usuario=rnd.choice(clientes), produto=rnd.choice(produtos), nota=rnd.randint(1, 5),
+                visivel=rnd.random() < 0.9, data_criacao=quando(),
+            )
+            for _ in range(pedidos // 4)
+        ), batch_size=5000)
+        Produto.recalcular_avaliacoes([produto.pk for produto in produtos])  # bulk_create não soma as notas
+        Despesa.objects.bulk_create((
+            Despesa(
+                categoria=PREFIXO, tipo=rnd.choices(["Fixo", "Variável"], [30, 70])[0], valor=rnd.randint(10, 900),
+                data=date.today() - timedelta(days=rnd.randrange(730)),
+            )
+            for _ in range(pedidos // 10)
+        ), batch_size=5000)
+
+        self._analisar()
+        self.stdout.write(
+            f"Base: {pedidos} pedidos, {pedidos * 2} movimentações, {pedidos // 4} feedbacks, "
+            f"{pedidos // 10} despesas e {len(produtos)} produtos em {time.perf_counter() - inicio:.1f}s"
+        )
+        return clientes, produtos
+
+    def _analisar(self):
+        """Atualiza as estatísticas do planejador depois da carga/índice novo."""
+        comando = "ANALYZE TABLE {}" if connection.vendor == "mysql" else "ANALYZE {}"
+        with connection.cursor() as cursor:
+            for modelo in (Pedido, MovimentacaoEstoque, Feedback, Despesa, Produto):
+                cursor.execute(comando.format(connection.ops.quote_name(modelo._meta.db_table)))
+                if connection.vendor == "mysql":
+                    cursor.fetchall()
+
+    # -------------------------------
+    # 🔧 SEM x COM O ÍNDICE
+    # -------------------------------
+
+    def _comparar(self, modelo, campos, consultas, repeticoes):
+        indice = next(indice for indice in modelo._meta.indexes if indice.fields == campos)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{modelo.__name__}({', '.join(campos)}) — {indice.name}"))
+
+        with connection.schema_editor() as editor:
+            editor.remove_index(modelo, indice)
+        try:
+            antes = [self._medir(fabrica, repeticoes) for _, fabrica in consultas]
+        finally:
+            with connection.schema_editor() as editor:
+                editor.add_index(modelo, indice)
+        self._analisar()
+        depois = [self._medir(fabrica, repeticoes) for _, fabrica in consultas]
+
+        for (nome, _), (plano_antes, tempo_antes), (plano_depois, tempo_depois) in zip(consultas, antes, depois):
+            self.stdout.write(f"  {nome}")
+            self.stdout.write(f"    sem índice: {tempo_antes:8.2f} ms  {plano_antes}")
+            self.stdout.write(f"    com índice: {tempo_depois:8.2f} ms  {plano_depois}")
+            self.stdout.write(f"    {tempo_antes / max(tempo_depois, 1e-6):.1f}x")
+
+    @staticmethod
+    def _medir(fabrica, repeticoes):
+        """(EXPLAIN em uma linha, mediana em ms de `repeticoes` execuções)."""
+        plano = " | ".join(linha.strip() for linha in fabrica().explain().splitlines() if linha.strip())
+        list(fabrica())  # aquece o cache de páginas antes de medir
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            list(fabrica())
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return plano, statistics.median(tempos)
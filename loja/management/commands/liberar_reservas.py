@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from loja.estoque import liberar_expiradas, recalcular_reservado
+
+
+class Command(BaseCommand):
+    help = (
+        "Libera as reservas de estoque vencidas (pedidos não pagos dentro de RESERVA_ESTOQUE_VALIDADE). "
+        "Rode periodicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recalcular",
+            action="store_true",
+            help="Também refaz Produto.reservado a partir das reservas existentes.",
+        )
+
+    def handle(self, *args, **options):
+        total = liberar_expiradas()
+        self.stdout.write(self.style.SUCCESS(f"{total} reserva(s) vencida(s) liberada(s)."))
+        if options["recalcular"]:
+            corrigidos = recalcular_reservado()
+            self.stdout.write(self.style.SUCCESS(f"{corrigidos} produto(s) com reserva corrigida."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from loja.exportacao import limpar_expiradas
+
+
+class Command(BaseCommand):
+    help = "Apaga exportações de relatórios vencidas (e seus PDFs em MEDIA_ROOT) e jobs abandonados."
+
+    def handle(self, *args, **options):
+        total = limpar_expiradas()
+        self.stdout.write(self.style.SUCCESS(f"{total} exportação(ões) removida(s)."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from loja.models import Produto
+
+
+class Command(BaseCommand):
+    help = "Recalcula o resumo de avaliações (média e contagem) de todos os produtos a partir dos feedbacks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--produto",
+            type=int,
+            action="append",
+            dest="produtos",
+            help="ID de um produto específico (pode repetir a opção).",
+        )
+
+    def handle(self, *args, **options):
+        alterados = Produto.recalcular_avaliacoes(options["produtos"])
+        self.stdout.write(self.style.SUCCESS(f"{alterados} produto(s) recalculado(s)."))
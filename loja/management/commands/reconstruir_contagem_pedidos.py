@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from loja.models import ContagemPedidoStatus
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói a contagem de pedidos por status (ContagemPedidoStatus) com uma "
+        "consulta agrupada sobre os pedidos. Rode periodicamente (cron): corrige o que "
+        "mudou por fora do ORM (SQL direto, bulk_create)."
+    )
+
+    def handle(self, *args, **options):
+        contagem = ContagemPedidoStatus.reconstruir()
+        resumo = ", ".join(f"{status}: {qtd}" for status, qtd in contagem.items())
+        self.stdout.write(self.style.SUCCESS(f"Contagem refeita ({resumo})."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from loja.financeiro import reconstruir_resumo_diario
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o resumo financeiro diário (ResumoFinanceiroDiario) a partir de "
+        "pedidos pagos, itens e despesas. Sem datas, refaz todo o histórico."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--inicio", help="Primeiro dia (AAAA-MM-DD).")
+        parser.add_argument("--fim", help="Último dia (AAAA-MM-DD).")
+        parser.add_argument("--lote", type=int, default=500, help="Tamanho do lote de gravação.")
+
+    def handle(self, *args, **options):
+        inicio = self._data(options["inicio"], "--inicio")
+        fim = self._data(options["fim"], "--fim")
+        if inicio and fim and inicio > fim:
+            raise CommandError("--inicio não pode ser depois de --fim.")
+
+        total = reconstruir_resumo_diario(inicio, fim, lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"{total} dia(s) gravado(s)."))
+
+    @staticmethod
+    def _data(valor, opcao):
+        if not valor:
+            return None
+        try:
+            data = parse_date(valor)
+        except ValueError:
+            data = None
+        if data is None:
+            raise CommandError(f"{opcao}: data inválida '{valor}', use AAAA-MM-DD.")
+        return data
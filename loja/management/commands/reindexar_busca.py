@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from loja.busca import reindexar
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice de busca (TermoBusca) a partir de nome e descrição dos produtos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Tamanho do lote de leitura/gravação.")
+
+    def handle(self, *args, **options):
+        total = reindexar(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"{total} produto(s) indexado(s)."))
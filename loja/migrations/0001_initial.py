@@ -0,0 +1,158 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Despesa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(max_length=100)),
+                ('tipo', models.CharField(choices=[('Fixo', 'Fixo'), ('Variável', 'Variável')], max_length=10)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data', models.DateField(default=django.utils.timezone.now)),
+                ('data_compra', models.DateField(blank=True, null=True)),
+                ('descricao', models.TextField(blank=True, null=True)),
+                ('fornecedor', models.CharField(blank=True, max_length=150, null=True)),
+                ('parcelas', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LancamentoFinanceiro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(max_length=100)),
+                ('tipo', models.CharField(choices=[('receita', 'Receita'), ('despesa', 'Despesa')], max_length=10)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data', models.DateField(default=django.utils.timezone.now)),
+                ('descricao', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Produto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=200)),
+                ('descricao', models.TextField()),
+                ('preco', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('imagem', models.ImageField(blank=True, null=True, upload_to='produtos/')),
+                ('minimo_estoque', models.IntegerField(default=5)),
+                ('ideal_estoque', models.IntegerField(default=10)),
+                ('ativo', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Carrinho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Pedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('Pendente', 'Pendente'), ('Pago', 'Pago'), ('Cancelado', 'Cancelado')], default='Pendente', max_length=20)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('nome_cliente', models.CharField(max_length=100)),
+                ('endereco_entrega', models.TextField()),
+                ('numero_whatsapp', models.CharField(blank=True, max_length=20, null=True)),
+                ('numero_pedido', models.CharField(blank=True, editable=False, max_length=30, null=True, unique=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PedidoItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome_produto', models.CharField(max_length=200)),
+                ('quantidade', models.PositiveIntegerField()),
+                ('preco_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('custo_unitario', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='loja.pedido')),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='loja.produto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovimentacaoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada de Estoque'), ('ajuste', 'Ajuste Manual')], max_length=10)),
+                ('quantidade', models.IntegerField()),
+                ('estoque_final', models.IntegerField()),
+                ('data', models.DateTimeField(auto_now_add=True)),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='loja.produto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ItemCarrinho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField(default=1)),
+                ('preco_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data_adicionado', models.DateTimeField(auto_now_add=True)),
+                ('carrinho', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='loja.carrinho')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='loja.produto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HistoricoCusto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('custo_antigo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('custo_novo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_custos', to='loja.produto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Feedback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nota', models.PositiveSmallIntegerField(choices=[(1, '1 - Péssimo'), (2, '2 - Ruim'), (3, '3 - Regular'), (4, '4 - Bom'), (5, '5 - Excelente')])),
+                ('comentario', models.TextField(blank=True, null=True)),
+                ('visivel', models.BooleanField(default=True)),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feedbacks', to=settings.AUTH_USER_MODEL)),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feedbacks', to='loja.pedido')),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feedbacks', to='loja.produto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EntradaEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_adicionada', models.PositiveIntegerField()),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='loja.produto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustoProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('custo', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('produto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='custo_info', to='loja.produto')),
+            ],
+        ),
+    ]
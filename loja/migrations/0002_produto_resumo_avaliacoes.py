@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='media_nota',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='media_nota_visivel',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='soma_notas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='soma_notas_visiveis',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='total_avaliacoes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='total_avaliacoes_visiveis',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
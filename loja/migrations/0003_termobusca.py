@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0002_produto_resumo_avaliacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=60)),
+                ('peso', models.PositiveSmallIntegerField(default=1)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termos_busca', to='loja.produto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['termo', 'produto'], name='loja_termob_termo_2d8f35_idx')],
+                'constraints': [models.UniqueConstraint(fields=('produto', 'termo'), name='termo_busca_unico_por_produto')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0003_termobusca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='despesa',
+            index=models.Index(fields=['data', 'id'], name='loja_despes_data_601122_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['data_criacao', 'id'], name='loja_feedba_data_cr_c8a29c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['data', 'id'], name='loja_movime_data_18cef8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['data_criacao', 'id'], name='loja_pedido_data_cr_42020e_idx'),
+        ),
+    ]
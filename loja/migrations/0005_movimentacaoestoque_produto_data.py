@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0004_indices_paginacao'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['produto', 'data'], name='loja_movime_produto_62e0f1_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0005_movimentacaoestoque_produto_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoFinanceiroDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True)),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('custo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('despesas_fixas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('despesas_variaveis', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-data'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def preencher_total_itens(apps, schema_editor):
+    """Carrinhos já existentes: soma as unidades dos itens num UPDATE só."""
+    Carrinho = apps.get_model("loja", "Carrinho")
+    ItemCarrinho = apps.get_model("loja", "ItemCarrinho")
+    unidades = (
+        ItemCarrinho.objects.filter(carrinho=OuterRef("pk"))
+        .order_by().values("carrinho").annotate(total=Sum("quantidade")).values("total")
+    )
+    Carrinho.objects.update(total_itens=Coalesce(Subquery(unidades), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0009_reservaestoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrinho',
+            name='total_itens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_total_itens, migrations.RunPython.noop),
+    ]
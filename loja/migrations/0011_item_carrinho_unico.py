@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def juntar_itens_repetidos(apps, schema_editor):
+    """
+    O get_or_create antigo podia gravar o mesmo produto duas vezes no carrinho
+    (dois cliques ao mesmo tempo). Soma as quantidades no item mais antigo e
+    apaga os outros, senão a constraint não pode ser criada.
+    """
+    ItemCarrinho = apps.get_model("loja", "ItemCarrinho")
+    repetidos = (
+        ItemCarrinho.objects.order_by().values("carrinho_id", "produto_id")
+        .annotate(itens=Count("id"), total=Sum("quantidade"), primeiro=Min("id"))
+        .filter(itens__gt=1)
+    )
+    for grupo in repetidos:
+        ItemCarrinho.objects.filter(pk=grupo["primeiro"]).update(quantidade=grupo["total"])
+        ItemCarrinho.objects.filter(
+            carrinho_id=grupo["carrinho_id"], produto_id=grupo["produto_id"],
+        ).exclude(pk=grupo["primeiro"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0010_carrinho_total_itens'),
+    ]
+
+    operations = [
+        migrations.RunPython(juntar_itens_repetidos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='itemcarrinho',
+            constraint=models.UniqueConstraint(fields=('carrinho', 'produto'), name='item_carrinho_unico'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0012_pedido_chave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContagemPedidoStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20, unique=True)),
+                ('quantidade', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
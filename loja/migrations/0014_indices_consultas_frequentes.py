@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loja', '0013_contagempedidostatus'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='despesa',
+            index=models.Index(fields=['tipo', 'data', 'id'], name='loja_despes_tipo_9726ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['produto', 'visivel', 'data_criacao'], name='loja_feedba_produto_c55a60_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['tipo', 'data', 'id'], name='loja_movime_tipo_09acd2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['status', 'data_criacao', 'id'], name='loja_pedido_status_fc43db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', 'data_criacao'], name='loja_pedido_cliente_427910_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'id'], name='loja_produt_ativo_59efaf_idx'),
+        ),
+    ]
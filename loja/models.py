@@ -1,15 +1,27 @@
 
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Sum, OuterRef, Subquery, Case, When, Value, FloatField
+from django.db.models.functions import Cast, Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.utils.timezone import now
 import uuid
+from decimal import Decimal
+
+
+def _invalidar_painel():
+    """Retrato do dashboard (loja/painel.py) desatualizado: descarta no commit."""
+    from .painel import invalidar_painel
+    invalidar_painel()
+
 
 class Produto(models.Model):
     nome = models.CharField(max_length=200)
     descricao = models.TextField()
     preco = models.DecimalField(max_digits=10, decimal_places=2)
     quantidade = models.IntegerField(default=0)  # estoque atual
+    # 🔹 Unidades presas em pedidos pendentes (ReservaEstoque); mantido por loja/estoque.py
+    reservado = models.PositiveIntegerField(default=0)
     imagem = models.ImageField(upload_to='produtos/', blank=True, null=True)
 
     # 🔹 Campos de controle de estoque
@@ -19,6 +31,23 @@ class Produto(models.Model):
     # 🔹 Novo campo para ativar/inativar produto
     ativo = models.BooleanField(default=True)
 
+    # 🔹 Última alteração (entra na versão dos dados do cache de PDFs)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    # 🔹 Resumo das avaliações (mantido pelo Feedback.save() e, na exclusão, por loja/signals.py; não editar à mão)
+    total_avaliacoes = models.PositiveIntegerField(default=0)
+    soma_notas = models.PositiveIntegerField(default=0)
+    media_nota = models.FloatField(default=0, db_index=True)
+    total_avaliacoes_visiveis = models.PositiveIntegerField(default=0)
+    soma_notas_visiveis = models.PositiveIntegerField(default=0)
+    media_nota_visivel = models.FloatField(default=0, db_index=True)
+
+    class Meta:
+        indexes = [
+            # vitrine: ativos, mais novos primeiro (filter(ativo=True).order_by("-id"))
+            models.Index(fields=["ativo", "id"]),
+        ]
+
     def save(self, *args, **kwargs):
         """
         Regra automática:
@@ -36,14 +65,146 @@ class Produto(models.Model):
             if self.ativo is not False:
                 self.ativo = True
 
+        # Não sobrescreve o resumo de avaliações nem a reserva com valores antigos da instância
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in CAMPOS_MANTIDOS_NO_BANCO
+            ]
+
         super().save(*args, **kwargs)
 
+        # 🔹 Mantém índice de busca e cache do autocomplete em dia
+        vitrine = self._estado_vitrine()
+        original = getattr(self, "_vitrine_original", None)
+        if vitrine != original:
+            from .busca import indexar_produto, invalidar_catalogo
+            if original is None or vitrine[:2] != original[:2]:  # nome/descrição
+                indexar_produto(self)
+            invalidar_catalogo()
+            self._vitrine_original = vitrine
+
         def _str_(self):
             return self.nome
 
+    def _estado_vitrine(self):
+        """O que aparece na busca/autocomplete: nome, descrição, ativo e imagem."""
+        return (self.nome, self.descricao, self.ativo, self.imagem.name if self.imagem else None)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Guarda o estado carregado para só reindexar/invalidar a busca quando ele mudar
+        if all(campo in field_names for campo in CAMPOS_VITRINE):
+            instancia._vitrine_original = instancia._estado_vitrine()
+        return instancia
+
     def __str__(self):
         return self.nome
 
+    @property
+    def disponivel(self):
+        """Estoque que ainda pode ir para um carrinho: o atual menos o reservado."""
+        return max(self.quantidade - self.reservado, 0)
+
+    @classmethod
+    def aplicar_avaliacao(cls, produto_id, nota, visivel, sinal=1):
+        """
+        Soma (sinal=1) ou retira (sinal=-1) uma nota do resumo do produto,
+        sem reler os feedbacks.
+        """
+        if not produto_id:
+            return
+
+        deltas = {
+            "total_avaliacoes": F("total_avaliacoes") + sinal,
+            "soma_notas": F("soma_notas") + sinal * nota,
+        }
+        if visivel:
+            deltas["total_avaliacoes_visiveis"] = F("total_avaliacoes_visiveis") + sinal
+            deltas["soma_notas_visiveis"] = F("soma_notas_visiveis") + sinal * nota
+
+        with transaction.atomic():
+            produtos = cls.objects.filter(pk=produto_id)
+            produtos.update(**deltas)
+            produtos.update(**_expressoes_media())
+
+    @classmethod
+    def recalcular_avaliacoes(cls, produto_ids=None):
+        """
+        Recalcula o resumo de avaliações a partir da tabela de Feedback.
+        Usado pelas ações em lote (queryset.update) e pelo comando de backfill.
+        """
+        produtos = cls.objects.all()
+        if produto_ids is not None:
+            produtos = produtos.filter(pk__in=produto_ids)
+
+        def agregado(funcao, **filtros):
+            sub = (
+                Feedback.objects
+                .filter(produto=OuterRef("pk"), **filtros)
+                .order_by()
+                .values("produto")
+                .annotate(valor=funcao)
+                .values("valor")[:1]
+            )
+            return Coalesce(Subquery(sub), 0)
+
+        with transaction.atomic():
+            alterados = produtos.update(
+                total_avaliacoes=agregado(Count("id")),
+                soma_notas=agregado(Sum("nota")),
+                total_avaliacoes_visiveis=agregado(Count("id"), visivel=True),
+                soma_notas_visiveis=agregado(Sum("nota"), visivel=True),
+            )
+            produtos.update(**_expressoes_media())
+        return alterados
+
+
+CAMPOS_VITRINE = ("nome", "descricao", "ativo", "imagem")
+
+CAMPOS_AVALIACAO = (
+    "total_avaliacoes", "soma_notas", "media_nota",
+    "total_avaliacoes_visiveis", "soma_notas_visiveis", "media_nota_visivel",
+)
+
+# Mantidos por UPDATEs atômicos; o save() da instância não os regrava
+CAMPOS_MANTIDOS_NO_BANCO = CAMPOS_AVALIACAO + ("reservado",)
+
+
+def _expressoes_media():
+    """Expressões SQL que derivam as médias a partir das somas e contagens."""
+    def media(soma, total):
+        return Case(
+            When(**{f"{total}__gt": 0}, then=Cast(soma, FloatField()) / F(total)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    return {
+        "media_nota": media("soma_notas", "total_avaliacoes"),
+        "media_nota_visivel": media("soma_notas_visiveis", "total_avaliacoes_visiveis"),
+    }
+
+
+class TermoBusca(models.Model):
+    """Termo normalizado (sem acento, minúsculo) de nome/descrição de um produto."""
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name="termos_busca")
+    termo = models.CharField(max_length=60)
+    peso = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # busca por prefixo: WHERE termo LIKE 'abc%'
+            models.Index(fields=["termo", "produto"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["produto", "termo"], name="termo_busca_unico_por_produto"),
+        ]
+
+    def __str__(self):
+        return f"{self.termo} → {self.produto_id}"
+
 
 class CustoProduto(models.Model):
     produto = models.OneToOneField("Produto", on_delete=models.CASCADE, related_name="custo_info")
@@ -55,15 +216,45 @@ class CustoProduto(models.Model):
 class Carrinho(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE)
     valor_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    # 🔹 Unidades no carrinho (contador da navbar); mantido junto com valor_total por
+    # aplicar_delta()/recalcular_contadores(), sem ler os itens em Python
+    total_itens = models.PositiveIntegerField(default=0)
     data_criacao = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Carrinho de {self.usuario.username}"
 
+    @classmethod
+    def aplicar_delta(cls, carrinho_id, unidades, valor):
+        """
+        Soma `unidades` e `valor` a total_itens/valor_total direto no banco,
+        num UPDATE só, sem ler os itens. Chamado a cada mudança de item.
+        """
+        cls.objects.filter(pk=carrinho_id).update(
+            total_itens=F("total_itens") + unidades,
+            valor_total=F("valor_total") + valor,
+        )
+
+    @classmethod
+    def recalcular_contadores(cls, carrinho_id):
+        """Refaz total_itens/valor_total com as somas dos itens, num UPDATE só (subconsultas)."""
+        dinheiro = models.DecimalField(max_digits=10, decimal_places=2)
+        itens = ItemCarrinho.objects.filter(carrinho=OuterRef("pk")).order_by().values("carrinho")
+        unidades = itens.annotate(s=Sum("quantidade")).values("s")
+        valor = itens.annotate(s=Sum(F("quantidade") * F("preco_unitario"), output_field=dinheiro)).values("s")
+        cls.objects.filter(pk=carrinho_id).update(
+            total_itens=Coalesce(Subquery(unidades), 0),
+            valor_total=Coalesce(Subquery(valor), Value(Decimal("0.00")), output_field=dinheiro),
+        )
+
     def calcular_total(self):
-        total = sum(item.subtotal() for item in self.itemcarrinho_set.all())
-        self.valor_total = total
-        self.save()
+        """Recalcula os dois contadores a partir dos itens (grava só se mudaram)."""
+        itens = list(self.itemcarrinho_set.all())
+        total = sum((item.subtotal() for item in itens), Decimal("0.00"))
+        total_itens = sum(item.quantidade for item in itens)
+        if (self.valor_total, self.total_itens) != (total, total_itens):
+            self.valor_total, self.total_itens = total, total_itens
+            self.save(update_fields=["valor_total", "total_itens"])
         return total
 
     def total(self):
@@ -75,6 +266,12 @@ class ItemCarrinho(models.Model):
     preco_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     data_adicionado = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # um item por produto em cada carrinho: o "adicionar" é um upsert nessa chave
+            models.UniqueConstraint(fields=["carrinho", "produto"], name="item_carrinho_unico"),
+        ]
+
     def subtotal(self):
         return self.quantidade * self.preco_unitario
 
@@ -102,6 +299,16 @@ class MovimentacaoEstoque(models.Model):
     data = models.DateTimeField(auto_now_add=True)
     observacao = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # paginação por cursor (data, id) no histórico/relatório de estoque
+            models.Index(fields=["data", "id"]),
+            # última movimentação de cada produto (gestão de estoque)
+            models.Index(fields=["produto", "data"]),
+            # histórico/relatório de estoque filtrado por tipo, mesma paginação (data, id)
+            models.Index(fields=["tipo", "data", "id"]),
+        ]
+
     def __str__(self):
         return f"[{self.get_tipo_display()}] {self.produto.nome} - {self.quantidade} un. - {self.data.strftime('%d/%m/%Y %H:%M')}"
     
@@ -125,6 +332,19 @@ class Pedido(models.Model):
     numero_whatsapp = models.CharField(max_length=20, blank=True, null=True)
 
     numero_pedido = models.CharField(max_length=30, unique=True, editable=False, blank=True, null=True)
+    # 🔹 Token do formulário de checkout: reenvio/duplo clique devolve este pedido em vez de criar outro
+    chave_idempotencia = models.CharField(max_length=64, unique=True, editable=False, blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # paginação por cursor (data_criacao, id) em pedidos/relatório de pedidos
+            models.Index(fields=["data_criacao", "id"]),
+            # pagos por período (resumo financeiro, dashboard, pedidos pagos) e filtro de status com o cursor
+            models.Index(fields=["status", "data_criacao", "id"]),
+            # "meus pedidos": pedidos do cliente, mais recentes primeiro
+            models.Index(fields=["cliente", "data_criacao"]),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
@@ -134,10 +354,87 @@ class Pedido(models.Model):
             # Resultado: 202508-A1B2C3D4 (impossível ter conflito)
             self.numero_pedido = f"{prefixo}-{codigo_unico}"
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # 🔹 Estado anterior lido com a linha travada: dois saves simultâneos do mesmo
+            # pedido não veem o mesmo status antigo (o que somaria os deltas duas vezes)
+            anterior = None
+            if self.pk:
+                anterior = (
+                    Pedido.objects.select_for_update().filter(pk=self.pk)
+                    .values("status", "total", "data_criacao").first()
+                )
+
+            super().save(*args, **kwargs)
+
+            atual = {"status": self.status, "total": self.total, "data_criacao": self.data_criacao}
+            # 🔹 Contador por status: +1 no novo, -1 no anterior
+            if anterior is None:
+                ContagemPedidoStatus.aplicar_deltas({self.status: 1})
+            elif anterior["status"] != self.status:
+                ContagemPedidoStatus.aplicar_deltas({anterior["status"]: -1, self.status: 1})
+            # 🔹 Mantém o resumo financeiro diário em dia (só pedidos pagos contam)
+            if anterior != atual:
+                _invalidar_painel()
+                dias = set()
+                for estado in (anterior, atual):
+                    if estado and estado["status"] == "Pago":
+                        dias.add(dia_do_pedido(estado["data_criacao"]))
+                ResumoFinanceiroDiario.atualizar_dias(dias)
 
     def __str__(self):
         return f"Pedido {self.numero_pedido or self.id} - {self.cliente.username}"
+
+
+class ContagemPedidoStatus(models.Model):
+    """
+    Quantos pedidos há em cada status, para o dashboard e a tela de pedidos
+    não contarem a tabela de pedidos a cada acesso.
+
+    Mantido na mesma transação por Pedido.save() (o checkout cria o pedido
+    por aí), pela atualização de status em lote e, nas exclusões — inclusive
+    em cascata e por queryset —, pelo post_delete em loja/signals.py. A tabela
+    vale só completa — uma linha por status — e sem negativos: fora disso a
+    leitura a refaz com uma consulta agrupada, e até lá as mudanças não são
+    somadas. O que passa por fora do ORM (SQL direto, bulk_create de pedidos)
+    só é corrigido por `manage.py reconstruir_contagem_pedidos`, que deve rodar
+    periodicamente (cron, ex.: de madrugada).
+    """
+    status = models.CharField(max_length=20, unique=True)
+    quantidade = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.quantidade}"
+
+    @classmethod
+    def aplicar_deltas(cls, deltas):
+        """Soma `deltas` ({status: +n/-n}) às linhas existentes, um UPDATE por status."""
+        for status, delta in deltas.items():
+            if delta:
+                cls.objects.filter(status=status).update(quantidade=F("quantidade") + delta)
+
+    @classmethod
+    @transaction.atomic
+    def reconstruir(cls):
+        """Refaz a tabela a partir de `Pedido.values('status').annotate(Count)`. Retorna {status: qtd}."""
+        contagem = dict.fromkeys((valor for valor, _ in Pedido.STATUS_CHOICES), 0)
+        contagem.update(Pedido.objects.order_by().values_list("status").annotate(qtd=Count("id")))
+        # upsert: duas leituras refazendo ao mesmo tempo não esbarram na chave única
+        # (o MySQL não aceita indicar a coluna do conflito; o UNIQUE de `status` basta)
+        alvo = {"unique_fields": ["status"]} if connection.features.supports_update_conflicts_with_target else {}
+        cls.objects.bulk_create(
+            [cls(status=status, quantidade=qtd) for status, qtd in contagem.items()],
+            update_conflicts=True, update_fields=["quantidade"], **alvo,
+        )
+        cls.objects.exclude(status__in=contagem).delete()
+        return contagem
+
+    @classmethod
+    def contagem(cls):
+        """{status: quantidade} com todos os status, lido da tabela (ou refeito se incompleta/negativa)."""
+        contagem = dict(cls.objects.values_list("status", "quantidade"))
+        if not all(contagem.get(valor, -1) >= 0 for valor, _ in Pedido.STATUS_CHOICES):
+            contagem = cls.reconstruir()
+        return contagem
 # ----------------------------------------------------
 # Model para armazenar cada item que compõe o pedido
 # ----------------------------------------------------
@@ -155,9 +452,36 @@ class PedidoItem(models.Model):
     def subtotal(self):
         return self.quantidade * self.preco_unitario
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            _invalidar_painel()  # mais vendidos
+            # 🔹 Custo congelado de pedido pago entra no resumo do dia
+            if self.pedido.status == "Pago":
+                ResumoFinanceiroDiario.atualizar_dias({dia_do_pedido(self.pedido.data_criacao)})
+
     def __str__(self):
         return f"{self.quantidade}x {self.nome_produto} no Pedido #{self.pedido.id}"
     
+
+class ReservaEstoque(models.Model):
+    """
+    Unidades separadas para um pedido pendente entre o checkout e o
+    pagamento. Somadas em `Produto.reservado`; saem quando o pedido é pago
+    (viram baixa), cancelado, apagado (pre_delete em loja/signals.py) ou quando
+    vencem (comando liberar_reservas). Para apagar reservas soltas use
+    `estoque.liberar_reservas`, que também desconta o `reservado`.
+    """
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name="reservas")
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name="reservas")
+    quantidade = models.PositiveIntegerField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantidade}x {self.produto_id} reservado(s) para o pedido #{self.pedido_id}"
+
+
 class HistoricoCusto(models.Model):
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name="historico_custos")
     custo_antigo = models.DecimalField(max_digits=10, decimal_places=2)
@@ -191,6 +515,30 @@ class Feedback(models.Model):
     data_criacao = models.DateTimeField(default=timezone.now)
     data_atualizacao = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # paginação por cursor (data_criacao, id) na lista de feedbacks
+            models.Index(fields=["data_criacao", "id"]),
+            # feedbacks visíveis de um produto, mais recentes primeiro (página do produto)
+            models.Index(fields=["produto", "visivel", "data_criacao"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        # 🔹 Mantém o resumo de avaliações do produto em dia (delta da nota antiga → nova)
+        anterior = None
+        if self.pk:
+            anterior = Feedback.objects.filter(pk=self.pk).values("produto_id", "nota", "visivel").first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            _invalidar_painel()  # últimos feedbacks
+            atual = {"produto_id": self.produto_id, "nota": self.nota, "visivel": self.visivel}
+            if anterior != atual:
+                if anterior:
+                    Produto.aplicar_avaliacao(anterior["produto_id"], anterior["nota"], anterior["visivel"], sinal=-1)
+                Produto.aplicar_avaliacao(self.produto_id, self.nota, self.visivel)
+
     def __str__(self):
         return f"{self.usuario.username} - {self.nota}⭐ ({'visível' if self.visivel else 'oculto'})"
 
@@ -225,5 +573,120 @@ class Despesa(models.Model):
     fornecedor = models.CharField(max_length=150, blank=True, null=True)  # 🔹 novo campo
     parcelas = models.PositiveIntegerField(default=1)  # 🔹 número de parcelas
 
+    class Meta:
+        indexes = [
+            # paginação por cursor (data, id) na gestão de despesas
+            models.Index(fields=["data", "id"]),
+            # gestão/relatório de despesas filtrado por tipo, mesma paginação
+            models.Index(fields=["tipo", "data", "id"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        # 🔹 Recalcula o resumo do dia antigo e do novo (a data pode ter mudado)
+        anterior = None
+        if self.pk:
+            anterior = Despesa.objects.filter(pk=self.pk).values_list("data", flat=True).first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ResumoFinanceiroDiario.atualizar_dias({anterior, self._meta.get_field("data").to_python(self.data)})
+
     def __str__(self):
         return f"{self.categoria} - R$ {self.valor:.2f} ({self.fornecedor or 'Sem fornecedor'})"
+
+
+def dia_do_pedido(data_criacao):
+    """Dia (no fuso local) em que um pedido entra no resumo financeiro."""
+    if data_criacao is None:
+        return None
+    return timezone.localdate(data_criacao)
+
+
+class ResumoFinanceiroDiario(models.Model):
+    """
+    Totais de um dia: receita e custo dos pedidos pagos e despesas fixas/variáveis.
+    Mantido pelo save() de Pedido, PedidoItem e Despesa e, nas exclusões, pelo
+    post_delete em loja/signals.py; para refazer o histórico use
+    `manage.py reconstruir_resumo_financeiro`.
+    """
+    data = models.DateField(unique=True)
+    receita = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    custo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    despesas_fixas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    despesas_variaveis = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-data"]
+
+    def __str__(self):
+        return f"Resumo {self.data:%d/%m/%Y} - Receita R$ {self.receita}"
+
+    @classmethod
+    def atualizar_dias(cls, dias):
+        from .financeiro import atualizar_resumo_diario
+        atualizar_resumo_diario(dias)
+        if any(dias):
+            _invalidar_painel()  # cards financeiros do dashboard
+
+
+class ExportacaoRelatorio(models.Model):
+    """
+    Pedido de geração de um relatório em PDF, processado fora do request
+    pelo pool de workers (ver loja/exportacao.py). O arquivo fica em
+    MEDIA_ROOT/relatorios/ até `expira_em`.
+    """
+    PENDENTE = "pendente"
+    PROCESSANDO = "processando"
+    CONCLUIDO = "concluido"
+    ERRO = "erro"
+    STATUS_CHOICES = [
+        (PENDENTE, "Pendente"),
+        (PROCESSANDO, "Processando"),
+        (CONCLUIDO, "Concluído"),
+        (ERRO, "Erro"),
+    ]
+
+    tipo = models.CharField(max_length=30)  # produtos, pedidos, estoque, financeiro, feedbacks
+    parametros = models.JSONField(default=dict, blank=True)  # filtros da tela
+    chave = models.CharField(max_length=64, db_index=True)  # hash de tipo + filtros
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    progresso = models.PositiveSmallIntegerField(default=0)  # 0 a 100
+    arquivo = models.FileField(upload_to="relatorios/", blank=True)
+    erro = models.TextField(blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    expira_em = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    @property
+    def nome_arquivo(self):
+        return f"relatorio_{self.tipo}.pdf"
+
+    @property
+    def expirada(self):
+        return self.expira_em is not None and self.expira_em <= timezone.now()
+
+    def delete(self, *args, **kwargs):
+        # 🔹 Apaga também o PDF do disco
+        if self.arquivo:
+            self.arquivo.delete(save=False)
+        return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"Exportação {self.tipo} #{self.pk} ({self.status})"
+
+
+class VersaoDados(models.Model):
+    """
+    Contador de alterações de uma tabela lida pelos relatórios em PDF (o
+    `label` do model, ex.: "loja.Pedido"). Faz parte da chave do cache de
+    PDFs: cada alteração confirmada soma 1 e os PDFs antigos deixam de valer.
+    Mantido por `exportacao.invalidar_relatorios` (sinais + caminhos em lote).
+    """
+    tabela = models.CharField(max_length=100, unique=True)
+    versao = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.tabela} v{self.versao}"
@@ -0,0 +1,185 @@
+"""
+Paginação por cursor (keyset).
+
+Em vez de `COUNT(*)` + `OFFSET n` (Paginator do Django), cada página começa
+logo após a última linha da anterior:
+
+    WHERE (data, id) < (:data, :id) ORDER BY data DESC, id DESC LIMIT n
+
+Com um índice em (data, id), a página 500 custa o mesmo que a página 1.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+PARAMETROS_CURSOR = ("depois", "antes", "page")
+
+
+class PaginaCursor:
+    """
+    Uma página de resultados. Itera como uma lista e expõe o que os
+    templates precisam para montar os links (ver loja/_paginacao_cursor.html).
+    """
+
+    def __init__(self, object_list, has_next, has_previous, querystring_proxima="",
+                 querystring_anterior="", total=None, total_aproximado=False):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.querystring_proxima = querystring_proxima
+        self.querystring_anterior = querystring_anterior
+        self.total = total
+        self.total_aproximado = total_aproximado
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+
+def _campos_ordenacao(model, ordenacao):
+    campos = []
+    for item in ordenacao:
+        desc = item.startswith("-")
+        nome = item.lstrip("-")
+        campos.append((nome, desc, model._meta.get_field(nome)))
+    return campos
+
+
+def _codificar(obj, campos):
+    valores = [campo.value_to_string(obj) for _, _, campo in campos]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip("=")
+
+
+def _decodificar(token, campos):
+    try:
+        bruto = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        valores = json.loads(bruto)
+        if len(valores) != len(campos):
+            return None
+        return [campo.to_python(valor) for (_, _, campo), valor in zip(campos, valores)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _filtro_apos(campos, valores, inverter=False):
+    """
+    Monta o "(a, b) < (x, y)" de forma portável:
+    a < x OR (a = x AND b < y)   — invertendo o sentido para voltar páginas.
+    """
+    condicao = Q()
+    iguais = {}
+    for (nome, desc, _), valor in zip(campos, valores):
+        para_tras = desc != inverter
+        lookup = f"{nome}__lt" if para_tras else f"{nome}__gt"
+        condicao |= Q(**iguais, **{lookup: valor})
+        iguais[nome] = valor
+    return condicao
+
+
+def _querystring(request, **cursor):
+    params = request.GET.copy()
+    for chave in PARAMETROS_CURSOR:
+        params.pop(chave, None)
+    params.update(cursor)
+    return params.urlencode()
+
+
+def paginar_por_cursor(request, queryset, por_pagina, ordenacao=("-id",), contagem=None, teto_contagem=1000):
+    """
+    Pagina `queryset` por cursor usando os parâmetros GET `depois`/`antes`.
+
+    - `ordenacao`: campos do model; o último deve ser único (normalmente "id").
+    - `contagem`: None (não conta), "exata" (COUNT completo) ou "aproximada"
+      (conta no máximo `teto_contagem` linhas e mostra "+N").
+    """
+    campos = _campos_ordenacao(queryset.model, ordenacao)
+    ordem_invertida = [("" if nome.startswith("-") else "-") + nome.lstrip("-") for nome in ordenacao]
+
+    depois = request.GET.get("depois")
+    antes = request.GET.get("antes")
+    cursor_depois = _decodificar(depois, campos) if depois else None
+    cursor_antes = _decodificar(antes, campos) if antes and not cursor_depois else None
+
+    if cursor_antes:
+        linhas = list(
+            queryset.filter(_filtro_apos(campos, cursor_antes, inverter=True))
+            .order_by(*ordem_invertida)[:por_pagina + 1]
+        )
+        has_previous = len(linhas) > por_pagina
+        linhas = linhas[:por_pagina][::-1]
+        has_next = True
+    else:
+        base = queryset
+        if cursor_depois:
+            base = base.filter(_filtro_apos(campos, cursor_depois))
+        linhas = list(base.order_by(*ordenacao)[:por_pagina + 1])
+        has_next = len(linhas) > por_pagina
+        linhas = linhas[:por_pagina]
+        has_previous = cursor_depois is not None
+
+    total, total_aproximado = None, False
+    if contagem == "exata":
+        total = queryset.order_by().count()
+    elif contagem == "aproximada":
+        total = queryset.order_by()[:teto_contagem + 1].count()
+        if total > teto_contagem:
+            total, total_aproximado = teto_contagem, True
+
+    return PaginaCursor(
+        linhas,
+        has_next=has_next and bool(linhas),
+        has_previous=has_previous and bool(linhas),
+        querystring_proxima=_querystring(request, depois=_codificar(linhas[-1], campos)) if linhas else "",
+        querystring_anterior=_querystring(request, antes=_codificar(linhas[0], campos)) if linhas else "",
+        total=total,
+        total_aproximado=total_aproximado,
+    )
+
+
+def iterar_em_lotes(queryset, ordenacao=("id",), lote=2000):
+    """
+    Percorre o queryset inteiro em lotes de `lote` linhas, com o mesmo
+    "WHERE (a, b) > (x, y)" do cursor. Diferente de `.iterator()`, mantém a
+    memória constante também no MySQL (o mysqlclient traz o resultado inteiro
+    de uma vez, mesmo com chunk_size).
+
+    Aceita também `.values()` ordenado por anotações (ex.: "lucro" no resumo
+    financeiro): o valor do cursor sai do dict da linha.
+    """
+    campos = [
+        (item.lstrip("-"), item.startswith("-"), _atributo(queryset.model, item.lstrip("-")))
+        for item in ordenacao
+    ]
+    queryset = queryset.order_by(*ordenacao)
+
+    cursor = None
+    while True:
+        base = queryset.filter(_filtro_apos(campos, cursor)) if cursor else queryset
+        linhas = list(base[:lote])
+        yield from linhas
+        if len(linhas) < lote:
+            return
+        ultima = linhas[-1]
+        if isinstance(ultima, dict):
+            cursor = [ultima[nome] for nome, _, _ in campos]
+        else:
+            cursor = [getattr(ultima, atributo) for _, _, atributo in campos]
+
+
+def _atributo(model, nome):
+    """Atributo da instância com o valor do campo (`produto_id` para o FK `produto`); anotações ficam com o nome."""
+    try:
+        return model._meta.get_field(nome).attname
+    except FieldDoesNotExist:
+        return nome
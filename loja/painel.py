@@ -0,0 +1,101 @@
+"""
+Dados do dashboard administrativo (cards, listas e mini-gráfico), calculados
+em poucas consultas agrupadas e guardados no cache.
+
+O retrato vale por PAINEL_VALIDADE segundos e é descartado antes disso
+sempre que algo que ele mostra muda: pedido (status, total, itens),
+despesa/resumo financeiro ou feedback (`invalidar_painel`, chamado pelos
+models e pelas atualizações em lote). Com mais de um processo, o cache
+precisa ser compartilhado para a invalidação valer em todos; com o LocMem
+padrão, a validade curta limita o atraso.
+
+Na tela, "Recalcular agora" (`recalcular_painel`) refaz o retrato na hora.
+"""
+from calendar import monthrange
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import ExtractDay
+from django.utils import timezone
+
+from .financeiro import calcular_lucro, totais_do_periodo
+from .models import ContagemPedidoStatus, Feedback, Pedido, PedidoItem
+
+CHAVE_PAINEL = "painel:dashboard"
+
+def invalidar_painel():
+    """Descarta o retrato quando a transação atual confirmar (na hora, se não houver uma)."""
+    transaction.on_commit(lambda: cache.delete(CHAVE_PAINEL))
+
+
+def _vendas_do_mes_por_dia(inicio_mes, fim_mes):
+    """Labels e valores por dia do mês (0 nos dias sem venda) dos pedidos pagos, e o total."""
+    valores = {dia: 0.0 for dia in range(1, fim_mes.day + 1)}
+    total = Decimal("0.00")
+    por_dia = (
+        Pedido.objects
+        .filter(status="Pago", data_criacao__gte=inicio_mes, data_criacao__lte=fim_mes)
+        .annotate(dia=ExtractDay("data_criacao"))
+        .values("dia")
+        .annotate(total=Sum("total"))
+        .order_by()
+    )
+    for linha in por_dia:
+        total += linha["total"] or 0
+        if linha["dia"] in valores:
+            valores[linha["dia"]] = float(linha["total"] or 0)
+    return [f"{dia:02d}" for dia in valores], list(valores.values()), total
+
+
+def calcular_painel():
+    """Tudo o que o dashboard mostra, como dados simples (cabe no cache)."""
+    agora = timezone.now()
+    inicio_mes = agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    fim_mes = agora.replace(
+        day=monthrange(agora.year, agora.month)[1], hour=23, minute=59, second=59, microsecond=999999
+    )
+
+    mini_labels, mini_values, vendas_mes = _vendas_do_mes_por_dia(inicio_mes, fim_mes)
+    por_status = ContagemPedidoStatus.contagem()
+    totais = totais_do_periodo(inicio_mes.date(), fim_mes.date())
+
+    return {
+        "vendas_mes": vendas_mes,
+        "mini_labels": mini_labels,
+        "mini_values": mini_values,
+        "pedidos_pendentes": por_status["Pendente"],
+        "pedidos_pagos": por_status["Pago"],
+        "pedidos_cancelados": por_status["Cancelado"],
+        "ultimos_pedidos": list(
+            Pedido.objects.order_by("-data_criacao")
+            .values("numero_pedido", "cliente__username", "total", "status")[:3]
+        ),
+        "top_produtos": list(
+            PedidoItem.objects
+            .values("produto__nome")
+            .annotate(total_vendido=Sum("quantidade"), ultima_venda=Max("pedido__data_criacao"))
+            .order_by("-total_vendido")[:5]
+        ),
+        "feedbacks": list(
+            Feedback.objects.order_by("-data_criacao")
+            .values("produto__nome", "usuario__username", "comentario", "nota", "data_criacao")[:5]
+        ),
+        "receita_total": totais["receita"],
+        "custo_total": totais["custo"],
+        "despesas_fixas": totais["despesas_fixas"],
+        "despesas_variaveis": totais["despesas_variaveis"],
+        "lucro_liquido": calcular_lucro(totais),
+        "calculado_em": agora,
+    }
+
+
+def painel(recalcular=False):
+    """O retrato do cache, ou um novo (também quando `recalcular=True`)."""
+    dados = None if recalcular else cache.get(CHAVE_PAINEL)
+    if dados is None:
+        dados = calcular_painel()
+        cache.set(CHAVE_PAINEL, dados, getattr(settings, "PAINEL_VALIDADE", 60))
+    return dados
@@ -0,0 +1,276 @@
+"""
+Consultas dos relatórios de gestão, descritas de forma declarativa.
+
+Cada relatório (`RELATORIOS[tipo]`) diz quais parâmetros GET aceita, como
+cada um vira uma condição, as ordenações possíveis e o que carregar junto
+(`select_related`/`only`). A tela, o PDF e as planilhas pedem o queryset ao
+mesmo objeto, então filtram e ordenam exatamente igual:
+
+    relatorio = RELATORIOS["pedidos"]
+    pedidos = relatorio.queryset(request.GET)          # já ordenado
+    ordenacao = relatorio.ordenacao(request.GET)       # para cursor/lotes
+
+A conversão dos filtros (datas, números, escolhas) gera um `Plano`, guardado
+em cache pelos filtros normalizados: parâmetros de paginação ou que o
+relatório não conhece não entram na chave.
+"""
+import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .financeiro import anotar_custo, valores_do_resumo
+from .models import (
+    Feedback, LancamentoFinanceiro, MovimentacaoEstoque, Pedido, Produto, ResumoFinanceiroDiario,
+)
+
+
+# -------------------------------
+# 🔧 CONVERSORES (valor inválido → None, o filtro é ignorado)
+# -------------------------------
+
+def _decimal(valor):
+    try:
+        return Decimal(valor)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _inteiro(valor):
+    try:
+        return int(valor)
+    except ValueError:
+        return None
+
+
+def _data(valor):
+    try:
+        return parse_date(valor)
+    except ValueError:  # formato certo, data inexistente (ex.: 2025-02-30)
+        return None
+
+
+def _inicio_do_dia(valor):
+    data = _data(valor)
+    return timezone.make_aware(datetime.datetime.combine(data, datetime.time.min)) if data else None
+
+
+def _fim_do_dia(valor):
+    # DateTimeField: o dia final vai até 23:59:59.999999
+    data = _data(valor)
+    return timezone.make_aware(datetime.datetime.combine(data, datetime.time.max)) if data else None
+
+
+def _booleano(valor):
+    return {"True": True, "False": False}.get(valor)
+
+
+# -------------------------------
+# 🔧 FILTROS E RELATÓRIOS
+# -------------------------------
+
+class Filtro:
+    """Parâmetro GET aplicado como `lookup=valor`, depois de passar por `converter`."""
+
+    def __init__(self, parametro, lookup, converter=None):
+        self.parametro = parametro
+        self.lookup = lookup
+        self.converter = converter
+
+    def condicao(self, valor):
+        if self.converter:
+            valor = self.converter(valor)
+        if valor is None:
+            return None
+        return Q(**{self.lookup: valor})
+
+
+class Opcoes(Filtro):
+    """Parâmetro de escolha: cada valor aceito tem a sua condição pronta."""
+
+    def __init__(self, parametro, opcoes):
+        super().__init__(parametro, None)
+        self.opcoes = opcoes
+
+    def condicao(self, valor):
+        return self.opcoes.get(valor)
+
+
+class Plano:
+    """Condição e ordenação já resolvidas para um conjunto de filtros."""
+
+    __slots__ = ("condicao", "ordenacao")
+
+    def __init__(self, condicao, ordenacao):
+        self.condicao = condicao
+        self.ordenacao = ordenacao
+
+
+class Relatorio:
+    """
+    Especificação de um relatório.
+
+    - `ordenacoes`: valor de `ordenar_por` → campos (o último desempata, para
+      cursor/lotes); o que não estiver aqui usa `ordenacao_padrao`.
+    - `relacionados`/`campos`: `select_related` e `only` da consulta; os
+      campos cobrem tudo que a tela, o PDF e as planilhas mostram.
+    - `preparar`: ajuste final do queryset (anotações, `values`).
+    """
+
+    def __init__(self, modelo, filtros, ordenacao_padrao=("-id",), ordenacoes=None,
+                 relacionados=(), campos=(), preparar=None):
+        self.modelo = modelo
+        self.filtros = filtros
+        self.ordenacao_padrao = ordenacao_padrao
+        self.ordenacoes = ordenacoes or {}
+        self.relacionados = relacionados
+        self.campos = campos
+        self.preparar = preparar
+        self.parametros = {filtro.parametro for filtro in filtros} | ({"ordenar_por"} if self.ordenacoes else set())
+
+    def normalizar(self, params):
+        """Só os parâmetros que este relatório usa, preenchidos e em ordem estável."""
+        return tuple(sorted(
+            (nome, params.get(nome)) for nome in self.parametros if params.get(nome) not in (None, "")
+        ))
+
+    def compilar(self, params):
+        return _compilar(self, self.normalizar(params))
+
+    def ordenacao(self, params):
+        return self.compilar(params).ordenacao
+
+    def queryset(self, params):
+        plano = self.compilar(params)
+        consulta = self.modelo.objects.filter(plano.condicao)
+        if self.relacionados:
+            consulta = consulta.select_related(*self.relacionados)
+        if self.campos:
+            consulta = consulta.only(*self.campos)
+        if self.preparar:
+            consulta = self.preparar(consulta)
+        return consulta.order_by(*plano.ordenacao)
+
+
+@lru_cache(maxsize=512)
+def _compilar(relatorio, normalizados):
+    valores = dict(normalizados)
+    condicao = Q()
+    for filtro in relatorio.filtros:
+        if filtro.parametro in valores:
+            parcial = filtro.condicao(valores[filtro.parametro])
+            if parcial is not None:
+                condicao &= parcial
+    ordenacao = relatorio.ordenacoes.get(valores.get("ordenar_por"), relatorio.ordenacao_padrao)
+    return Plano(condicao, ordenacao)
+
+
+# -------------------------------
+# 📋 RELATÓRIOS
+# -------------------------------
+
+RELATORIO_PRODUTOS = Relatorio(
+    Produto,
+    filtros=[
+        Filtro("nome", "nome__icontains"),
+        Filtro("preco_min", "preco__gte", _decimal),
+        Filtro("preco_max", "preco__lte", _decimal),
+        Filtro("qtd_min", "quantidade__gte", _inteiro),
+        Filtro("qtd_max", "quantidade__lte", _inteiro),
+        Opcoes("status_estoque", {
+            "minimo": Q(quantidade__lte=F("minimo_estoque")),
+            "ideal": Q(quantidade__gt=F("minimo_estoque"), quantidade__lte=F("ideal_estoque")),
+            "bom": Q(quantidade__gt=F("ideal_estoque")),
+        }),
+    ],
+    ordenacao_padrao=("id",),
+    ordenacoes={
+        "nome": ("nome", "id"),
+        "preco": ("preco", "id"),
+        "quantidade": ("quantidade", "id"),
+        "recente": ("-id",),
+    },
+    relacionados=("custo_info",),
+    campos=("nome", "preco", "quantidade", "minimo_estoque", "ideal_estoque", "ativo", "custo_info__custo"),
+)
+
+RELATORIO_PEDIDOS = Relatorio(
+    Pedido,
+    filtros=[
+        Filtro("numero", "numero_pedido__icontains"),
+        Filtro("cliente", "cliente__username__icontains"),
+        Filtro("status", "status"),
+        Filtro("valor_min", "total__gte", _decimal),
+        Filtro("valor_max", "total__lte", _decimal),
+        Filtro("data_inicio", "data_criacao__gte", _inicio_do_dia),
+        Filtro("data_fim", "data_criacao__lte", _fim_do_dia),
+    ],
+    ordenacao_padrao=("-data_criacao", "-id"),
+    relacionados=("cliente",),
+    campos=("numero_pedido", "nome_cliente", "status", "total", "data_criacao", "cliente__username"),
+    preparar=anotar_custo,  # custo_total
+)
+
+RELATORIO_ESTOQUE = Relatorio(
+    MovimentacaoEstoque,
+    filtros=[
+        Filtro("produto", "produto__nome__icontains"),
+        Filtro("tipo", "tipo"),
+        Filtro("qtd_min", "quantidade__gte", _inteiro),
+        Filtro("qtd_max", "quantidade__lte", _inteiro),
+        Filtro("data_inicio", "data__gte", _inicio_do_dia),
+        Filtro("data_fim", "data__lte", _fim_do_dia),
+    ],
+    ordenacao_padrao=("-data", "-id"),
+    relacionados=("produto",),
+    campos=("tipo", "quantidade", "estoque_final", "data", "observacao", "produto__nome"),
+)
+
+RELATORIO_FINANCEIRO = Relatorio(
+    ResumoFinanceiroDiario,
+    filtros=[
+        Filtro("data_inicio", "data__gte", _data),
+        Filtro("data_fim", "data__lte", _data),
+    ],
+    ordenacao_padrao=("-data",),
+    ordenacoes={campo: (f"-{campo}", "-data") for campo in ("receita", "custo", "fixa", "variavel", "lucro")},
+    preparar=valores_do_resumo,
+)
+
+RELATORIO_FEEDBACKS = Relatorio(
+    Feedback,
+    filtros=[
+        Filtro("produto", "produto__nome__icontains"),
+        Filtro("usuario", "usuario__username__icontains"),
+        Filtro("nota", "nota", _inteiro),
+        Filtro("visivel", "visivel", _booleano),
+    ],
+    ordenacao_padrao=("-id",),
+    relacionados=("produto", "usuario"),
+    campos=("nota", "comentario", "visivel", "data_criacao", "produto__nome", "usuario__username"),
+)
+
+RELATORIO_LANCAMENTOS = Relatorio(
+    LancamentoFinanceiro,
+    filtros=[
+        Filtro("tipo_lancamento", "tipo"),
+        Filtro("categoria", "categoria__icontains"),
+        Filtro("valor_min", "valor__gte", _decimal),
+        Filtro("valor_max", "valor__lte", _decimal),
+        Filtro("data_inicio", "data__gte", _data),
+        Filtro("data_fim", "data__lte", _data),
+    ],
+    ordenacao_padrao=("-data", "-id"),
+)
+
+# 🔹 tipo do relatório → especificação (mesmos nomes de RELATORIOS_PDF/PLANILHAS)
+RELATORIOS = {
+    "produtos": RELATORIO_PRODUTOS,
+    "pedidos": RELATORIO_PEDIDOS,
+    "estoque": RELATORIO_ESTOQUE,
+    "financeiro": RELATORIO_FINANCEIRO,
+    "feedbacks": RELATORIO_FEEDBACKS,
+}
@@ -0,0 +1,66 @@
+"""
+HTML dos relatórios em PDF.
+
+Cada função recebe os filtros da tela (um dict como `request.GET`) e devolve
+o HTML pronto para o weasyprint. Não dependem do request, então rodam tanto
+na view quanto no worker de exportação (ver loja/exportacao.py).
+"""
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
+
+from .models import (
+    CustoProduto, Feedback, MovimentacaoEstoque, Pedido, PedidoItem, Produto, ResumoFinanceiroDiario,
+)
+from .relatorios import RELATORIOS
+
+
+def html_relatorio_produtos(params):
+    produtos = RELATORIOS["produtos"].queryset(params)
+    return render_to_string("loja/gestao/pdf/relatorio_produtos_pdf.html", {"produtos": produtos})
+
+
+def html_relatorio_pedidos(params):
+    pedidos = RELATORIOS["pedidos"].queryset(params)  # 🔹 já traz custo_total
+    return render_to_string("loja/gestao/pdf/relatorio_pedidos_pdf.html", {"pedidos": pedidos})
+
+
+def html_relatorio_estoque(params):
+    movs = RELATORIOS["estoque"].queryset(params)  # 🔹 mais recente primeiro
+    return render_to_string("loja/gestao/pdf/relatorio_estoque_pdf.html", {"movs": movs})
+
+
+def html_relatorio_financeiro(params):
+    data_inicio_raw = params.get("data_inicio")
+    data_fim_raw = params.get("data_fim")
+
+    return render_to_string("loja/gestao/pdf/relatorio_financeiro_pdf.html", {
+        "tabela": RELATORIOS["financeiro"].queryset(params),
+        "data_inicio": parse_date(data_inicio_raw) if data_inicio_raw else None,
+        "data_fim": parse_date(data_fim_raw) if data_fim_raw else None,
+        "ordenar_por": params.get("ordenar_por") or "data",
+    })
+
+
+def html_relatorio_feedbacks(params):
+    feedbacks = RELATORIOS["feedbacks"].queryset(params)
+    return render_to_string("loja/gestao/pdf/relatorio_feedbacks_pdf.html", {"feedbacks": feedbacks})
+
+
+# 🔹 tipo do relatório → função que monta o HTML
+RELATORIOS_PDF = {
+    "produtos": html_relatorio_produtos,
+    "pedidos": html_relatorio_pedidos,
+    "estoque": html_relatorio_estoque,
+    "financeiro": html_relatorio_financeiro,
+    "feedbacks": html_relatorio_feedbacks,
+}
+
+# 🔹 Tabelas que cada relatório lê: qualquer mudança nelas gera um PDF novo no cache
+# (a versão de cada uma é mantida por loja/signals.py e pelos caminhos em lote)
+DEPENDENCIAS_PDF = {
+    "produtos": (Produto, CustoProduto),
+    "pedidos": (Pedido, PedidoItem),
+    "estoque": (MovimentacaoEstoque, Produto),
+    "financeiro": (ResumoFinanceiroDiario,),
+    "feedbacks": (Feedback, Produto),
+}
@@ -0,0 +1,103 @@
+"""
+Sinais dos models da loja.
+
+Cuidam das exclusões — obj.delete(), queryset.delete(), a ação "apagar
+selecionados" do admin e as cascatas (apagar um User leva os pedidos e
+feedbacks dele junto) — para os dados mantidos a partir de outras tabelas
+não ficarem para trás. Um override de delete() só veria o primeiro caso.
+
+Atualizações em lote (`queryset.update()`, `bulk_create`) não disparam
+sinais: esses caminhos chamam as mesmas funções diretamente.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .estoque import liberar_reservas
+from .exportacao import invalidar_relatorios
+from .models import (
+    ContagemPedidoStatus, Despesa, Feedback, Pedido, PedidoItem, Produto, ResumoFinanceiroDiario, dia_do_pedido,
+)
+from .painel import invalidar_painel
+from .relatorios_pdf import DEPENDENCIAS_PDF
+
+
+# -------------------------------
+# 🔧 RESUMO DE AVALIAÇÕES DO PRODUTO
+# -------------------------------
+
+@receiver(post_delete, sender=Feedback, dispatch_uid="avaliacoes:feedback_apagado")
+def _feedback_apagado(sender, instance, **kwargs):
+    """Retira a nota do produto: vale para feedback.delete() e para a cascata de User/Pedido."""
+    Produto.aplicar_avaliacao(instance.produto_id, instance.nota, instance.visivel, sinal=-1)
+    invalidar_painel()  # últimos feedbacks
+
+
+# -------------------------------
+# 🔧 CONTAGEM DE PEDIDOS POR STATUS
+# -------------------------------
+
+@receiver(post_delete, sender=Pedido, dispatch_uid="contagem:pedido_apagado")
+def _pedido_apagado(sender, instance, **kwargs):
+    """-1 no status do pedido: vale para pedido.delete(), queryset.delete() e a cascata do User."""
+    ContagemPedidoStatus.aplicar_deltas({instance.status: -1})
+    invalidar_painel()  # contagem por status e últimos pedidos
+
+
+# -------------------------------
+# 🔧 RESERVAS DE ESTOQUE
+# -------------------------------
+
+@receiver(pre_delete, sender=Pedido, dispatch_uid="reservas:pedido_apagado")
+def _liberar_reservas_do_pedido(sender, instance, **kwargs):
+    """
+    Devolve ao disponível o que o pedido tinha reservado. Roda antes da
+    exclusão porque as reservas saem junto com o pedido (CASCADE) sem
+    descontar `Produto.reservado`.
+    """
+    liberar_reservas(instance.reservas.all())
+
+
+# -------------------------------
+# 🔧 RESUMO FINANCEIRO DIÁRIO
+# -------------------------------
+
+@receiver(post_delete, sender=Pedido, dispatch_uid="resumo:pedido_apagado")
+def _pedido_pago_apagado(sender, instance, **kwargs):
+    """Pedido pago sai da receita e do custo do dia dele."""
+    if instance.status == "Pago":
+        ResumoFinanceiroDiario.atualizar_dias({dia_do_pedido(instance.data_criacao)})
+
+
+@receiver(post_delete, sender=PedidoItem, dispatch_uid="resumo:item_apagado")
+def _item_apagado(sender, instance, **kwargs):
+    """
+    Item de pedido pago sai do custo do dia. Na cascata do pedido ele já foi
+    apagado e o receiver do Pedido refaz o dia (a consulta não acha nada).
+    """
+    invalidar_painel()  # mais vendidos
+    data_criacao = (
+        Pedido.objects.filter(pk=instance.pedido_id, status="Pago").values_list("data_criacao", flat=True).first()
+    )
+    if data_criacao is not None:
+        ResumoFinanceiroDiario.atualizar_dias({dia_do_pedido(data_criacao)})
+
+
+@receiver(post_delete, sender=Despesa, dispatch_uid="resumo:despesa_apagada")
+def _despesa_apagada(sender, instance, **kwargs):
+    ResumoFinanceiroDiario.atualizar_dias({Despesa._meta.get_field("data").to_python(instance.data)})
+
+
+# -------------------------------
+# 🔧 VERSÃO DAS TABELAS DOS RELATÓRIOS EM PDF
+# -------------------------------
+
+def _tabela_do_relatorio_mudou(sender, **kwargs):
+    invalidar_relatorios(sender)
+
+
+# ResumoFinanceiroDiario fica de fora: só loja/financeiro.py grava nele (em lote) e já avisa
+_MODELOS = {modelo for modelos in DEPENDENCIAS_PDF.values() for modelo in modelos} - {ResumoFinanceiroDiario}
+
+for _modelo in _MODELOS:
+    post_save.connect(_tabela_do_relatorio_mudou, sender=_modelo, dispatch_uid=f"relatorios:save:{_modelo._meta.label}")
+    post_delete.connect(_tabela_do_relatorio_mudou, sender=_modelo, dispatch_uid=f"relatorios:delete:{_modelo._meta.label}")
@@ -1,3 +1,924 @@
-from django.test import TestCase
+import csv
+import datetime
+import shutil
+import sys
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .busca import buscar, reindexar
+from .carrinho import adicionar_unidade
+from .estoque import EstoqueInsuficiente, liberar_expiradas, movimentar, reservar
+from .exportacao import preparar_exportacao, solicitar_exportacao
+from .financeiro import (
+    anotar_custo, calcular_lucro, custo_por_pedido, reconstruir_resumo_diario, resumo_por_dia, totalizar,
+)
+from .paginacao import iterar_em_lotes, paginar_por_cursor
+from .painel import CHAVE_PAINEL
+from .relatorios import RELATORIOS
+from .models import (
+    Carrinho, ContagemPedidoStatus, Despesa, ExportacaoRelatorio, Feedback, ItemCarrinho, MovimentacaoEstoque, Pedido, PedidoItem, Produto, ReservaEstoque, ResumoFinanceiroDiario, dia_do_pedido,
+)
+
+
+class BuscaTest(TestCase):
+    """Índice de termos: prefixo sem acento/maiúscula, relevância e atualização pelo save()."""
+
+    def setUp(self):
+        self.almondega = Produto.objects.create(nome="Almôndega bovina", descricao="Congelada", preco=20, quantidade=5)
+        self.alface = Produto.objects.create(nome="Alface crespa", descricao="Hortaliça", preco=3, quantidade=5)
+        self.alma = Produto.objects.create(nome="Alma de frango", descricao="-", preco=8, quantidade=5)
+        self.coxa = Produto.objects.create(nome="Coxa", descricao="Frango caipira", preco=15, quantidade=5)
+
+    def _busca(self, texto):
+        return list(buscar(Produto.objects.all(), texto))
+
+    def test_prefixo_casa_so_o_intervalo_do_termo(self):
+        self.assertEqual(self._busca("ALMÔ"), [self.almondega])
+        self.assertEqual(self._busca("alm"), [self.alma, self.almondega])
+        self.assertEqual(self._busca("alm bov"), [self.almondega])  # todas as palavras precisam casar
+        self.assertEqual(self._busca("almondegas"), [])
+        # nome pesa mais que descrição
+        self.assertEqual(self._busca("frang"), [self.alma, self.coxa])
+
+    def test_edicao_reindexa_e_inativo_sai_da_vitrine(self):
+        self.almondega.nome = "Quibe"
+        self.almondega.save()
+        self.assertEqual(self._busca("almon"), [])
+        self.assertEqual(self._busca("quib"), [self.almondega])
+
+        self.alface.quantidade = 0
+        self.alface.save()
+        resposta = self.client.get(reverse("home"), {"q": "alf"})
+        self.assertEqual(list(resposta.context["produtos"]), [])
+
+        # update() não passa pelo save(): o comando reindexar_busca corrige
+        Produto.objects.filter(pk=self.coxa.pk).update(nome="Sobrecoxa")
+        self.assertEqual(reindexar(), 4)
+        self.assertEqual(self._busca("sobre"), [self.coxa])
+
+
+class AutocompleteCacheTest(TestCase):
+    """O autocomplete responde do cache até o catálogo mudar, e o navegador pode reaproveitar a resposta."""
+
+    def setUp(self):
+        cache.clear()
+        caches["autocomplete"].clear()
+        self.admin = User.objects.create_superuser("admin", "admin@teste.com", "senha")
+        self.produto = Produto.objects.create(nome="Almôndega", descricao="Congelada", preco=20, quantidade=5)
+        self.url = reverse("buscar_produtos")
+
+    def test_cache_e_invalidado_quando_o_catalogo_muda(self):
+        resposta = self.client.get(self.url, {"q": "almo"})
+        self.assertEqual([item["id"] for item in resposta.json()], [self.produto.pk])
+        self.assertIn("max-age=60", resposta["Cache-Control"])
+        etag = resposta["ETag"]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, {"q": "Almô"}).json(), resposta.json())
+        self.assertEqual(self.client.get(self.url, {"q": "almo"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # inativar pelo update() em lote também troca a versão do catálogo
+        self.client.force_login(self.admin)
+        self.client.post(reverse("alterar_status_produtos"), {"produtos": [self.produto.pk], "acao": "inativar"})
+        resposta = self.client.get(self.url, {"q": "almo"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((resposta.status_code, resposta.json()), (200, []))
+        self.assertNotEqual(resposta["ETag"], etag)
+
+
+class PaginacaoCursorTest(TestCase):
+    """Cursor por (data_criacao, id): sem linha repetida ou perdida, mesmo com datas iguais."""
+
+    ORDENACAO = ("-data_criacao", "-id")
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        pedidos = [Pedido.objects.create(cliente=cliente, nome_cliente="Cliente", total=10) for _ in range(7)]
+        # cinco pedidos no mesmo instante: o id desempata
+        empate = timezone.now() - datetime.timedelta(days=1)
+        Pedido.objects.filter(pk__in=[p.pk for p in pedidos[1:6]]).update(data_criacao=empate)
+        cls.ordem = list(Pedido.objects.order_by(*cls.ORDENACAO).values_list("pk", flat=True))
+
+    def _pagina(self, querystring="", **opcoes):
+        request = RequestFactory().get("/pedidos/?" + querystring)
+        return paginar_por_cursor(request, Pedido.objects.all(), 2, ordenacao=self.ORDENACAO, **opcoes)
+
+    def test_avanca_e_volta_pelas_paginas(self):
+        paginas = [self._pagina("status=Pago")]
+        while paginas[-1].has_next:
+            self.assertIn("status=Pago", paginas[-1].querystring_proxima)  # filtros seguem no link
+            paginas.append(self._pagina(paginas[-1].querystring_proxima))
+        self.assertEqual([p.pk for pagina in paginas for p in pagina], self.ordem)
+        self.assertEqual([len(pagina) for pagina in paginas], [2, 2, 2, 1])
+        self.assertFalse(paginas[0].has_previous)
+
+        anterior = self._pagina(paginas[-1].querystring_anterior)
+        self.assertEqual([p.pk for p in anterior], self.ordem[4:6])
+        self.assertTrue(anterior.has_previous and anterior.has_next)
+        primeira = self._pagina(self._pagina(anterior.querystring_anterior).querystring_anterior)
+        self.assertEqual(([p.pk for p in primeira], primeira.has_previous), (self.ordem[:2], False))
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        for cursor in ("lixo!!", "WyIxIl0", ""):  # não é base64 / JSON com um campo só / vazio
+            pagina = self._pagina(f"depois={cursor}")
+            self.assertEqual([p.pk for p in pagina], self.ordem[:2])
+            self.assertFalse(pagina.has_previous)
+
+    def test_contagem_aproximada_para_no_teto(self):
+        pagina = self._pagina(contagem="aproximada", teto_contagem=5)
+        self.assertEqual((pagina.total, pagina.total_aproximado), (5, True))
+        pagina = self._pagina(contagem="aproximada", teto_contagem=7)
+        self.assertEqual((pagina.total, pagina.total_aproximado), (7, False))
+        self.assertEqual(self._pagina(contagem="exata").total, 7)
+
+    def test_iterar_em_lotes_percorre_tudo_uma_vez(self):
+        ids = [p.pk for p in iterar_em_lotes(Pedido.objects.all(), self.ORDENACAO, lote=2)]
+        self.assertEqual(ids, self.ordem)
+
+
+class FinanceiroResumoQueriesTest(TestCase):
+    """O resumo financeiro não pode fazer consultas por pedido."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@teste.com", "senha")
+        cls.produto = Produto.objects.create(nome="Frango", descricao="Congelado", preco=20, quantidade=1000)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        hoje = timezone.now().date()
+        self.params = {"data_inicio": hoje.replace(day=1).isoformat(), "data_fim": hoje.isoformat()}
+
+    def _criar_pedidos(self, quantidade):
+        for _ in range(quantidade):
+            pedido = Pedido.objects.create(
+                cliente=self.admin, total=Decimal("40.00"), status="Pago",
+                nome_cliente="Cliente", endereco_entrega="Rua A",
+            )
+            PedidoItem.objects.create(
+                pedido=pedido, produto=self.produto, nome_produto="Frango",
+                quantidade=2, preco_unitario=Decimal("20.00"), custo_unitario=Decimal("12.50"),
+            )
+            Despesa.objects.create(categoria="Embalagem", tipo="Variável", valor=Decimal("1.00"), data=timezone.now().date())
+
+    def _consultas_da_tela(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse("financeiro_resumo"), self.params)
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas), resposta
+
+    def test_resumo_por_dia_usa_tres_consultas(self):
+        self._criar_pedidos(5)
+        with self.assertNumQueries(3):
+            resumo_por_dia(Pedido.objects.filter(status="Pago"), Despesa.objects.all())
+
+    def test_quantidade_de_consultas_nao_cresce_com_os_pedidos(self):
+        self._criar_pedidos(1)
+        consultas_poucos, _ = self._consultas_da_tela()
+
+        self._criar_pedidos(30)
+        consultas_muitos, resposta = self._consultas_da_tela()
+
+        self.assertEqual(consultas_poucos, consultas_muitos)
+        self.assertEqual(resposta.context["receita_total"], Decimal("1240.00"))
+        self.assertEqual(resposta.context["custo_total"], Decimal("775.00"))
+        self.assertEqual(resposta.context["despesas_variaveis"], Decimal("31.00"))
+        self.assertEqual(resposta.context["lucro_liquido"], Decimal("434.00"))
+
+
+class FinanceiroAgregacoesTest(TestCase):
+    """Custos e despesas somados no banco batem com a conta feita à mão."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        cls.dia1, cls.dia2 = datetime.date(2025, 3, 10), datetime.date(2025, 3, 11)
+
+        def pedido(total, status, dia, itens):
+            novo = Pedido.objects.create(cliente=cliente, nome_cliente="Cliente", total=total, status=status)
+            Pedido.objects.filter(pk=novo.pk).update(
+                data_criacao=timezone.make_aware(datetime.datetime.combine(dia, datetime.time(21, 30)))
+            )
+            for quantidade, custo in itens:
+                PedidoItem.objects.create(pedido=novo, nome_produto="Frango", quantidade=quantidade,
+                                          preco_unitario=10, custo_unitario=custo)
+            return novo
+
+        cls.a = pedido(Decimal("50.00"), "Pago", cls.dia1, [(2, Decimal("10.00")), (1, Decimal("5.00"))])  # custo 25
+        cls.b = pedido(Decimal("30.00"), "Pago", cls.dia2, [(3, Decimal("4.00"))])  # custo 12
+        pedido(Decimal("100.00"), "Pendente", cls.dia1, [(1, Decimal("60.00"))])  # fora: não pago
+        for tipo, valor, dia in (("Fixo", "100.00", cls.dia1), ("Variável", "7.50", cls.dia1), ("Variável", "2.50", cls.dia2)):
+            Despesa.objects.create(categoria="-", tipo=tipo, valor=Decimal(valor), data=dia)
+
+    def test_custos_e_despesas_somados_no_banco(self):
+        pagos = Pedido.objects.filter(status="Pago")
+        self.assertEqual(custo_por_pedido(pagos), {self.a.pk: Decimal("25.00"), self.b.pk: Decimal("12.00")})
+        self.assertEqual(
+            dict(anotar_custo(Pedido.objects.all()).values_list("total", "custo_total")),
+            {Decimal("50.00"): Decimal("25.00"), Decimal("30.00"): Decimal("12.00"), Decimal("100.00"): Decimal("60.00")},
+        )
+
+        resumo = resumo_por_dia(pagos, Despesa.objects.all())
+        self.assertEqual(resumo, {
+            self.dia1: {"receita": Decimal("50.00"), "custo": Decimal("25.00"),
+                        "despesas_fixas": Decimal("100.00"), "despesas_variaveis": Decimal("7.50")},
+            self.dia2: {"receita": Decimal("30.00"), "custo": Decimal("12.00"),
+                        "despesas_fixas": Decimal("0.00"), "despesas_variaveis": Decimal("2.50")},
+        })
+        self.assertEqual(calcular_lucro(totalizar(resumo.values())), Decimal("-67.00"))  # 80 - 37 - 100 - 10
+
+
+class ResumoFinanceiroDiarioTest(TestCase):
+    """O resumo mantido incrementalmente deve bater com uma reconstrução completa."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+
+    def _linhas(self):
+        return list(ResumoFinanceiroDiario.objects.order_by("data").values_list(
+            "data", "receita", "custo", "despesas_fixas", "despesas_variaveis"
+        ))
+
+    def test_mudancas_de_status_e_despesas_mantem_o_resumo(self):
+        pedido = Pedido.objects.create(
+            cliente=self.usuario, total=Decimal("50.00"),
+            nome_cliente="Cliente", endereco_entrega="Rua A",
+        )
+        PedidoItem.objects.create(
+            pedido=pedido, nome_produto="Frango", quantidade=1,
+            preco_unitario=Decimal("50.00"), custo_unitario=Decimal("30.00"),
+        )
+        self.assertFalse(ResumoFinanceiroDiario.objects.exists())
+
+        pedido.status = "Pago"
+        pedido.save()
+        dia = dia_do_pedido(pedido.data_criacao)
+        despesa = Despesa.objects.create(categoria="Aluguel", tipo="Fixo", valor=Decimal("10.00"), data=dia)
+
+        resumo = ResumoFinanceiroDiario.objects.get(data=dia)
+        self.assertEqual(
+            (resumo.receita, resumo.custo, resumo.despesas_fixas),
+            (Decimal("50.00"), Decimal("30.00"), Decimal("10.00")),
+        )
+
+        despesa.tipo = "Variável"
+        despesa.save()
+        pedido.status = "Cancelado"
+        pedido.save()
+
+        incremental = self._linhas()
+        reconstruir_resumo_diario()
+        self.assertEqual(incremental, self._linhas())
+        self.assertEqual(incremental, [(dia, Decimal("0.00"), Decimal("0.00"), Decimal("0.00"), Decimal("10.00"))])
+
+    def test_pedido_da_noite_entra_no_dia_local(self):
+        # 31/01 às 22h30 em São Paulo já é 01/02 em UTC
+        noite = timezone.make_aware(datetime.datetime(2025, 1, 31, 22, 30))
+        pedido = Pedido.objects.create(cliente=self.usuario, total=Decimal("40.00"), nome_cliente="Cliente")
+        Pedido.objects.filter(pk=pedido.pk).update(data_criacao=noite)
+        pedido.refresh_from_db()
+        pedido.status = "Pago"
+        pedido.save()
+
+        self.assertEqual(dia_do_pedido(pedido.data_criacao), datetime.date(2025, 1, 31))
+        self.assertEqual(list(ResumoFinanceiroDiario.objects.values_list("data", "receita")),
+                         [(datetime.date(2025, 1, 31), Decimal("40.00"))])
+        self.assertEqual(list(resumo_por_dia(Pedido.objects.all(), Despesa.objects.none())), [datetime.date(2025, 1, 31)])
+        reconstruir_resumo_diario()
+        self.assertEqual(ResumoFinanceiroDiario.objects.get().data, datetime.date(2025, 1, 31))
+
+    def test_exclusao_em_cascata_e_por_queryset_refaz_o_dia(self):
+        cliente = User.objects.create_user("outro", "outro@teste.com", "senha")
+        hoje = timezone.localdate()
+        pedidos = []
+        for dono in (cliente, self.usuario):
+            pedido = Pedido.objects.create(cliente=dono, total=Decimal("10.00"), nome_cliente="Cliente")
+            PedidoItem.objects.create(pedido=pedido, nome_produto="Frango", quantidade=1,
+                                      preco_unitario=Decimal("10.00"), custo_unitario=Decimal("4.00"))
+            pedido.status = "Pago"
+            pedido.save()
+            pedidos.append(pedido)
+        Despesa.objects.create(categoria="Gás", tipo="Fixo", valor=Decimal("3.00"), data=hoje)
+
+        def dia():
+            return ResumoFinanceiroDiario.objects.values_list("receita", "custo", "despesas_fixas").get(data=hoje)
+
+        self.assertEqual(dia(), (Decimal("20.00"), Decimal("8.00"), Decimal("3.00")))
+        cliente.delete()  # leva o pedido e os itens dele em cascata
+        self.assertEqual(dia(), (Decimal("10.00"), Decimal("4.00"), Decimal("3.00")))
+        PedidoItem.objects.filter(pedido=pedidos[1]).delete()
+        Despesa.objects.all().delete()
+        self.assertEqual(dia(), (Decimal("10.00"), Decimal("0.00"), Decimal("0.00")))
+        Pedido.objects.all().delete()
+        self.assertFalse(ResumoFinanceiroDiario.objects.exists())
+
+
+class RelatorioFiltrosTest(TestCase):
+    """Os filtros declarativos valem igual para tela, PDF e planilha."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        cls.pedido = Pedido.objects.create(
+            cliente=cls.usuario, total=Decimal("50.00"), nome_cliente="Cliente", endereco_entrega="Rua A",
+        )
+        PedidoItem.objects.create(
+            pedido=cls.pedido, nome_produto="Frango", quantidade=2,
+            preco_unitario=Decimal("25.00"), custo_unitario=Decimal("10.00"),
+        )
+
+    def test_data_fim_inclui_o_dia_inteiro_e_traz_o_custo(self):
+        dia = timezone.localtime(self.pedido.data_criacao).date().isoformat()
+        pedidos = list(RELATORIOS["pedidos"].queryset({"data_inicio": dia, "data_fim": dia}))
+        self.assertEqual(pedidos, [self.pedido])
+        self.assertEqual(pedidos[0].custo_total, Decimal("20.00"))
+
+    def test_filtro_invalido_e_parametros_de_pagina_sao_ignorados(self):
+        relatorio = RELATORIOS["pedidos"]
+        self.assertEqual(relatorio.queryset({"valor_min": "abc"}).count(), 1)
+        self.assertIs(relatorio.compilar({"status": "Pago", "page": "2"}), relatorio.compilar({"status": "Pago"}))
+
+
+class ExportacaoPlanilhaTest(TestCase):
+    """CSV/XLSX com os filtros da tela, lidos em lotes por cursor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@teste.com", "senha")
+        for total, status in ((10, "Pago"), (20, "Pendente"), (30, "Pago"), (40, "Pago")):
+            pedido = Pedido.objects.create(cliente=cls.admin, nome_cliente="Cliente", total=total)
+            PedidoItem.objects.create(pedido=pedido, nome_produto="Frango", quantidade=1,
+                                      preco_unitario=total, custo_unitario=Decimal("2.50"))
+            Pedido.objects.filter(pk=pedido.pk).update(status=status)
+        cls.produto = Produto.objects.create(nome="Frango", descricao="Congelado", preco=20, quantidade=10)
+        movimentar([(cls.produto.pk, 5, "compra"), (cls.produto.pk, 2, "bonificação")], "entrada")
+        movimentar([(cls.produto.pk, 4, "venda")], "saida")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _csv(self, relatorio, **filtros):
+        resposta = self.client.get(reverse("exportar_relatorio", args=[relatorio]), filtros)
+        self.assertEqual(resposta["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(resposta["Content-Disposition"], f'attachment; filename="relatorio_{relatorio}.csv"')
+        conteudo = b"".join(resposta.streaming_content).decode("utf-8")
+        self.assertTrue(conteudo.startswith("\ufeff"))
+        return list(csv.reader(StringIO(conteudo[1:]), delimiter=";"))
+
+    def test_csv_de_pedidos_e_estoque_com_filtros(self):
+        linhas = self._csv("pedidos", status="Pago", valor_min="20")
+        self.assertEqual(linhas[0], ["Pedido", "Cliente", "Nome", "Status", "Total", "Custo", "Lucro", "Data"])
+        # valores com vírgula decimal (a escala da soma do custo varia com o banco)
+        self.assertEqual(
+            [[linha[3], *(Decimal(valor.replace(",", ".")) for valor in linha[4:7])] for linha in linhas[1:]],
+            [["Pago", Decimal("40"), Decimal("2.5"), Decimal("37.5")], ["Pago", Decimal("30"), Decimal("2.5"), Decimal("27.5")]],
+        )
+
+        linhas = self._csv("estoque", tipo="entrada")
+        self.assertEqual([(linha[1], linha[3], linha[4], linha[5]) for linha in linhas[1:]],
+                         [("Frango", "2", "17", "bonificação"), ("Frango", "5", "15", "compra")])
+
+    def test_lotes_cruzam_o_tamanho_do_lote(self):
+        hoje = timezone.localdate()
+        ResumoFinanceiroDiario.objects.bulk_create([
+            ResumoFinanceiroDiario(data=hoje - datetime.timedelta(days=10 + i), receita=receita)
+            for i, receita in enumerate((5, 50, 5, 30, 50))
+        ])
+        with mock.patch("loja.exportacao_planilha.TAMANHO_LOTE", 2):
+            pedidos = self._csv("pedidos")
+            financeiro = self._csv("financeiro", ordenar_por="lucro")
+
+        self.assertEqual([linha[4] for linha in pedidos[1:]], ["40,00", "30,00", "20,00", "10,00"])
+        # lucro empatado: desempata pela data (mais recente primeiro), sem repetir nem pular dia
+        esperado = sorted(
+            ResumoFinanceiroDiario.objects.values_list("receita", "data"), key=lambda r: (r[0], r[1]), reverse=True,
+        )
+        self.assertEqual([linha[0] for linha in financeiro[1:]], [f"{data:%d/%m/%Y}" for _, data in esperado])
+
+    def test_xlsx_sem_openpyxl_volta_para_a_tela(self):
+        with mock.patch.dict(sys.modules, {"openpyxl": None}):  # import levanta ImportError
+            resposta = self.client.get(reverse("exportar_relatorio", args=["pedidos"]),
+                                       {"formato": "xlsx", "status": "Pago"})
+        self.assertRedirects(resposta, reverse("relatorio_pedidos") + "?status=Pago", fetch_redirect_response=False)
+
+
+class GestaoEstoqueTest(TestCase):
+    """A tabela de estoque traz a última movimentação de cada produto sem uma consulta por produto."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@teste.com", "senha"))
+        self.ultimas = {}
+        inicio = timezone.now() - datetime.timedelta(days=30)
+        for i in range(6):
+            produto = Produto.objects.create(nome=f"Produto {i}", descricao="-", preco=10, quantidade=10)
+            for dias in range(i + 1):  # datas de propósito fora da ordem de criação
+                data = inicio + datetime.timedelta(days=(dias * 7 + i) % 25, hours=i)
+                mov = MovimentacaoEstoque.objects.create(produto=produto, tipo="entrada", quantidade=1, estoque_final=10)
+                MovimentacaoEstoque.objects.filter(pk=mov.pk).update(data=data)  # data é auto_now_add
+                self.ultimas[produto.nome] = max(self.ultimas.get(produto.nome, data), data)
+        Produto.objects.create(nome="Sem movimento", descricao="-", preco=10, quantidade=10)
+
+    def test_ultima_movimentacao_por_produto_em_consultas_fixas(self):
+        # sessão, usuário, dois cards, última movimentação geral e a tabela com a subconsulta
+        with self.assertNumQueries(6):
+            resposta = self.client.get(reverse("gestao_estoque"), HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+        linhas = {linha["nome"]: linha["ultima_atualizacao"] for linha in resposta.json()["produtos"]}
+        esperado = {nome: timezone.localtime(data).strftime("%d/%m/%Y %H:%M") for nome, data in self.ultimas.items()}
+        self.assertEqual(linhas, {**esperado, "Sem movimento": "-"})
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class EstoqueConcorrenciaTest(TransactionTestCase):
+    """Baixas simultâneas no mesmo produto não podem perder atualizações."""
+
+    THREADS = 8
+    BAIXAS_POR_THREAD = 5
+
+    def test_baixas_simultaneas_batem_com_as_movimentacoes(self):
+        produto = Produto.objects.create(nome="Frango", descricao="Congelado", preco=20, quantidade=100)
+        barreira = threading.Barrier(self.THREADS)
+        resultados = {"ok": 0, "faltou": 0}
+        trava = threading.Lock()
+
+        def trabalhar():
+            try:
+                barreira.wait()
+                for _ in range(self.BAIXAS_POR_THREAD):
+                    try:
+                        movimentar([(produto.pk, 3, "teste")], "saida")
+                        chave = "ok"
+                    except EstoqueInsuficiente:
+                        chave = "faltou"
+                    with trava:
+                        resultados[chave] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabalhar) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 40 pedidos de 3 unidades contra 100: 33 passam, sobra 1
+        produto.refresh_from_db()
+        self.assertEqual(resultados, {"ok": 33, "faltou": 7})
+        self.assertEqual(produto.quantidade, 1)
+
+        # cada movimentação viu o saldo deixado pela anterior
+        saldos = sorted(MovimentacaoEstoque.objects.filter(produto=produto).values_list("estoque_final", flat=True))
+        self.assertEqual(saldos, list(range(1, 100, 3)))
+
+
+class EstoqueMovimentacaoTest(TestCase):
+    """movimentar: saldo lido do banco (não da cópia de quem chama), lote tudo-ou-nada e saldo por linha."""
+
+    def setUp(self):
+        self.produto = Produto.objects.create(nome="Frango", descricao="Congelado", preco=20, quantidade=5)
+
+    def test_baixas_seguidas_no_mesmo_produto_nao_perdem_atualizacao(self):
+        copia_velha = Produto.objects.get(pk=self.produto.pk)  # lida antes das duas baixas
+
+        movimentar([(self.produto.pk, 3, "admin 1")], "saida")
+        with self.assertRaises(EstoqueInsuficiente) as erro:
+            movimentar([(copia_velha.pk, 3, "admin 2")], "saida")  # só restam 2
+        self.assertEqual(erro.exception.faltas[0]["disponivel"], 2)
+
+        movimentar([(copia_velha.pk, 2, "admin 2")], "saida")
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.quantidade, self.produto.ativo), (0, False))
+        self.assertEqual(
+            list(MovimentacaoEstoque.objects.order_by("pk").values_list("observacao", "estoque_final")),
+            [("admin 1", 2), ("admin 2", 0)],
+        )
+
+    def test_lote_com_produto_repetido_e_falta(self):
+        outro = Produto.objects.create(nome="Coxa", descricao="Congelada", preco=15, quantidade=10)
+
+        # 3 + 3 do mesmo produto passam do saldo de 5: o lote inteiro é recusado
+        with self.assertRaises(EstoqueInsuficiente) as erro:
+            movimentar([(outro.pk, 4, ""), (self.produto.pk, 3, ""), (self.produto.pk, 3, "")], "saida")
+        self.assertEqual(
+            [(falta["produto_id"], falta["disponivel"], falta["necessario"]) for falta in erro.exception.faltas],
+            [(self.produto.pk, 5, 6)],
+        )
+        self.assertEqual(sorted(Produto.objects.values_list("quantidade", flat=True)), [5, 10])
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+        # cada linha do mesmo produto parte do saldo deixado pela anterior
+        registros = movimentar([(self.produto.pk, 2, ""), (outro.pk, 4, ""), (self.produto.pk, 1, "")], "saida")
+        self.assertEqual([(r.produto_id, r.estoque_final) for r in registros],
+                         [(self.produto.pk, 3), (outro.pk, 6), (self.produto.pk, 2)])
+
+    def test_limitar_a_zero_baixa_so_o_que_houver(self):
+        registros = movimentar([(self.produto.pk, 4, ""), (self.produto.pk, 4, ""), (self.produto.pk, 1, "")],
+                               "saida", limitar_a_zero=True)
+        # a segunda linha leva só a unidade que restou; a terceira não tem o que baixar
+        self.assertEqual([(r.quantidade, r.estoque_final) for r in registros], [(4, 1), (1, 0)])
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.quantidade, self.produto.ativo), (0, False))
+
+
+class ReservaEstoqueTest(TestCase):
+    """A reserva do checkout tira do disponível até o pedido ser pago, cancelado ou vencer."""
+
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        self.produto = Produto.objects.create(nome="Frango", descricao="Congelado", preco=20, quantidade=5)
+
+    def _pedido(self):
+        return Pedido.objects.create(cliente=self.cliente, total=Decimal("20.00"), status="Pendente")
+
+    def test_reserva_bloqueia_outro_checkout_e_libera_ao_vencer(self):
+        reservar(self._pedido(), [(self.produto.pk, 4)])
+        with self.assertRaises(EstoqueInsuficiente):
+            reservar(self._pedido(), [(self.produto.pk, 2)])
+        with self.assertRaises(EstoqueInsuficiente):
+            movimentar([(self.produto.pk, 2, "teste")], "saida")
+
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.quantidade, self.produto.reservado), (5, 4))
+
+        ReservaEstoque.objects.update(expira_em=timezone.now())
+        self.assertEqual(liberar_expiradas(), 1)
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.disponivel, ReservaEstoque.objects.count()), (5, 0))
+
+    def test_apagar_pedido_por_cascata_ou_queryset_libera_a_reserva(self):
+        outro = User.objects.create_user("outro", "outro@teste.com", "senha")
+        reservar(Pedido.objects.create(cliente=outro, total=Decimal("20.00")), [(self.produto.pk, 2)])
+        reservar(self._pedido(), [(self.produto.pk, 1)])
+        reservar(self._pedido(), [(self.produto.pk, 1)])
+
+        outro.delete()
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.reservado, 2)
+
+        Pedido.objects.all().delete()
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.reservado, ReservaEstoque.objects.count()), (0, 0))
+
+    def test_comando_libera_so_as_vencidas_e_corrige_o_reservado(self):
+        outro = Produto.objects.create(nome="Coxa", descricao="Congelada", preco=15, quantidade=5)
+        vencida = reservar(self._pedido(), [(self.produto.pk, 2), (outro.pk, 1)])
+        reservar(self._pedido(), [(self.produto.pk, 1)])
+        ReservaEstoque.objects.filter(pk__in=[reserva.pk for reserva in vencida]).update(expira_em=timezone.now())
+        # reservado fora de sincronia (ex.: ajuste manual no banco)
+        Produto.objects.filter(pk=self.produto.pk).update(reservado=4)
+        Produto.objects.filter(pk=outro.pk).update(reservado=3)
+
+        saida = StringIO()
+        call_command("liberar_reservas", "--recalcular", stdout=saida)
+        self.assertIn("2 reserva(s) vencida(s) liberada(s).", saida.getvalue())
+        self.assertIn("2 produto(s) com reserva corrigida.", saida.getvalue())
+
+        # só a reserva ainda válida continua presa
+        self.assertEqual(
+            dict(Produto.objects.filter(pk__in=[self.produto.pk, outro.pk]).values_list("pk", "reservado")),
+            {self.produto.pk: 1, outro.pk: 0},
+        )
+        self.assertEqual(list(ReservaEstoque.objects.values_list("produto_id", "quantidade")), [(self.produto.pk, 1)])
+
+
+class CarrinhoTest(TestCase):
+    """A tela do carrinho corrige os itens de uma vez e não grava nada quando não há o que corrigir."""
+
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        self.carrinho = Carrinho.objects.create(usuario=self.cliente)
+        for i in range(5):
+            produto = Produto.objects.create(nome=f"Produto {i}", descricao="-", preco=10, quantidade=3)
+            ItemCarrinho.objects.create(carrinho=self.carrinho, produto=produto, quantidade=5, preco_unitario=8)
+        self.client.force_login(self.cliente)
+
+    def test_ver_carrinho_corrige_em_lote_e_depois_so_le(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse("ver_carrinho"))
+        escritas = [q["sql"] for q in consultas.captured_queries if q["sql"].startswith("UPDATE \"loja_")]
+        self.assertEqual(len(escritas), 2)  # itens (bulk_update) e valor_total
+        self.assertEqual(response.context["total"], Decimal("150.00"))
+        self.carrinho.refresh_from_db()
+        self.assertEqual(self.carrinho.valor_total, Decimal("150.00"))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse("ver_carrinho"))
+        self.assertFalse([q for q in consultas.captured_queries if q["sql"].startswith("UPDATE \"loja_")])
+
+    def test_login_mescla_o_carrinho_da_sessao(self):
+        self.client.logout()
+        ja_no_carrinho = ItemCarrinho.objects.filter(carrinho=self.carrinho).first().produto
+        novo = Produto.objects.create(nome="Novo", descricao="-", preco=4, quantidade=10)
+        for produto in (ja_no_carrinho, novo, novo):
+            self.client.get(reverse("adicionar_carrinho", args=[produto.pk]))
+
+        self.client.post(reverse("login"), {"username": "cliente", "password": "senha"})
+
+        quantidades = dict(ItemCarrinho.objects.filter(carrinho=self.carrinho).values_list("produto_id", "quantidade"))
+        self.assertEqual((quantidades[ja_no_carrinho.pk], quantidades[novo.pk]), (6, 2))
+        self.carrinho.refresh_from_db()
+        self.assertEqual(self.carrinho.total_itens, 28)
+        self.assertEqual(self.carrinho.valor_total, Decimal("216.00"))  # 26 x 8 + 2 x 4
+
+    def test_contadores_acompanham_cada_alteracao(self):
+        self.client.get(reverse("ver_carrinho"))  # ajusta 5 itens x 5 para 3 unidades a R$ 10
+        item = ItemCarrinho.objects.filter(carrinho=self.carrinho).first()
+
+        self.client.post(reverse("alterar_quantidade", args=[item.pk]), {"quantidade": 1})
+        self.client.get(reverse("remover_do_carrinho", args=[ItemCarrinho.objects.last().pk]))
+        self.client.get(reverse("adicionar_carrinho", args=[item.produto_id]))
+
+        self.carrinho.refresh_from_db()
+        self.assertEqual((self.carrinho.total_itens, self.carrinho.valor_total), (11, Decimal("110.00")))
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["carrinho_itens"], 11)
+
+    def test_adicionar_unidade_limita_pelo_disponivel_do_banco(self):
+        produto = Produto.objects.create(nome="Frango", descricao="-", preco=10, quantidade=3)
+        Produto.objects.filter(pk=produto.pk).update(reservado=1)  # `produto` em memória não sabe da reserva
+        Carrinho.objects.filter(pk=self.carrinho.pk).update(total_itens=999)  # contador fora de sincronia
+
+        resultados = [adicionar_unidade(self.cliente, produto)[0] for _ in range(3)]
+
+        self.assertEqual(resultados, [True, True, False])
+        self.assertEqual(ItemCarrinho.objects.get(carrinho=self.carrinho, produto=produto).quantidade, 2)
+
+    def test_adicionar_unidade_num_comando_e_contadores_por_delta(self):
+        Carrinho.recalcular_contadores(self.carrinho.pk)  # 25 unidades, R$ 200,00
+        item = ItemCarrinho.objects.filter(carrinho=self.carrinho).first()
+        Produto.objects.filter(pk=item.produto_id).update(quantidade=7, preco=99)
+        produto = Produto.objects.get(pk=item.produto_id)
+
+        # carrinho, upsert, contadores e a leitura do total (+ SAVEPOINT/RELEASE do atomic)
+        with self.assertNumQueries(6):
+            self.assertEqual(adicionar_unidade(self.cliente, produto), (True, 26))
+        self.assertEqual(adicionar_unidade(self.cliente, produto), (True, 27))
+        self.assertEqual(adicionar_unidade(self.cliente, produto), (False, 27))
+
+        item.refresh_from_db()
+        self.carrinho.refresh_from_db()
+        self.assertEqual(item.quantidade, 7)
+        # soma o preço congelado no item (8), não o atual do produto
+        self.assertEqual(self.carrinho.valor_total, Decimal("216.00"))
+
+    def test_adicionar_unidade_pelo_orm_em_outros_bancos(self):
+        Carrinho.recalcular_contadores(self.carrinho.pk)
+        produto = Produto.objects.create(nome="Frango", descricao="-", preco=10, quantidade=1)
+        with mock.patch.dict("loja.carrinho._UPSERT", clear=True):
+            self.assertEqual(adicionar_unidade(self.cliente, produto), (True, 26))
+            self.assertEqual(adicionar_unidade(self.cliente, produto), (False, 26))
+        self.carrinho.refresh_from_db()
+        self.assertEqual(self.carrinho.valor_total, Decimal("210.00"))
+
+
+class FinalizarCompraTest(TestCase):
+    """O checkout grava pedido, itens e reservas em número fixo de consultas."""
+
+    ENDERECO = {"nome": "Cliente", "rua": "Rua A", "numero": "1", "bairro": "Centro", "cidade": "Cidade"}
+
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        self.carrinho = Carrinho.objects.create(usuario=self.cliente)
+        self.client.force_login(self.cliente)
+
+    def _finalizar(self, itens):
+        for i in range(itens):
+            produto = Produto.objects.create(nome=f"Produto {i}", descricao="-", preco=10, quantidade=10)
+            ItemCarrinho.objects.create(carrinho=self.carrinho, produto=produto, quantidade=2, preco_unitario=10)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(reverse("finalizar_compra"), self.ENDERECO)
+        pedido = Pedido.objects.latest("id")
+        self.assertEqual((pedido.itens.count(), pedido.total), (itens, Decimal(20 * itens)))
+        return len(consultas)
+
+    def test_consultas_nao_crescem_com_os_itens(self):
+        self.assertEqual(self._finalizar(2), self._finalizar(20))
+        self.assertFalse(ItemCarrinho.objects.exists())
+
+    def test_reenvio_com_a_mesma_chave_devolve_o_pedido(self):
+        produto = Produto.objects.create(nome="Frango", descricao="-", preco=10, quantidade=10)
+        ItemCarrinho.objects.create(carrinho=self.carrinho, produto=produto, quantidade=2, preco_unitario=10)
+        chave = self.client.get(reverse("finalizar_compra")).context["chave_idempotencia"]
+
+        envio = {**self.ENDERECO, "chave_idempotencia": chave}
+        primeira = self.client.post(reverse("finalizar_compra"), envio)
+        segunda = self.client.post(reverse("finalizar_compra"), envio)
+
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(primeira.context["numero_pedido"], segunda.context["numero_pedido"])
+        produto.refresh_from_db()
+        self.assertEqual(produto.reservado, 2)
+
+
+class PainelCacheTest(TestCase):
+    """O dashboard lê o retrato do cache e o descarta quando um pedido muda."""
+
+    def setUp(self):
+        cache.delete(CHAVE_PAINEL)
+        self.admin = User.objects.create_superuser("admin", "admin@teste.com", "senha")
+        self.pedido = Pedido.objects.create(cliente=self.admin, nome_cliente="Cliente", status="Pendente", total=20)
+        self.client.force_login(self.admin)
+
+    def test_retrato_em_cache_e_invalidado_pelo_status(self):
+        self.client.get(reverse("dashboard"))
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse("dashboard"))
+        self.assertFalse([q for q in consultas.captured_queries if "loja_pedido" in q["sql"]])
+        self.assertEqual(resposta.context["pedidos_pendentes"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.status = "Cancelado"
+            self.pedido.save()
+        resposta = self.client.get(reverse("dashboard"))
+        self.assertEqual((resposta.context["pedidos_pendentes"], resposta.context["pedidos_cancelados"]), (0, 1))
+
+
+class ContagemPedidoStatusTest(TestCase):
+    """O contador por status acompanha o save() e a atualização em lote."""
+
+    def test_contador_bate_com_a_contagem_dos_pedidos(self):
+        admin = User.objects.create_superuser("admin", "admin@teste.com", "senha")
+        pedidos = [
+            Pedido.objects.create(cliente=admin, nome_cliente="Cliente", status="Pendente", total=10)
+            for _ in range(4)
+        ]
+        self.assertEqual(ContagemPedidoStatus.contagem()["Pendente"], 4)  # primeira leitura monta a tabela
+
+        self.client.force_login(admin)
+        self.client.post(reverse("atualizar_status_pedidos_lote"), {"pedidos": [p.pk for p in pedidos[:3]], "status": "Cancelado"})
+        pedidos[3].delete()
+        Pedido.objects.create(cliente=admin, nome_cliente="Cliente", status="Pendente", total=10)
+
+        with self.assertNumQueries(1):
+            contagem = ContagemPedidoStatus.contagem()
+        self.assertEqual(contagem, {"Pendente": 1, "Pago": 0, "Cancelado": 3})
+
+    def test_exclusao_em_cascata_e_por_queryset_descontam(self):
+        cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        outro = User.objects.create_user("outro", "outro@teste.com", "senha")
+        for usuario, status in ((cliente, "Pago"), (cliente, "Pendente"), (outro, "Pago"), (outro, "Cancelado")):
+            Pedido.objects.create(cliente=usuario, nome_cliente="Cliente", status=status, total=10)
+        ContagemPedidoStatus.contagem()
+
+        cliente.delete()
+        Pedido.objects.filter(status="Cancelado").delete()
+        self.assertEqual(ContagemPedidoStatus.contagem(), {"Pendente": 0, "Pago": 1, "Cancelado": 0})
+
+        ContagemPedidoStatus.objects.filter(status="Pago").update(quantidade=-1)  # deriva por fora do ORM
+        self.assertEqual(ContagemPedidoStatus.contagem()["Pago"], 1)
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ContagemPedidoConcorrenciaTest(TransactionTestCase):
+    """Saves simultâneos do mesmo pedido aplicam a troca de status uma vez só."""
+
+    THREADS = 4
+
+    def test_mesma_troca_de_status_em_paralelo_conta_uma_vez(self):
+        cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        pedido = Pedido.objects.create(cliente=cliente, nome_cliente="Cliente", status="Pendente", total=10)
+        ContagemPedidoStatus.contagem()
+        barreira = threading.Barrier(self.THREADS)
+
+        def trabalhar():
+            try:
+                copia = Pedido.objects.get(pk=pedido.pk)  # todas leem "Pendente"
+                barreira.wait()
+                copia.status = "Pago"
+                copia.save()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabalhar) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # lê a tabela direto: contagem() refaria uma contagem negativa e esconderia a deriva
+        self.assertEqual(
+            dict(ContagemPedidoStatus.objects.values_list("status", "quantidade")),
+            {"Pendente": 0, "Pago": 1, "Cancelado": 0},
+        )
+
+
+class ExportacaoVersaoTest(TestCase):
+    """A chave do PDF em cache só muda quando algo que o relatório lê muda."""
+
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", "cliente@teste.com", "senha")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido = Pedido.objects.create(cliente=self.cliente, nome_cliente="Cliente", total=10)
+            self.item = PedidoItem.objects.create(
+                pedido=self.pedido, nome_produto="Frango", quantidade=1, preco_unitario=10, custo_unitario=6,
+            )
+
+    def _chave(self):
+        return preparar_exportacao("pedidos", {"status": "Pago", "page": "3"})[1]
+
+    def test_mesma_chave_sem_alteracao_e_em_uma_consulta(self):
+        chave = self._chave()
+        with self.assertNumQueries(1):
+            self.assertEqual(self._chave(), chave)
+        self.assertEqual(solicitar_exportacao("pedidos", {}, chave), solicitar_exportacao("pedidos", {}, chave))
+
+    def test_editar_item_ou_status_em_lote_troca_a_chave(self):
+        chave = self._chave()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.custo_unitario = 8
+            self.item.save()
+        depois_do_item = self._chave()
+        self.assertNotEqual(depois_do_item, chave)
+
+        admin = User.objects.create_superuser("admin", "admin@teste.com", "senha")
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("atualizar_status_pedidos_lote"), {"pedidos": [self.pedido.pk], "status": "Cancelado"})
+        self.assertNotEqual(self._chave(), depois_do_item)
+
+
+class ExportacaoExecucaoTest(TestCase):
+    """Com EXPORTACAO_WORKERS=0 o PDF sai no próprio request, passando pelos mesmos status do pool."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracao = override_settings(EXPORTACAO_WORKERS=0, MEDIA_ROOT=media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@teste.com", "senha"))
+        Produto.objects.create(nome="Frango", descricao="Congelado", preco=20, quantidade=5)
+        html = mock.patch("weasyprint.HTML")
+        self.write_pdf = html.start().return_value.write_pdf
+        self.addCleanup(html.stop)
+
+    def _exportar(self, **filtros):
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.get(reverse("relatorio_produtos_pdf"), filtros)
+        return resposta, ExportacaoRelatorio.objects.latest("pk")
+
+    def _status(self, exportacao):
+        return self.client.get(reverse("exportacao_status", args=[exportacao.pk])).json()
+
+    def test_gera_no_request_e_depois_serve_do_cache(self):
+        self.write_pdf.side_effect = lambda destino: destino.write(b"%PDF-1.4 teste")
+
+        resposta, exportacao = self._exportar()
+        self.assertTemplateUsed(resposta, "loja/gestao/exportacao_status.html")
+        self.assertEqual((exportacao.status, exportacao.progresso), (ExportacaoRelatorio.CONCLUIDO, 100))
+        self.assertIsNotNone(exportacao.expira_em)
+        self.assertEqual(self._status(exportacao)["url"], reverse("exportacao_download", args=[exportacao.pk]))
+
+        resposta, mesma = self._exportar()
+        self.assertEqual((mesma.pk, b"".join(resposta.streaming_content)), (exportacao.pk, b"%PDF-1.4 teste"))
+        self.assertEqual(self.write_pdf.call_count, 1)
+
+    def test_falha_fica_registrada_e_nao_e_reaproveitada(self):
+        self.write_pdf.side_effect = OSError("fonte não encontrada")
+
+        with self.assertLogs("loja.exportacao", "ERROR"):
+            _, exportacao = self._exportar(status="ativo")
+        self.assertEqual(self._status(exportacao), {
+            "status": ExportacaoRelatorio.ERRO, "progresso": 30, "erro": "fonte não encontrada", "url": None,
+        })
+
+        # pedir de novo cria outro job em vez de devolver o que falhou
+        self.write_pdf.side_effect = lambda destino: destino.write(b"%PDF-1.4 teste")
+        _, nova = self._exportar(status="ativo")
+        self.assertNotEqual(nova.pk, exportacao.pk)
+        self.assertEqual(nova.status, ExportacaoRelatorio.CONCLUIDO)
+
+
+class ResumoAvaliacoesTest(TestCase):
+    """O resumo de notas do produto acompanha feedbacks apagados em cascata."""
+
+    def test_apagar_usuario_ou_pedido_retira_as_notas(self):
+        produto = Produto.objects.create(nome="Frango", descricao="-", preco=10, quantidade=5)
+        autor = User.objects.create_user("autor", "autor@teste.com", "senha")
+        outro = User.objects.create_user("outro", "outro@teste.com", "senha")
+        pedido = Pedido.objects.create(cliente=outro, nome_cliente="Outro", total=10)
+        Feedback.objects.create(usuario=autor, produto=produto, nota=5)
+        Feedback.objects.create(usuario=autor, produto=produto, nota=1, visivel=False)
+        Feedback.objects.create(usuario=outro, produto=produto, pedido=pedido, nota=3)
+
+        autor.delete()
+        produto.refresh_from_db()
+        self.assertEqual((produto.total_avaliacoes, produto.soma_notas, produto.total_avaliacoes_visiveis), (1, 3, 1))
+
+        Pedido.objects.filter(pk=pedido.pk).delete()
+        produto.refresh_from_db()
+        self.assertEqual((produto.total_avaliacoes, produto.media_nota, produto.media_nota_visivel), (0, 0, 0))
@@ -9,6 +9,7 @@ urlpatterns = [
     path('entrar/', views.entrar, name='login'),
     path('sair/', views.sair, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/recalcular/', views.recalcular_painel, name='recalcular_painel'),
 
     # Rotas para produtos
     path('produtos/criar/', views.criar_produto, name='criar_produto'),
@@ -83,6 +84,9 @@ urlpatterns = [
     path("gestao/relatorios/estoque/pdf/", views_gestao.relatorio_estoque_pdf, name="relatorio_estoque_pdf"),
     path("gestao/relatorios/financeiro/pdf/", views_gestao.relatorio_financeiro_pdf, name="relatorio_financeiro_pdf"),
     path("gestao/relatorios/feedbacks/pdf/", views_gestao.relatorio_feedbacks_pdf, name="relatorio_feedbacks_pdf"),
+    path("gestao/relatorios/<str:tipo>/exportar/", views_gestao.exportar_relatorio, name="exportar_relatorio"),
+    path("gestao/exportacoes/<int:pk>/status/", views_gestao.exportacao_status, name="exportacao_status"),
+    path("gestao/exportacoes/<int:pk>/download/", views_gestao.exportacao_download, name="exportacao_download"),
 ]
 
 # Adiciona a configuração para servir arquivos de mídia durante o desenvolvimento
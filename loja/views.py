@@ -1,18 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Produto, Carrinho, ItemCarrinho, Pedido, PedidoItem, Feedback, Despesa
+from .models import Produto, Carrinho, ItemCarrinho, Pedido, PedidoItem, Feedback, Despesa, ContagemPedidoStatus
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import login, authenticate, logout
 from .forms import RegistroForm, FeedbackForm
 from django.views.decorators.http import require_POST
 from .decorators import staff_required
+from .paginacao import paginar_por_cursor
+from .busca import buscar, autocomplete, chave_autocomplete, invalidar_catalogo
+from .painel import invalidar_painel, painel
+from .exportacao import invalidar_relatorios
+from .carrinho import adicionar_unidade, mesclar_carrinho_sessao, produtos_da_sessao
+from .estoque import EstoqueInsuficiente, ler_ajustes, liberar_reservas, movimentar, reservar
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth.models import User
 from django.contrib import messages
 from .models import MovimentacaoEstoque
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.db.models import Sum, Count, Avg, Max
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from urllib.parse import quote
+import uuid
 from decimal import Decimal
 from django.utils import timezone
 from django.db.models.functions import ExtractMonth, ExtractDay 
@@ -38,8 +47,8 @@ from django.shortcuts import render
 from .models import Produto
 
 def home(request):
-    # Busca produtos já com média das notas
-    produtos = Produto.objects.filter(ativo=True).annotate(media_nota=Avg("feedbacks__nota")).order_by("-id")
+    # Média das notas já vem pronta no próprio produto (media_nota)
+    produtos = Produto.objects.filter(ativo=True).order_by("-id")
 
     # Filtros do formulário
     termo_busca = request.GET.get('q')
@@ -48,7 +57,7 @@ def home(request):
     nota_min = request.GET.get('nota_min')
 
     if termo_busca:
-        produtos = produtos.filter(nome__icontains=termo_busca)
+        produtos = buscar(produtos, termo_busca)
     if preco_min:
         produtos = produtos.filter(preco__gte=preco_min)
     if preco_max:
@@ -66,20 +75,16 @@ def home(request):
         "produtos": page_obj,   # compatibilidade com template
     })
 
+def _etag_busca(request):
+    # Muda quando o texto normalizado ou a versão do catálogo mudam
+    return chave_autocomplete(request.GET.get("q", "").strip())
+
+
+@cache_control(max_age=60, public=True)
+@condition(etag_func=_etag_busca)
 def buscar_produtos(request):
     termo = request.GET.get("q", "").strip()
-    resultados = []
-
-    if termo:
-        produtos = Produto.objects.filter(nome__icontains=termo, ativo=True)[:10]
-        for p in produtos:
-            resultados.append({
-                "id": p.id,
-                "nome": p.nome,
-                "imagem": p.imagem.url if p.imagem else None,
-                "url": f"/produto/{p.id}/"
-            })
-
+    resultados = autocomplete(termo) if termo else []
     return JsonResponse(resultados, safe=False)
 
 @staff_required
@@ -104,12 +109,16 @@ def alterar_status_produtos(request):
     produtos = Produto.objects.filter(id__in=produto_ids)
 
     if acao == "ativar":
-        alterados = produtos.update(ativo=True)
+        alterados = produtos.update(ativo=True, atualizado_em=timezone.now())
         messages.success(request, f"{alterados} produto(s) ativado(s) com sucesso.")
     elif acao == "inativar":
-        alterados = produtos.update(ativo=False)
+        alterados = produtos.update(ativo=False, atualizado_em=timezone.now())
         messages.success(request, f"{alterados} produto(s) inativado(s) com sucesso.")
 
+    # update() não passa pelo save() → invalida o autocomplete e os PDFs aqui (e marca atualizado_em acima)
+    invalidar_catalogo()
+    invalidar_relatorios(Produto)
+
     return redirect("listar_produtos")
 
 def registrar(request):
@@ -124,11 +133,6 @@ def registrar(request):
             # 🔄 Migra carrinho da sessão para o banco
             migrar_carrinho_sessao_para_usuario(request, user)
 
-            # 🔹 Recalcula contador da navbar pelo banco
-            carrinho = get_or_create_carrinho(user)
-            request.session["carrinho_itens"] = sum(i.quantidade for i in carrinho.itemcarrinho_set.all())
-            request.session.modified = True
-
             # 🔀 Redireciona para origem, se existir
             return redirect(next_url or 'home')
     else:
@@ -152,11 +156,6 @@ def entrar(request):
             # 🔄 Migra carrinho da sessão para o banco
             migrar_carrinho_sessao_para_usuario(request, user)
 
-            # 🔹 Recalcula contador da navbar pelo banco
-            carrinho = get_or_create_carrinho(user)
-            request.session["carrinho_itens"] = sum(i.quantidade for i in carrinho.itemcarrinho_set.all())
-            request.session.modified = True
-
             # 🔀 Redireciona para origem, se existir
             return redirect(next_url or 'home')
     else:
@@ -233,14 +232,15 @@ def _agregar_vendas_mes_atual_por_dia(queryset):
 
     return labels, valores
 
-def _contagem_pedidos_por_status(queryset):
+def _contagem_pedidos_por_status():
     """
-    Conta pedidos por status (Pendente, Pago, Cancelado...).
+    Conta pedidos por status (Pendente, Pago, Cancelado...) a partir do
+    contador mantido (ContagemPedidoStatus), sem varrer a tabela de pedidos.
     Retorna labels e values para gráfico de pizza.
     """
-    agregados = queryset.values('status').annotate(qtd=Count('id')).order_by()
-    labels = [row['status'] or 'Indef.' for row in agregados]
-    values = [row['qtd'] for row in agregados]
+    contagem = sorted((status, qtd) for status, qtd in ContagemPedidoStatus.contagem().items() if qtd)
+    labels = [status for status, _ in contagem]
+    values = [qtd for _, qtd in contagem]
     return labels, values
 
 
@@ -265,106 +265,43 @@ def dashboard(request):
     else:
         form = RegistroForm()
 
-    agora = timezone.now()
-    inicio_mes = agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    # Último dia do mês atual
-    from calendar import monthrange
-    ultimo_dia_mes = agora.replace(
-        day=monthrange(agora.year, agora.month)[1],
-        hour=23, minute=59, second=59, microsecond=999999
-    )
-
-    # Total de vendas do mês (somente pedidos pagos)
-    vendas_mes = (
-        Pedido.objects
-        .filter(status='Pago', data_criacao__gte=inicio_mes, data_criacao__lte=ultimo_dia_mes)
-        .aggregate(total=Sum('total'))
-        .get('total') or 0
-    )
-
-    # Filtra apenas pedidos pagos do mês atual
-    pedidos_pagos_qs = Pedido.objects.filter(
-        status='Pago',
-        data_criacao__gte=inicio_mes,
-        data_criacao__lte=ultimo_dia_mes
-    )
-
-    # Gera os dados para o mini gráfico
-    mini_labels, mini_values = _agregar_vendas_mes_atual_por_dia(pedidos_pagos_qs)
-
-    # Resumo dos pedidos
-    pedidos_pendentes = Pedido.objects.filter(status="Pendente").count()
-    pedidos_pagos = Pedido.objects.filter(status="Pago").count()
-    pedidos_cancelados = Pedido.objects.filter(status="Cancelado").count()
-
-    # Últimos 3 pedidos
-    ultimos_pedidos = Pedido.objects.select_related("cliente").order_by("-data_criacao")[:3]
-
-    # Top 5 produtos mais vendidos
-    top_produtos = (
-        PedidoItem.objects
-        .values("produto__nome")
-        .annotate(
-            total_vendido=Sum("quantidade"),
-            ultima_venda=Max("pedido__data_criacao")
-        )
-        .order_by("-total_vendido")[:5]
-    )
-
-    # Últimos feedbacks
-    feedbacks = (
-        Feedback.objects
-        .select_related("usuario", "produto")
-        .order_by("-data_criacao")[:5]
-    )
-
-    # ================== 🔹 RESUMO FINANCEIRO DO MÊS ==================
-    pedidos_mes = Pedido.objects.filter(
-        status="Pago",
-        data_criacao__gte=inicio_mes,
-        data_criacao__lte=ultimo_dia_mes
-    )
-
-    receita_total = float(pedidos_mes.aggregate(total=Sum("total"))["total"] or 0)
-
-    custo_total = sum(
-        float(item.custo_unitario) * item.quantidade
-        for item in PedidoItem.objects.filter(pedido__in=pedidos_mes)
-    )
-
-    # 🔹 Agora despesas puxam o mês inteiro
-    despesas = Despesa.objects.filter(data__gte=inicio_mes, data__lte=ultimo_dia_mes)
-
-    despesas_fixas_valor = float(despesas.filter(tipo="Fixo").aggregate(total=Sum("valor"))["total"] or 0)
-    despesas_variaveis_valor = float(despesas.filter(tipo="Variável").aggregate(total=Sum("valor"))["total"] or 0)
-
-    lucro_liquido = receita_total - custo_total - despesas_fixas_valor - despesas_variaveis_valor
+    # 🔹 Cards, listas e mini-gráfico vêm do retrato em cache (ver loja/painel.py)
+    dados = painel()
 
     # Contexto enviado para o template
     ctx = {
         'form': form,
-        'vendas_mes': vendas_mes,
-        'mini_mes_labels_json': json.dumps(mini_labels, ensure_ascii=False),
-        'mini_mes_values_json': json.dumps(mini_values),
-        "pedidos_pendentes": pedidos_pendentes,
-        "pedidos_pagos": pedidos_pagos,
-        "pedidos_cancelados": pedidos_cancelados,
-        "ultimos_pedidos": ultimos_pedidos,
-        "top_produtos": top_produtos,
-        "feedbacks": feedbacks,
+        'vendas_mes': dados["vendas_mes"],
+        'mini_mes_labels_json': json.dumps(dados["mini_labels"], ensure_ascii=False),
+        'mini_mes_values_json': json.dumps(dados["mini_values"]),
+        "pedidos_pendentes": dados["pedidos_pendentes"],
+        "pedidos_pagos": dados["pedidos_pagos"],
+        "pedidos_cancelados": dados["pedidos_cancelados"],
+        "ultimos_pedidos": dados["ultimos_pedidos"],
+        "top_produtos": dados["top_produtos"],
+        "feedbacks": dados["feedbacks"],
 
         # 👇 adicionados para os cards financeiros
-        "receita_total": receita_total,
-        "custo_total": custo_total,
-        "despesas_fixas": despesas_fixas_valor,
-        "despesas_variaveis": despesas_variaveis_valor,
-        "lucro_liquido": lucro_liquido,
+        "receita_total": dados["receita_total"],
+        "custo_total": dados["custo_total"],
+        "despesas_fixas": dados["despesas_fixas"],
+        "despesas_variaveis": dados["despesas_variaveis"],
+        "lucro_liquido": dados["lucro_liquido"],
+        "painel_calculado_em": dados["calculado_em"],
     }
 
     return render(request, 'loja/dashboard.html', ctx)
 
 
+@staff_required
+@require_POST
+def recalcular_painel(request):
+    """Refaz na hora o retrato do dashboard, sem esperar a validade do cache."""
+    painel(recalcular=True)
+    messages.success(request, "Painel recalculado.")
+    return redirect("dashboard")
+
+
 
 
 def criar_produto(request):
@@ -481,8 +418,9 @@ def produto_detalhe(request, produto_id):
         # Clientes só veem feedbacks aprovados
         feedbacks = produto.feedbacks.filter(visivel=True).select_related("usuario").order_by("-data_criacao")
 
-    media_nota = feedbacks.aggregate(Avg("nota"))["nota__avg"] or 0
-    media_nota = round(media_nota, 1)
+    # Média mantida no próprio produto (sem agregar os feedbacks a cada acesso)
+    media_nota = produto.media_nota if request.user.is_staff else produto.media_nota_visivel
+    media_nota = round(media_nota or 0, 1)
 
     context = {
         "produto": produto,
@@ -507,15 +445,9 @@ def entrada_estoque(request):
             if quantidade <= 0:
                 messages.error(request, "A quantidade deve ser maior que zero.")
             else:
-                produto.quantidade += quantidade
-                produto.save()
-
-                MovimentacaoEstoque.objects.create(
-                    produto=produto,
-                    tipo='entrada',
-                    quantidade=quantidade,
-                    estoque_final=produto.quantidade,
-                    observacao=observacao or f"Entrada registrada por {request.user.username}"
+                movimentar(
+                    [(produto.id, quantidade, observacao or f"Entrada registrada por {request.user.username}")],
+                    "entrada",
                 )
 
                 messages.success(request, f"Entrada de {quantidade} unidades para '{produto.nome}' registrada com sucesso.")
@@ -537,8 +469,6 @@ def ajuste_estoque(request):
     - Quantidades por produto: name="qtd_<id>"
     - Observação: usa obs_<id> (se vier) ou cai no global 'observacao'
     """
-    produtos = Produto.objects.all().order_by('nome')
-
     if request.method == 'POST':
         modo = (request.POST.get('acao_global') or 'entrada').strip().lower()
         if modo not in ('entrada', 'saida'):
@@ -548,59 +478,23 @@ def ajuste_estoque(request):
         # Observação global do textarea (pode estar vazia)
         observacao_global = (request.POST.get('observacao') or '').strip()
 
-        # Lista de (produto, qtd, observacao_efetiva)
-        movimentos = []
-        for p in produtos:
-            qtd_raw = (request.POST.get(f'qtd_{p.id}') or '').strip()
-            if not qtd_raw:
-                continue
-            try:
-                qtd = int(qtd_raw)
-            except ValueError:
-                continue
-            if qtd <= 0:
-                continue
-
-            # Preferência: obs_<id> se vier; caso contrário, usa a global
-            obs_item = (request.POST.get(f'obs_{p.id}') or '').strip()
-            obs_efetiva = obs_item if obs_item else observacao_global
-
-            movimentos.append((p, qtd, obs_efetiva))
+        # 🔹 Só os produtos enviados no formulário: [(id, qtd, observacao_efetiva)]
+        ajustes = ler_ajustes(request.POST, observacao_global)
 
-        if not movimentos:
+        if not ajustes:
             messages.warning(request, "Nenhuma quantidade informada para movimentar.")
             return redirect('ajuste_estoque')
 
-        with transaction.atomic():
-            for produto, qtd, obs in movimentos:
-                if modo == 'entrada':
-                    novo_estoque = produto.quantidade + qtd
-                    tipo = 'entrada'
-                else:
-                    if produto.quantidade - qtd < 0:
-                        messages.error(
-                            request,
-                            f"Saída inválida para '{produto.nome}': estoque insuficiente."
-                        )
-                        transaction.set_rollback(True)
-                        return redirect('ajuste_estoque')
-                    novo_estoque = produto.quantidade - qtd
-                    tipo = 'saida'
-
-                produto.quantidade = novo_estoque
-                produto.save()
-
-                MovimentacaoEstoque.objects.create(
-                    produto=produto,
-                    tipo=tipo,
-                    quantidade=qtd,
-                    estoque_final=novo_estoque,
-                    observacao=obs  # ✅ usa a observação efetiva (item ou global)
-                )
+        try:
+            movimentar(ajustes, modo)
+        except EstoqueInsuficiente as exc:
+            messages.error(request, f"Saída inválida para '{exc}': estoque insuficiente.")
+            return redirect('ajuste_estoque')
 
         messages.success(request, "Movimentações salvas com sucesso!")
         return redirect('ajuste_estoque')
 
+    produtos = Produto.objects.all().order_by('nome')
     return render(request, 'loja/ajuste_estoque.html', {'produtos': produtos})
 
 
@@ -615,7 +509,7 @@ def historico_estoque(request):
     data_fim = request.GET.get("data_fim", "")
     tipo = request.GET.get("tipo", "")
 
-    movimentacoes = MovimentacaoEstoque.objects.select_related('produto').order_by('-data')
+    movimentacoes = MovimentacaoEstoque.objects.select_related('produto')
 
     # 🔹 Aplicando filtros
     if nome:
@@ -638,16 +532,13 @@ def historico_estoque(request):
     if tipo:
         movimentacoes = movimentacoes.filter(tipo=tipo)
 
-    # 🔹 Paginação
-    from django.core.paginator import Paginator
-    paginator = Paginator(movimentacoes, 40)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # 🔹 Paginação por cursor (data, id) — sem COUNT/OFFSET
+    page_obj = paginar_por_cursor(request, movimentacoes, 40, ordenacao=("-data", "-id"), contagem="aproximada")
 
     # 🔹 Mantém os filtros ao trocar de página
     filtro_params = request.GET.copy()
-    if "page" in filtro_params:
-        filtro_params.pop("page")
+    for chave in ("page", "depois", "antes"):
+        filtro_params.pop(chave, None)
     filtro_params = filtro_params.urlencode()
 
     context = {
@@ -670,52 +561,12 @@ def get_or_create_carrinho(usuario):
     return carrinho
 
 
-def adicionar_ao_carrinho(request, produto_id):
-    produto = get_object_or_404(Produto, id=produto_id)
-
-    if request.user.is_authenticated:
-        # 🔒 Usuário logado → Carrinho no banco
-        carrinho = get_or_create_carrinho(request.user)
-        item, criado = ItemCarrinho.objects.get_or_create(
-            carrinho=carrinho,
-            produto=produto,
-            defaults={'preco_unitario': produto.preco, 'quantidade': 1}
-        )
-        if not criado:
-            item.quantidade += 1
-            item.save()
-        carrinho.calcular_total()
-
-        # 🔹 Atualiza contador na navbar
-        request.session["carrinho_itens"] = sum(i.quantidade for i in carrinho.itemcarrinho_set.all())
-
-    else:
-        # 👤 Usuário anônimo → Carrinho na sessão
-        carrinho_sessao = request.session.get("carrinho", {})
-        if str(produto_id) in carrinho_sessao:
-            carrinho_sessao[str(produto_id)]["quantidade"] += 1
-        else:
-            carrinho_sessao[str(produto_id)] = {
-                "nome": produto.nome,
-                "preco_unitario": str(produto.preco),
-                "quantidade": 1,
-                "imagem": produto.imagem.url if produto.imagem else None,
-            }
-        request.session["carrinho"] = carrinho_sessao
-
-        # 🔹 Atualiza contador na navbar
-        request.session["carrinho_itens"] = sum(item["quantidade"] for item in carrinho_sessao.values())
-
-    request.session.modified = True
-    messages.success(request, f"'{produto.nome}' foi adicionado ao carrinho.")
-    return redirect('ver_carrinho') 
-
-
 def ver_carrinho(request):
     """
     Exibe o carrinho de compras.
     Agora ajusta automaticamente itens com estoque menor
     e bloqueia a compra se houver produto inativo ou insuficiente.
+    Só lê o carrinho; as correções de preço/quantidade vão num único bulk_update.
     """
     if request.user.is_authenticated:
         # 🔒 Usuário logado → Carrinho no banco
@@ -723,14 +574,14 @@ def ver_carrinho(request):
 
         itens = []
         mensagens_alerta = []
+        corrigidos = []  # itens com quantidade/preço ajustados, gravados juntos no fim
+        total = Decimal("0.00")
 
+        # 🔹 Itens e produtos numa consulta só; nada é salvo dentro do laço
         for item in carrinho.itemcarrinho_set.select_related("produto"):
             produto = item.produto
-            if not produto:
-                item.delete()
-                continue
-
             em_falta = False
+            alterado = False
 
             # 🔸 Produto inativo → alerta e bloqueio
             if not produto.ativo:
@@ -739,21 +590,24 @@ def ver_carrinho(request):
                     f"O produto '{produto.nome}' está indisponível. Retire-o do carrinho!"
                 )
 
-            # 🔹 Quantidade acima do estoque → ajusta automaticamente
-            if produto.quantidade < item.quantidade:
+            # 🔹 Quantidade acima do disponível (estoque - reservado) → ajusta automaticamente
+            if produto.disponivel < item.quantidade:
                 quantidade_antiga = item.quantidade  # guarda quanto o cliente tinha
-                item.quantidade = produto.quantidade
-                item.save()
+                item.quantidade = produto.disponivel
+                alterado = True
                 mensagens_alerta.append(
                     f"O produto '{produto.nome}' não possui mais {quantidade_antiga} unidade(s) em estoque. "
-                    f"Sua quantidade foi ajustada para {produto.quantidade}."
+                    f"Sua quantidade foi ajustada para {produto.disponivel}."
                 )
 
-
             # 🔹 Atualiza preço se houver alteração
             if produto.ativo and item.preco_unitario != produto.preco:
                 item.preco_unitario = produto.preco
-                item.save()
+                alterado = True
+
+            if alterado:
+                corrigidos.append(item)
+            total += item.subtotal()
 
             itens.append({
                 "id": item.id,
@@ -763,12 +617,16 @@ def ver_carrinho(request):
                 "subtotal": item.subtotal(),
                 "imagem": produto.imagem.url if produto.imagem else None,
                 "em_falta": em_falta,
+                "disponivel": produto.disponivel,
             })
 
-        # 🔹 Recalcula o total
-        carrinho.calcular_total()
-        request.session["carrinho_itens"] = sum(i.quantidade for i in carrinho.itemcarrinho_set.all())
-        request.session.modified = True
+        # 🔹 Correções num UPDATE; os contadores só são gravados se mudaram
+        if corrigidos:
+            ItemCarrinho.objects.bulk_update(corrigidos, ["quantidade", "preco_unitario"])
+        total_itens = sum(i["quantidade"] for i in itens)
+        if (carrinho.valor_total, carrinho.total_itens) != (total, total_itens):
+            carrinho.valor_total, carrinho.total_itens = total, total_itens
+            carrinho.save(update_fields=["valor_total", "total_itens"])
 
         # 🔹 Exibe avisos no topo da página
         for alerta in mensagens_alerta:
@@ -776,13 +634,13 @@ def ver_carrinho(request):
 
         # 🔹 Bloqueia compra se houver itens inativos ou com estoque insuficiente
         bloqueio_compra = any(
-            (i["em_falta"] or i["quantidade"] > Produto.objects.get(nome=i["nome"]).quantidade)
+            i["em_falta"] or i["quantidade"] > i["disponivel"]
             for i in itens
         )
 
         return render(request, "loja/carrinho.html", {
             "itens": itens,
-            "total": carrinho.total(),
+            "total": total,
             "sessao": False,
             "bloqueio_compra": bloqueio_compra,
         })
@@ -796,10 +654,12 @@ def ver_carrinho(request):
         total = Decimal("0.00")
         mensagens_alerta = []
 
+        # 🔹 Todos os produtos da sessão numa consulta
+        produtos = produtos_da_sessao(carrinho_sessao)
+
         for produto_id, dados in list(carrinho_sessao.items()):
-            try:
-                produto = Produto.objects.get(id=produto_id)
-            except Produto.DoesNotExist:
+            produto = produtos.get(str(produto_id))
+            if produto is None:
                 del carrinho_sessao[str(produto_id)]
                 continue
 
@@ -811,11 +671,11 @@ def ver_carrinho(request):
                     f"O produto '{produto.nome}' está indisponível. Retire-o do carrinho!"
                 )
 
-            # 🔹 Ajuste automático de quantidade
-            if produto.quantidade < dados["quantidade"]:
-                dados["quantidade"] = produto.quantidade
+            # 🔹 Ajuste automático de quantidade (estoque - reservado)
+            if produto.disponivel < dados["quantidade"]:
+                dados["quantidade"] = produto.disponivel
                 mensagens_alerta.append(
-                    f"O produto '{produto.nome}' não possui mais {produto.quantidade} unidade(s) em estoque. "
+                    f"O produto '{produto.nome}' não possui mais {produto.disponivel} unidade(s) em estoque. "
                     f"Sua quantidade foi ajustada automaticamente."
                 )
 
@@ -836,18 +696,17 @@ def ver_carrinho(request):
                 "subtotal": subtotal,
                 "imagem": dados.get("imagem"),
                 "em_falta": em_falta,
+                "disponivel": produto.disponivel,
             })
 
         request.session["carrinho"] = carrinho_sessao
-        request.session["carrinho_itens"] = sum(item["quantidade"] for item in carrinho_sessao.values())
-        request.session.modified = True
 
         for alerta in mensagens_alerta:
             messages.warning(request, alerta)
 
         # 🔹 Bloqueia compra se houver produtos inativos ou acima do estoque
         bloqueio_compra = any(
-            (i["em_falta"] or i["quantidade"] > Produto.objects.get(nome=i["nome"]).quantidade)
+            i["em_falta"] or i["quantidade"] > i["disponivel"]
             for i in itens
         )
 
@@ -862,12 +721,9 @@ def remover_do_carrinho(request, item_id):
     if request.user.is_authenticated:
         # 🔒 Usuário logado → remove do banco
         item = get_object_or_404(ItemCarrinho, id=item_id, carrinho__usuario=request.user)
-        carrinho = item.carrinho
-        item.delete()
-        carrinho.calcular_total()
-
-        # 🔹 Atualiza contador na navbar
-        request.session["carrinho_itens"] = sum(i.quantidade for i in carrinho.itemcarrinho_set.all())
+        with transaction.atomic():
+            item.delete()
+            Carrinho.aplicar_delta(item.carrinho_id, -item.quantidade, -item.subtotal())
 
     else:
         # 👤 Usuário anônimo → remove da sessão
@@ -876,10 +732,6 @@ def remover_do_carrinho(request, item_id):
             del carrinho_sessao[str(item_id)]
             request.session["carrinho"] = carrinho_sessao
 
-        # 🔹 Atualiza contador na navbar
-        request.session["carrinho_itens"] = sum(item["quantidade"] for item in carrinho_sessao.values())
-
-    request.session.modified = True
     return redirect('ver_carrinho')
 
 def alterar_quantidade(request, item_id):
@@ -892,7 +744,7 @@ def alterar_quantidade(request, item_id):
             except ValueError:
                 qtd = 1
 
-            estoque_disp = item.produto.quantidade  # quantidade disponível em estoque
+            estoque_disp = item.produto.disponivel  # estoque menos o reservado para pedidos
 
             # Se tentar passar do estoque, ajusta para o máximo
             if qtd > estoque_disp:
@@ -902,16 +754,17 @@ def alterar_quantidade(request, item_id):
                     f"O produto '{item.produto.nome}' só possui {estoque_disp} unidade(s) em estoque. Sua quantidade foi ajustada."
                 )
 
-            if qtd > 0:
-                item.quantidade = qtd
-                item.save()
-            else:
-                item.delete()
-
-            item.carrinho.calcular_total()
+            qtd = max(qtd, 0)
+            diferenca = qtd - item.quantidade
+            with transaction.atomic():
+                if qtd > 0:
+                    item.quantidade = qtd
+                    item.save()
+                else:
+                    item.delete()
 
-            # 🔹 Atualiza contador na navbar
-            request.session["carrinho_itens"] = sum(i.quantidade for i in item.carrinho.itemcarrinho_set.all())
+                # 🔹 Contadores do carrinho (navbar e total) por delta
+                Carrinho.aplicar_delta(item.carrinho_id, diferenca, diferenca * item.preco_unitario)
 
     else:
         # 👤 Usuário anônimo → altera na sessão
@@ -923,7 +776,7 @@ def alterar_quantidade(request, item_id):
                 qtd = 1
 
             produto = get_object_or_404(Produto, id=item_id)
-            estoque_disp = produto.quantidade  # quantidade disponível em estoque
+            estoque_disp = produto.disponivel  # estoque menos o reservado para pedidos
 
             # Se tentar passar do estoque, ajusta para o máximo
             if qtd > estoque_disp:
@@ -939,41 +792,16 @@ def alterar_quantidade(request, item_id):
                 del carrinho_sessao[str(item_id)]
 
             request.session["carrinho"] = carrinho_sessao
-            request.session["carrinho_itens"] = sum(item["quantidade"] for item in carrinho_sessao.values())
 
-    request.session.modified = True
     return redirect('ver_carrinho')
 
 def migrar_carrinho_sessao_para_usuario(request, user):
-    carrinho_sessao = request.session.get("carrinho", {})
-    if not carrinho_sessao:
-        return
-    
-    carrinho = get_or_create_carrinho(user)
-
-    for produto_id, dados in carrinho_sessao.items():
-        try:
-            produto = Produto.objects.get(id=produto_id)
-        except Produto.DoesNotExist:
-            continue  # ignora produtos que não existem mais
-
-        item, criado = ItemCarrinho.objects.get_or_create(
-            carrinho=carrinho,
-            produto=produto,
-            defaults={
-                "preco_unitario": produto.preco,
-                "quantidade": dados["quantidade"]
-            }
-        )
-        if not criado:
-            item.quantidade += dados["quantidade"]
-            item.save()
+    """Leva o carrinho da sessão para o banco (contadores do Carrinho incluídos)."""
+    mesclar_carrinho_sessao(request.session.get("carrinho", {}), user)
 
-    carrinho.calcular_total()
     # limpa carrinho da sessão
     if "carrinho" in request.session:
         del request.session["carrinho"]
-        request.session.modified = True
 
 def adicionar_carrinho(request, produto_id):
     produto = get_object_or_404(Produto, id=produto_id)
@@ -982,29 +810,19 @@ def adicionar_carrinho(request, produto_id):
 
     if request.user.is_authenticated:
         # 🔒 Usuário logado → Carrinho no banco
-        carrinho, _ = Carrinho.objects.get_or_create(usuario=request.user)
-        item, created = ItemCarrinho.objects.get_or_create(
-            carrinho=carrinho,
-            produto=produto,
-            defaults={"quantidade": 1, "preco_unitario": produto.preco}
-        )
-        if not created:
-            if item.quantidade < produto.quantidade:
-                item.quantidade += 1
-                item.save()
-            else:
-                aviso = f"O produto '{produto.nome}' só possui {produto.quantidade} unidade(s) em estoque."
-        total_itens = sum(i.quantidade for i in carrinho.itemcarrinho_set.all())
-        request.session["carrinho_itens"] = total_itens
+        # 🔹 Soma no banco, limitada ao disponível da linha do produto (ver loja/carrinho.py)
+        adicionado, total_itens = adicionar_unidade(request.user, produto)
+        if not adicionado:
+            aviso = f"O produto '{produto.nome}' só possui {produto.disponivel} unidade(s) em estoque."
 
     else:
         # 👤 Usuário anônimo → Carrinho na sessão
         carrinho_sessao = request.session.get("carrinho", {})
         if str(produto_id) in carrinho_sessao:
-            if carrinho_sessao[str(produto_id)]["quantidade"] < produto.quantidade:
+            if carrinho_sessao[str(produto_id)]["quantidade"] < produto.disponivel:
                 carrinho_sessao[str(produto_id)]["quantidade"] += 1
             else:
-                aviso = f"O produto '{produto.nome}' só possui {produto.quantidade} unidade(s) em estoque."
+                aviso = f"O produto '{produto.nome}' só possui {produto.disponivel} unidade(s) em estoque."
         else:
             carrinho_sessao[str(produto_id)] = {
                 "nome": produto.nome,
@@ -1014,9 +832,6 @@ def adicionar_carrinho(request, produto_id):
             }
         request.session["carrinho"] = carrinho_sessao
         total_itens = sum(item["quantidade"] for item in carrinho_sessao.values())
-        request.session["carrinho_itens"] = total_itens
-
-    request.session.modified = True
 
     # 🔹 Caso AJAX (home/vitrine)
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
@@ -1035,9 +850,68 @@ def adicionar_carrinho(request, produto_id):
 
 
 
+def _pedido_confirmado(request, pedido, itens_pedido):
+    """Página de confirmação com o link do WhatsApp, montada só com dados do pedido."""
+    # 8) Monta a mensagem para envio via WhatsApp (com os itens já em memória)
+    produtos_texto = [
+        f"- {item.quantidade}x {item.nome_produto} – R$ {item.subtotal()}"
+        for item in itens_pedido
+    ]
+
+    mensagem_parts = [
+        f"🛒 *Pedido {pedido.numero_pedido} realizado através do site*:",
+        "",
+        "📦 *Produtos:*",
+        *produtos_texto,
+        "",
+        f"💰 *Total:* R$ {pedido.total}",
+        "",
+        "📍 *Endereço de entrega:*",
+        *pedido.endereco_entrega.split("\n"),
+        "",
+        f"📱 *WhatsApp do cliente:* {pedido.numero_whatsapp}",
+        "",
+        f"🙋 Cliente: {pedido.nome_cliente}",
+        "",
+        "Agradeço desde já! 😊",
+    ]
+
+    mensagem_final = "\n".join(mensagem_parts)
+    numero_vendedor = getattr(settings, 'WHATSAPP_NUMBER', '5518981078919')
+    whatsapp_url = f"https://wa.me/{numero_vendedor}?text={quote(mensagem_final)}"
+
+    # 9) Retorna página de confirmação
+    return render(request, "loja/pedido_confirmado.html", {
+        "whatsapp_url": whatsapp_url,
+        "pedido_id": pedido.id,
+        "nome_cliente": pedido.nome_cliente,
+        "numero_pedido": pedido.numero_pedido,
+    })
+
+
+def _pedido_ja_criado(request, chave):
+    """Pedido deste cliente criado com a mesma chave de checkout (reenvio), ou None."""
+    if not chave:
+        return None
+    return Pedido.objects.filter(cliente=request.user, chave_idempotencia=chave).first()
+
+
 @login_required
 def finalizar_compra(request):
-    """Finaliza a compra, cria o pedido com itens congelados (nome, preço e custo)."""
+    """
+    Finaliza a compra, cria o pedido com itens congelados (nome, preço e custo).
+    O carrinho é lido uma vez (com produto e custo); pedido, itens, reserva e
+    limpeza do carrinho são gravados numa transação, em número fixo de consultas.
+
+    Idempotente: o formulário leva uma `chave_idempotencia` (única em Pedido).
+    Duplo clique ou POST repetido com a mesma chave devolve o pedido já criado.
+    """
+    chave = request.POST.get("chave_idempotencia", "").strip()[:64] if request.method == 'POST' else ""
+
+    # 🔁 Reenvio de um checkout que já deu certo (o carrinho já está vazio)
+    pedido = _pedido_ja_criado(request, chave)
+    if pedido:
+        return _pedido_confirmado(request, pedido, pedido.itens.all())
 
     # 1) Busca o carrinho do usuário logado
     try:
@@ -1046,10 +920,19 @@ def finalizar_compra(request):
         messages.error(request, "Seu carrinho está vazio.")
         return redirect('ver_carrinho')
 
-    itens = carrinho.itemcarrinho_set.all()
-    if not itens.exists():
+    # 🔹 Itens, produtos e custos numa consulta; o total sai daqui, sem recalcular no banco
+    itens = list(carrinho.itemcarrinho_set.select_related("produto__custo_info"))
+    if not itens:
         messages.warning(request, "Seu carrinho está vazio.")
         return redirect('ver_carrinho')
+    total = sum((item.subtotal() for item in itens), Decimal("0.00"))
+
+    contexto_formulario = {
+        'itens': itens,
+        'total': total,
+        'numero_vendedor': getattr(settings, 'WHATSAPP_NUMBER', '5518981078919'),
+        'chave_idempotencia': chave or uuid.uuid4().hex,  # uma por envio do formulário
+    }
 
     # 2) Quando o usuário envia o formulário (POST)
     if request.method == 'POST':
@@ -1066,11 +949,7 @@ def finalizar_compra(request):
         # 3) Validação: campos obrigatórios
         if not all([nome, rua, numero, bairro, cidade]):
             messages.error(request, "Preencha todos os campos obrigatórios.")
-            return render(request, 'loja/finalizar_compra.html', {
-                'itens': itens,
-                'total': carrinho.total(),
-                'numero_vendedor': getattr(settings, 'WHATSAPP_NUMBER', '5518981078919'),
-            })
+            return render(request, 'loja/finalizar_compra.html', contexto_formulario)
 
         # 4) Monta o endereço completo em formato de texto
         endereco_parts = [f"{rua}, {numero}", f"{bairro} – {cidade}"]
@@ -1081,91 +960,63 @@ def finalizar_compra(request):
         endereco_texto = "\n".join(endereco_parts)
 
         try:
-            # 5) Cria o pedido no banco de dados
-            pedido = Pedido.objects.create(
-                cliente=request.user,
-                total=Decimal(str(carrinho.total())),
-                status='Pendente',
-                nome_cliente=nome,
-                endereco_entrega=endereco_texto,
-                numero_whatsapp=numero_whatsapp,  # ✅ salva o número no banco
-            )
-
-            # 6) Cria os itens do pedido (congelando dados)
-            for item in itens:
-                custo_unit = getattr(item.produto.custo_info, "custo", 0) \
-                    if item.produto and hasattr(item.produto, "custo_info") else 0
-
-                PedidoItem.objects.create(
-                    pedido=pedido,
-                    produto=item.produto,  # mantém referência ao produto
-                    nome_produto=item.produto.nome if item.produto else "Produto removido",
-                    quantidade=item.quantidade,
-                    preco_unitario=item.preco_unitario,
-                    custo_unitario=custo_unit
+            with transaction.atomic():
+                # 5) Cria o pedido no banco de dados (a chave única barra o envio duplicado)
+                pedido = Pedido.objects.create(
+                    cliente=request.user,
+                    total=total,
+                    status='Pendente',
+                    nome_cliente=nome,
+                    endereco_entrega=endereco_texto,
+                    numero_whatsapp=numero_whatsapp,  # ✅ salva o número no banco
+                    chave_idempotencia=chave or None,
                 )
 
-            # 7) Limpa o carrinho do usuário
-            itens.delete()
-            carrinho.valor_total = Decimal('0.00')
-            carrinho.save()
+                # 6) Cria os itens do pedido (congelando dados) num INSERT só
+                itens_pedido = PedidoItem.objects.bulk_create([
+                    PedidoItem(
+                        pedido=pedido,
+                        produto=item.produto,  # mantém referência ao produto
+                        nome_produto=item.produto.nome,
+                        quantidade=item.quantidade,
+                        preco_unitario=item.preco_unitario,
+                        custo_unitario=item.produto.custo_info.custo if hasattr(item.produto, "custo_info") else 0,
+                    )
+                    for item in itens
+                ])
+
+                # 🔒 Segura as unidades até o pagamento (ou até a reserva vencer)
+                reservar(pedido, [(item.produto_id, item.quantidade) for item in itens])
+
+                # 7) Limpa o carrinho do usuário
+                ItemCarrinho.objects.filter(carrinho=carrinho).delete()
+                carrinho.valor_total = Decimal('0.00')
+                carrinho.total_itens = 0
+                carrinho.save(update_fields=["valor_total", "total_itens"])
+
+        except IntegrityError as e:
+            # 🔁 Envio simultâneo com a mesma chave: o outro criou o pedido, este só o mostra
+            pedido = _pedido_ja_criado(request, chave)
+            if pedido:
+                return _pedido_confirmado(request, pedido, pedido.itens.all())
+            messages.error(request, f"Erro ao criar pedido: {str(e)}")
+            return render(request, 'loja/finalizar_compra.html', contexto_formulario)
 
-            # Reseta contador de itens da sessão
-            request.session["carrinho_itens"] = 0
-            request.session.modified = True
+        except EstoqueInsuficiente as exc:
+            # 🚫 Outro cliente reservou antes: nada foi criado, o carrinho é revisto
+            messages.error(request, f"Estoque insuficiente para: {exc}. Revise seu carrinho.")
+            return redirect('ver_carrinho')
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             messages.error(request, f"Erro ao criar pedido: {str(e)}")
-            return render(request, 'loja/finalizar_compra.html', {
-                'itens': itens,
-                'total': carrinho.total(),
-                'numero_vendedor': getattr(settings, 'WHATSAPP_NUMBER', '5518981078919'),
-            })
+            return render(request, 'loja/finalizar_compra.html', contexto_formulario)
 
-        # 8) Monta a mensagem para envio via WhatsApp
-        produtos_texto = [
-            f"- {item.quantidade}x {item.nome_produto} – R$ {item.subtotal()}"
-            for item in pedido.itens.all()
-        ]
-
-        mensagem_parts = [
-            f"🛒 *Pedido {pedido.numero_pedido} realizado através do site*:",
-            "",
-            "📦 *Produtos:*",
-            *produtos_texto,
-            "",
-            f"💰 *Total:* R$ {pedido.total}",
-            "",
-            "📍 *Endereço de entrega:*",
-            *endereco_texto.split("\n"),
-            "",
-            f"📱 *WhatsApp do cliente:* {numero_whatsapp}",
-            "",
-            f"🙋 Cliente: {nome}",
-            "",
-            "Agradeço desde já! 😊",
-        ]
-
-        mensagem_final = "\n".join(mensagem_parts)
-        numero_vendedor = getattr(settings, 'WHATSAPP_NUMBER', '5518981078919')
-        whatsapp_url = f"https://wa.me/{numero_vendedor}?text={quote(mensagem_final)}"
-
-        # 9) Retorna página de confirmação
-        return render(request, "loja/pedido_confirmado.html", {
-            "whatsapp_url": whatsapp_url,
-            "pedido_id": pedido.id,
-            "nome_cliente": nome,
-            "numero_pedido": pedido.numero_pedido,
-        })
+        return _pedido_confirmado(request, pedido, itens_pedido)
 
     # 10) GET → exibe formulário de finalização
-    return render(request, 'loja/finalizar_compra.html', {
-        'itens': itens,
-        'total': carrinho.total(),
-        'numero_vendedor': getattr(settings, 'WHATSAPP_NUMBER', '5518981078919'),
-    })
+    return render(request, 'loja/finalizar_compra.html', contexto_formulario)
 
 
 from datetime import datetime, timedelta
@@ -1182,7 +1033,7 @@ def pedidos(request):
     data_inicio = request.GET.get("data_inicio", "")
     data_fim = request.GET.get("data_fim", "")
 
-    pedidos = Pedido.objects.select_related("cliente").order_by("-data_criacao")
+    pedidos = Pedido.objects.select_related("cliente")
 
     # 🔹 Aplicação dos filtros
     if termo_nome:
@@ -1204,20 +1055,17 @@ def pedidos(request):
     except ValueError:
         pass
 
-    # 🔹 Paginação
-    from django.core.paginator import Paginator
-    paginator = Paginator(pedidos, 10)  # ← quantidade por página
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # 🔹 Paginação por cursor (data_criacao, id)
+    page_obj = paginar_por_cursor(request, pedidos, 10, ordenacao=("-data_criacao", "-id"), contagem="aproximada")
 
     # 🔹 Mantém os filtros durante a paginação
     filtro_params = request.GET.copy()
-    if "page" in filtro_params:
-        filtro_params.pop("page")
+    for chave in ("page", "depois", "antes"):
+        filtro_params.pop(chave, None)
     filtro_params = filtro_params.urlencode()
 
     # 🔹 Dados do gráfico (Pedidos por status)
-    status_labels, status_values = _contagem_pedidos_por_status(Pedido.objects.all())
+    status_labels, status_values = _contagem_pedidos_por_status()
 
     # 🔹 Contexto final
     context = {
@@ -1262,90 +1110,66 @@ def atualizar_status_pedido(request, pedido_id):
     - Valida estoque ao marcar como Pago.
     - Permite forçar atualização (forcar=true) se o estoque for insuficiente.
     - Ao cancelar um pedido Pago, devolve a quantidade dos produtos ao estoque.
+    - Pago ou Cancelado libera a reserva feita no checkout.
     """
-    from .models import Pedido, MovimentacaoEstoque
+    from .models import Pedido
     from django.http import JsonResponse
     from django.shortcuts import get_object_or_404
-    import json
 
-    pedido = get_object_or_404(Pedido, id=pedido_id)
     novo_status = request.POST.get("status")
     forcar = request.GET.get("forcar") == "true"
 
     if novo_status not in ["Pendente", "Pago", "Cancelado"]:
         return redirect("pedidos")
 
-    # =============================
-    # 🧮 1. Validação de estoque ao marcar como Pago
-    # =============================
-    if novo_status == "Pago" and pedido.status != "Pago":
-        estoque_insuficiente = []
+    with transaction.atomic():
+        # 🔒 Pedido travado: dois cliques (ou dois admins) não baixam o estoque duas vezes
+        pedido = get_object_or_404(Pedido.objects.select_for_update(), id=pedido_id)
+        identificador = pedido.numero_pedido or pedido.id
+        itens = [item for item in pedido.itens.all() if item.produto_id]
 
-        for item in pedido.itens.all():
-            produto = item.produto
-            if not produto:
-                continue
-            if produto.quantidade < item.quantidade:
-                estoque_insuficiente.append({
-                    "produto": produto.nome,
-                    "disponivel": produto.quantidade,
-                    "necessario": item.quantidade
+        # =============================
+        # 🧮 1. Baixa ao marcar como Pago (valida e baixa com os produtos travados)
+        # =============================
+        if novo_status == "Pago" and pedido.status != "Pago":
+            try:
+                # 🔹 A reserva do pedido vira a baixa; se faltar estoque, volta a valer
+                with transaction.atomic():
+                    liberar_reservas(pedido.reservas.all())
+                    movimentar(
+                        [(item.produto_id, item.quantidade, f"Baixa automática por pagamento do pedido {identificador}")
+                         for item in itens],
+                        "saida",
+                        limitar_a_zero=forcar,  # ✅ forçado: estoque não pode ficar negativo
+                    )
+            except EstoqueInsuficiente as exc:
+                # 🚫 Retorna JSON se não houver estoque e não for confirmado ainda
+                return JsonResponse({
+                    "erro_estoque": True,
+                    "mensagem": "Estoque insuficiente para alguns produtos.",
+                    "detalhes": [
+                        {"produto": falta["produto"], "disponivel": falta["disponivel"], "necessario": falta["necessario"]}
+                        for falta in exc.faltas
+                    ],
                 })
 
-        # 🚫 Retorna JSON se não houver estoque e não for confirmado ainda
-        if estoque_insuficiente and not forcar:
-            return JsonResponse({
-                "erro_estoque": True,
-                "mensagem": "Estoque insuficiente para alguns produtos.",
-                "detalhes": estoque_insuficiente,
-            })
-
-        # ✅ Força atualização (estoque não pode ficar negativo)
-        for item in pedido.itens.all():
-            produto = item.produto
-            if not produto:
-                continue
-
-            if produto.quantidade < item.quantidade:
-                produto.quantidade = 0
-            else:
-                produto.quantidade -= item.quantidade
-            produto.save()
-
-            # Cria movimentação de saída
-            MovimentacaoEstoque.objects.create(
-                produto=produto,
-                tipo="saida",
-                quantidade=min(item.quantidade, item.produto.quantidade + item.quantidade),
-                estoque_final=produto.quantidade,
-                observacao=f"Baixa automática por pagamento do pedido {pedido.numero_pedido or pedido.id}"
-            )
-
-    # =============================
-    # 🔁 2. Retorna estoque ao cancelar um pedido já pago
-    # =============================
-    if pedido.status == "Pago" and novo_status == "Cancelado":
-        for item in pedido.itens.all():
-            produto = item.produto
-            if not produto:
-                continue
-
-            produto.quantidade += item.quantidade
-            produto.save()
-
-            MovimentacaoEstoque.objects.create(
-                produto=produto,
-                tipo="entrada",
-                quantidade=item.quantidade,
-                estoque_final=produto.quantidade,
-                observacao=f"Estoque devolvido por cancelamento do pedido {pedido.numero_pedido or pedido.id}"
+        # =============================
+        # 🔁 2. Retorna estoque ao cancelar um pedido já pago (ou só solta a reserva)
+        # =============================
+        if novo_status == "Cancelado":
+            liberar_reservas(pedido.reservas.all())
+        if pedido.status == "Pago" and novo_status == "Cancelado":
+            movimentar(
+                [(item.produto_id, item.quantidade, f"Estoque devolvido por cancelamento do pedido {identificador}")
+                 for item in itens],
+                "entrada",
             )
 
-    # =============================
-    # 🔄 3. Atualiza status do pedido
-    # =============================
-    pedido.status = novo_status
-    pedido.save()
+        # =============================
+        # 🔄 3. Atualiza status do pedido
+        # =============================
+        pedido.status = novo_status
+        pedido.save()
 
     return redirect("pedidos")
 
@@ -1357,10 +1181,12 @@ def atualizar_status_pedidos_lote(request):
     - Verifica estoque ao marcar como Pago.
     - Permite confirmação forçada (?forcar=true).
     - Ao cancelar pedidos pagos, devolve estoque e registra movimentação.
+    - Pago ou Cancelado libera as reservas feitas no checkout.
     """
-    from .models import Pedido, MovimentacaoEstoque
+    from collections import Counter, defaultdict
+    from django.db.models import Prefetch
     from django.http import JsonResponse
-    import json
+    from .models import Pedido, ReservaEstoque, ResumoFinanceiroDiario, dia_do_pedido
 
     pedido_ids = request.POST.getlist("pedidos")
     novo_status = request.POST.get("status")
@@ -1372,80 +1198,83 @@ def atualizar_status_pedidos_lote(request):
     if novo_status not in ["Pendente", "Pago", "Cancelado"]:
         return redirect("pedidos")
 
-    pedidos = Pedido.objects.filter(id__in=pedido_ids)
-    estoque_insuficiente = []
+    with transaction.atomic():
+        # 🔒 Pedidos travados até o fim: outro lote com os mesmos pedidos espera.
+        # Itens de todos os pedidos numa consulta só.
+        pedidos = list(
+            Pedido.objects.select_for_update()
+            .filter(id__in=pedido_ids)
+            .order_by("pk")
+            .prefetch_related(Prefetch(
+                "itens",
+                queryset=PedidoItem.objects.filter(produto__isnull=False).only("pedido_id", "produto_id", "quantidade"),
+            ))
+        )
 
-    # =============================
-    # 🧮 1. Verifica estoques ao marcar como Pago
-    # =============================
-    if novo_status == "Pago":
+        baixas, devolucoes = [], []
+        pedidos_por_produto = defaultdict(list)
         for pedido in pedidos:
-            for item in pedido.itens.all():
-                produto = item.produto
-                if not produto:
-                    continue
-                if produto.quantidade < item.quantidade:
-                    estoque_insuficiente.append({
-                        "pedido": pedido.numero_pedido or pedido.id,
-                        "produto": produto.nome,
-                        "disponivel": produto.quantidade,
-                        "necessario": item.quantidade
-                    })
-
-        # 🚫 Caso tenha falta e ainda não confirmou
-        if estoque_insuficiente and not forcar:
+            identificador = pedido.numero_pedido or pedido.id
+
+            # 🔻 Indo para Pago → baixa estoque
+            if novo_status == "Pago" and pedido.status != "Pago":
+                for item in pedido.itens.all():
+                    baixas.append((item.produto_id, item.quantidade,
+                                   f"Baixa automática por pagamento do pedido {identificador}"))
+                    pedidos_por_produto[item.produto_id].append(str(identificador))
+
+            # 🔁 De Pago → Cancelado → devolve estoque
+            if pedido.status == "Pago" and novo_status == "Cancelado":
+                devolucoes.extend(
+                    (item.produto_id, item.quantidade,
+                     f"Estoque devolvido por cancelamento do pedido {identificador}")
+                    for item in pedido.itens.all()
+                )
+
+        # =============================
+        # 🧮 Verifica e baixa numa passada: a necessidade de cada produto é
+        # somada no lote inteiro, com os produtos travados
+        # =============================
+        try:
+            # 🔹 As reservas dos pedidos viram a baixa; se faltar estoque, voltam a valer
+            with transaction.atomic():
+                if novo_status in ("Pago", "Cancelado"):
+                    liberar_reservas(ReservaEstoque.objects.filter(
+                        pedido__in=[pedido.pk for pedido in pedidos if pedido.status != novo_status]
+                    ))
+                movimentar(baixas, "saida", limitar_a_zero=forcar)
+        except EstoqueInsuficiente as exc:
+            # 🚫 Falta estoque e ainda não confirmou: nada foi alterado
             return JsonResponse({
                 "erro_estoque": True,
                 "mensagem": "Estoque insuficiente em um ou mais pedidos.",
-                "detalhes": estoque_insuficiente,
+                "detalhes": [
+                    {"pedido": ", ".join(pedidos_por_produto[falta["produto_id"]]), "produto": falta["produto"],
+                     "disponivel": falta["disponivel"], "necessario": falta["necessario"]}
+                    for falta in exc.faltas
+                ],
             })
-
-    # =============================
-    # 🔄 2. Aplica atualização (baixa ou devolução)
-    # =============================
-    for pedido in pedidos:
-        # 🔻 Caso esteja indo para Pago → baixa estoque
-        if novo_status == "Pago" and pedido.status != "Pago":
-            for item in pedido.itens.all():
-                produto = item.produto
-                if not produto:
-                    continue
-
-                if produto.quantidade < item.quantidade:
-                    produto.quantidade = 0
-                else:
-                    produto.quantidade -= item.quantidade
-                produto.save()
-
-                MovimentacaoEstoque.objects.create(
-                    produto=produto,
-                    tipo="saida",
-                    quantidade=min(item.quantidade, item.produto.quantidade + item.quantidade),
-                    estoque_final=produto.quantidade,
-                    observacao=f"Baixa automática por pagamento do pedido {pedido.numero_pedido or pedido.id}"
-                )
-
-        # 🔁 Caso esteja indo de Pago → Cancelado → devolve estoque
-        if pedido.status == "Pago" and novo_status == "Cancelado":
-            for item in pedido.itens.all():
-                produto = item.produto
-                if not produto:
-                    continue
-
-                produto.quantidade += item.quantidade
-                produto.save()
-
-                MovimentacaoEstoque.objects.create(
-                    produto=produto,
-                    tipo="entrada",
-                    quantidade=item.quantidade,
-                    estoque_final=produto.quantidade,
-                    observacao=f"Estoque devolvido por cancelamento do pedido {pedido.numero_pedido or pedido.id}"
-                )
-
-        # 🔸 Atualiza status normalmente
-        pedido.status = novo_status
-        pedido.save()
+        movimentar(devolucoes, "entrada")
+
+        # =============================
+        # 🔸 Status de todos num UPDATE; o resumo financeiro recalcula os dias
+        # que tinham ou passam a ter pedido pago (o que o Pedido.save() faria)
+        # =============================
+        alterados = [pedido for pedido in pedidos if pedido.status != novo_status]
+        Pedido.objects.filter(pk__in=[pedido.pk for pedido in alterados]).update(
+            status=novo_status, atualizado_em=timezone.now()
+        )
+        ContagemPedidoStatus.aplicar_deltas({
+            novo_status: len(alterados),
+            **{status: -qtd for status, qtd in Counter(pedido.status for pedido in alterados).items()},
+        })
+        invalidar_painel()  # contagem por status e últimos pedidos
+        invalidar_relatorios(Pedido)
+        ResumoFinanceiroDiario.atualizar_dias({
+            dia_do_pedido(pedido.data_criacao)
+            for pedido in alterados
+            if "Pago" in (pedido.status, novo_status)
+        })
 
     return redirect("pedidos")
 
@@ -1494,27 +1323,6 @@ def _agregar_vendas_mes_atual_por_dia(queryset):
     
     return labels, valores
 
-def _contagem_pedidos_por_status(queryset):
-    """Conta pedidos por status"""
-    from django.db.models import Count
-    
-    status_counts = (
-        queryset
-        .values('status')
-        .annotate(count=Count('status'))
-        .order_by('status')
-    )
-    
-    labels = []
-    values = []
-    
-    for item in status_counts:
-        labels.append(item['status'])
-        values.append(item['count'])
-    
-    return labels, values
-
-
 
 @login_required
 def meus_pedidos(request):
@@ -1582,7 +1390,7 @@ def listar_feedbacks(request):
     from django.core.paginator import Paginator
     from datetime import datetime, timedelta
 
-    feedbacks = Feedback.objects.select_related("usuario", "produto").order_by("-data_criacao")
+    feedbacks = Feedback.objects.select_related("usuario", "produto")
 
     # 🔹 Filtros via GET
     usuario = request.GET.get("usuario", "")
@@ -1624,15 +1432,13 @@ def listar_feedbacks(request):
     except ValueError:
         pass
 
-    # 🔹 Paginação
-    paginator = Paginator(feedbacks, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # 🔹 Paginação por cursor (data_criacao, id)
+    page_obj = paginar_por_cursor(request, feedbacks, 10, ordenacao=("-data_criacao", "-id"), contagem="aproximada")
 
     # 🔹 Mantém filtros nos links de paginação
     filtro_params = request.GET.copy()
-    if "page" in filtro_params:
-        filtro_params.pop("page")
+    for chave in ("page", "depois", "antes"):
+        filtro_params.pop(chave, None)
     filtro_params = filtro_params.urlencode()
 
     context = {
@@ -1678,13 +1484,20 @@ def atualizar_feedbacks_lote(request):
 
     feedbacks = Feedback.objects.filter(id__in=feedback_ids)
 
+    if visibilidade not in ("visivel", "oculto"):
+        messages.error(request, "Ação inválida.")
+        return redirect("listar_feedbacks")
+
+    with transaction.atomic():
+        # update() não passa pelo save() → recalcula o resumo dos produtos afetados
+        produto_ids = set(feedbacks.exclude(produto=None).values_list("produto_id", flat=True))
+        alterados = feedbacks.update(visivel=(visibilidade == "visivel"), data_atualizacao=timezone.now())
+        invalidar_relatorios(Feedback)
+        Produto.recalcular_avaliacoes(produto_ids)
+
     if visibilidade == "visivel":
-        feedbacks.update(visivel=True)
-        messages.success(request, f"{feedbacks.count()} feedback(s) marcados como visíveis.")
-    elif visibilidade == "oculto":
-        feedbacks.update(visivel=False)
-        messages.success(request, f"{feedbacks.count()} feedback(s) marcados como ocultos.")
+        messages.success(request, f"{alterados} feedback(s) marcados como visíveis.")
     else:
-        messages.error(request, "Ação inválida.")
+        messages.success(request, f"{alterados} feedback(s) marcados como ocultos.")
 
     return redirect("listar_feedbacks")
@@ -3,22 +3,30 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Sum
+from django.db.models import Sum, F
 from django.utils.timezone import localtime
 from django.db import models
-from .models import Produto, CustoProduto, Pedido, PedidoItem, Despesa, Produto, MovimentacaoEstoque,LancamentoFinanceiro, Feedback, HistoricoCusto
+from .models import Produto, CustoProduto, Pedido, PedidoItem, Despesa, Produto, MovimentacaoEstoque,LancamentoFinanceiro, Feedback, HistoricoCusto, ExportacaoRelatorio
 from .forms import DespesaForm
 from datetime import datetime, time
 from dateutil.relativedelta import relativedelta
-import weasyprint
-from django.http import HttpResponse
-from django.template.loader import render_to_string
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.db.models.functions import TruncMonth
 from django.utils import timezone
 import locale
 from django.utils.dateparse import parse_date
 from decimal import Decimal, InvalidOperation
 from django.core.paginator import Paginator
+from .paginacao import paginar_por_cursor
+from .exportacao import invalidar_relatorios, preparar_exportacao, solicitar_exportacao, registrar_acesso
+from .exportacao_planilha import PLANILHAS, resposta_csv, resposta_xlsx
+from .relatorios import RELATORIOS, RELATORIO_LANCAMENTOS
+from .financeiro import (
+    ZERO, custo_por_pedido, ler_resumo_por_dia, agrupar_por_mes, totalizar, calcular_lucro,
+)
 
 # Defina o locale para português (Windows pode precisar de 'pt_BR')
 try:
@@ -36,10 +44,20 @@ def admin_required(user):
 def gestao_index(request):
     return render(request, "loja/gestao/index.html")
 
+def _formatar_data_mov(data):
+    return localtime(data).strftime("%d/%m/%Y %H:%M") if data else "-"
+
 @login_required
 @user_passes_test(admin_required)
 def gestao_estoque(request):
-    produtos = Produto.objects.all().order_by("nome")
+    # 🔹 Última movimentação de cada produto numa única consulta (índice produto+data)
+    ultima_data = (
+        MovimentacaoEstoque.objects
+        .filter(produto=models.OuterRef("pk"))
+        .order_by("-data")
+        .values("data")[:1]
+    )
+    produtos = Produto.objects.annotate(ultima_mov_data=models.Subquery(ultima_data)).order_by("nome")
     modo_edicao = request.GET.get("modo") == "editar"
 
     # 🔍 --- BUSCA POR NOME ---
@@ -62,24 +80,28 @@ def gestao_estoque(request):
     # 🔄 --- ATUALIZAÇÃO DE LIMITES ---
     if request.method == "POST":
         atualizados = []
+        alterados = []
+        agora = timezone.now()
         for produto in produtos:
             minimo = request.POST.get(f"minimo_{produto.id}")
             ideal = request.POST.get(f"ideal_{produto.id}")
             if minimo and ideal:
                 produto.minimo_estoque = int(minimo)
                 produto.ideal_estoque = int(ideal)
-                produto.save()
-
-                ultima_mov_produto = MovimentacaoEstoque.objects.filter(produto=produto).order_by("-data").first()
-                data_mov = localtime(ultima_mov_produto.data).strftime("%d/%m/%Y %H:%M") if ultima_mov_produto else "-"
+                produto.atualizado_em = agora
+                alterados.append(produto)
 
                 atualizados.append({
                     "id": produto.id,
                     "minimo": produto.minimo_estoque,
                     "ideal": produto.ideal_estoque,
-                    "ultima_atualizacao": data_mov,
+                    "ultima_atualizacao": _formatar_data_mov(produto.ultima_mov_data),
                 })
 
+        # Só os limites mudam: um UPDATE em lote em vez de um save() por produto
+        Produto.objects.bulk_update(alterados, ["minimo_estoque", "ideal_estoque", "atualizado_em"], batch_size=500)
+        invalidar_relatorios(Produto)
+
         if request.headers.get("X-Requested-With") == "XMLHttpRequest":
             return JsonResponse({"success": True, "atualizados": atualizados})
 
@@ -112,8 +134,7 @@ def gestao_estoque(request):
         else:
             cor = "bg-warning text-dark"  # amarelo
 
-        ultima_mov_produto = MovimentacaoEstoque.objects.filter(produto=produto).order_by("-data").first()
-        data_mov = localtime(ultima_mov_produto.data).strftime("%d/%m/%Y %H:%M") if ultima_mov_produto else "-"
+        data_mov = _formatar_data_mov(produto.ultima_mov_data)
 
         tabela_produtos.append({
             "id": produto.id,
@@ -279,19 +300,21 @@ def financeiro_pedidos(request):
     if dt_fim:
         pedidos = pedidos.filter(data_criacao__lte=dt_fim)
 
+    # 🔹 Custo de todos os pedidos do período numa única consulta agrupada
+    custos = custo_por_pedido(pedidos)
+
     pedidos_data = []
     for p in pedidos:
-        receita = float(p.total or 0)
-        itens = PedidoItem.objects.filter(pedido=p)
-        custo_total = sum(float(item.custo_unitario) * item.quantidade for item in itens)
+        receita = p.total or ZERO
+        custo_total = custos.get(p.id, ZERO)
         lucro = receita - custo_total
         pedidos_data.append({
             "numero": p.numero_pedido or p.id,
             "cliente": getattr(p.cliente, "username", "-"),
             "data": p.data_criacao.strftime("%d/%m/%Y") if p.data_criacao else "-",
             "receita": receita,
-            "custo": float(custo_total),
-            "lucro": float(lucro),
+            "custo": custo_total,
+            "lucro": lucro,
         })
 
     context = {
@@ -306,7 +329,6 @@ def financeiro_pedidos(request):
 def financeiro_resumo(request):
     from datetime import datetime, timedelta, time
     from django.utils.dateparse import parse_date
-    from collections import defaultdict
     from calendar import monthrange
 
     today = datetime.today()
@@ -338,86 +360,39 @@ def financeiro_resumo(request):
 
     di = parse_date(data_inicio_str)
     df = parse_date(data_fim_str)
-    dt_inicio = datetime.combine(di, time.min) if di else None
-    dt_fim = datetime.combine(df, time.max) if df else None
 
-    # 🔹 QuerySets
-    pedidos = Pedido.objects.filter(status="Pago")
-    if dt_inicio:
-        pedidos = pedidos.filter(data_criacao__gte=dt_inicio)
-    if dt_fim:
-        pedidos = pedidos.filter(data_criacao__lte=dt_fim)
-
-    despesas = Despesa.objects.all()
-    if di:
-        despesas = despesas.filter(data__gte=di)
-    if df:
-        despesas = despesas.filter(data__lte=df)
+    # 🔹 Receita, custo e despesas por dia, lidos do resumo diário materializado
+    resumo_dias = ler_resumo_por_dia(di, df)
+    resumo_meses = agrupar_por_mes(resumo_dias)
 
     # 🔹 Indicadores
-    receita_total = float(pedidos.aggregate(total=Sum("total"))["total"] or 0)
-
-    custo_total = sum(
-        float(item.custo_unitario) * item.quantidade
-        for item in PedidoItem.objects.filter(pedido__in=pedidos)
-    )
-
-    despesas_fixas_valor = float(despesas.filter(tipo="Fixo").aggregate(total=Sum("valor"))["total"] or 0)
-    despesas_variaveis_valor = float(despesas.filter(tipo="Variável").aggregate(total=Sum("valor"))["total"] or 0)
-    lucro_liquido = receita_total - custo_total - despesas_fixas_valor - despesas_variaveis_valor
-
-    # 🔹 Gráficos (resumido do que você já tinha)
-    receitas_por_mes, despesas_por_mes, custos_por_mes = defaultdict(float), defaultdict(float), defaultdict(float)
-    for p in pedidos:
-        if p.data_criacao:
-            mes_label = p.data_criacao.strftime("%b/%y").capitalize()
-            receitas_por_mes[mes_label] += float(p.total or 0)
-            for it in p.itens.all():
-                custos_por_mes[mes_label] += float(it.custo_unitario) * it.quantidade
-    for d in despesas:
-        if d.data:
-            mes_label = d.data.strftime("%b/%y").capitalize()
-            despesas_por_mes[mes_label] += float(d.valor or 0)
-
-    meses = sorted(set(receitas_por_mes.keys()) | set(despesas_por_mes.keys()) | set(custos_por_mes.keys()))
-    receitas_grafico = [receitas_por_mes[m] for m in meses]
-    despesas_grafico = [despesas_por_mes[m] + custos_por_mes[m] for m in meses]
-
-    if len(meses) == 1:
-        lucro_por_dia = defaultdict(float)
-        dias, mes_ano = set(), None
-        for p in pedidos:
-            dia = p.data_criacao.strftime("%d")
-            custo_p = sum(float(it.custo_unitario) * it.quantidade for it in p.itens.all())
-            despesa_dia = float(despesas.filter(data=p.data_criacao.date()).aggregate(total=Sum("valor"))["total"] or 0)
-            lucro_por_dia[dia] += float(p.total or 0) - custo_p - despesa_dia
-            dias.add(dia)
-            if not mes_ano:
-                mes_ano = p.data_criacao.strftime("%Y-%m")
-        if not mes_ano:
-            mes_ano = di.strftime("%Y-%m") if di else today.strftime("%Y-%m")
-        ano, mes = map(int, mes_ano.split("-"))
-        num_dias = monthrange(ano, mes)[1]
-        labels_lucro = [f"{str(d).zfill(2)}" for d in range(1, num_dias + 1)]
-        dados_lucro = [lucro_por_dia[l] if l in lucro_por_dia else 0 for l in labels_lucro]
+    totais = totalizar(resumo_dias.values())
+    receita_total = totais["receita"]
+    custo_total = totais["custo"]
+    despesas_fixas_valor = totais["despesas_fixas"]
+    despesas_variaveis_valor = totais["despesas_variaveis"]
+    lucro_liquido = calcular_lucro(totais)
+
+    # 🔹 Gráficos (montados em memória a partir do resumo)
+    chaves_meses = sorted(resumo_meses)
+    meses = [m.strftime("%b/%y").capitalize() for m in chaves_meses]
+    receitas_grafico = [float(resumo_meses[m]["receita"]) for m in chaves_meses]
+    despesas_grafico = [
+        float(resumo_meses[m]["despesas_fixas"] + resumo_meses[m]["despesas_variaveis"] + resumo_meses[m]["custo"])
+        for m in chaves_meses
+    ]
+
+    if len(chaves_meses) == 1:
+        mes_ref = chaves_meses[0]
+        num_dias = monthrange(mes_ref.year, mes_ref.month)[1]
+        labels_lucro = [str(d).zfill(2) for d in range(1, num_dias + 1)]
+        dados_lucro = [
+            float(calcular_lucro(resumo_dias[dia])) if dia in resumo_dias else 0
+            for dia in (mes_ref.replace(day=d) for d in range(1, num_dias + 1))
+        ]
     else:
-        lucro_por_mes = defaultdict(float)
-        pedidos_por_mes = defaultdict(list)
-        for p in pedidos:
-            chave = p.data_criacao.strftime("%Y-%m")
-            pedidos_por_mes[chave].append(p)
-        despesas_por_mes_calc = defaultdict(float)
-        for d in despesas:
-            chave = d.data.strftime("%Y-%m")
-            despesas_por_mes_calc[chave] += float(d.valor or 0)
-        todos_meses = sorted(set(pedidos_por_mes.keys()) | set(despesas_por_mes_calc.keys()))
-        for chave in todos_meses:
-            receita = sum(float(p.total or 0) for p in pedidos_por_mes.get(chave, []))
-            custo_mes = sum(float(it.custo_unitario) * it.quantidade for p in pedidos_por_mes.get(chave, []) for it in p.itens.all())
-            despesas_mes_valor = despesas_por_mes_calc.get(chave, 0.0)
-            lucro_por_mes[chave] = receita - custo_mes - despesas_mes_valor
-        labels_lucro = [datetime.strptime(ch, "%Y-%m").strftime("%b/%y").capitalize() for ch in todos_meses]
-        dados_lucro = [lucro_por_mes[ch] for ch in todos_meses]
+        labels_lucro = meses
+        dados_lucro = [float(calcular_lucro(resumo_meses[m])) for m in chaves_meses]
 
     context = {
         "receita_total": receita_total,
@@ -442,7 +417,7 @@ def gestao_despesas(request):
     from datetime import datetime, timedelta
     from django.db.models import Q
 
-    despesas = Despesa.objects.all().order_by("-data")
+    despesas = Despesa.objects.all()
 
     # 🔹 Filtros GET
     q = request.GET.get("q", "")
@@ -477,15 +452,13 @@ def gestao_despesas(request):
     if valor_max:
         despesas = despesas.filter(valor__lte=valor_max)
 
-    # 🔹 Paginação
-    paginator = Paginator(despesas, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # 🔹 Paginação por cursor (data, id)
+    page_obj = paginar_por_cursor(request, despesas, 10, ordenacao=("-data", "-id"), contagem="aproximada")
 
     # 🔹 Mantém filtros nos links da paginação
     filtro_params = request.GET.copy()
-    if "page" in filtro_params:
-        filtro_params.pop("page")
+    for chave in ("page", "depois", "antes"):
+        filtro_params.pop(chave, None)
     filtro_params = filtro_params.urlencode()
 
     context = {
@@ -576,143 +549,18 @@ def relatorio_avancado(request):
 
     context = {"tipo": tipo}
 
-    # -----------------
-    # PRODUTOS
-    # -----------------
+    # 🔹 Mesmas consultas das telas de cada relatório (loja/relatorios.py);
+    # aqui "financeiro" são os lançamentos avulsos
     if tipo == "produtos":
-        produtos = Produto.objects.all()
-
-        if nome := request.GET.get("nome"):
-            produtos = produtos.filter(nome__icontains=nome)
-
-        if preco_min := request.GET.get("preco_min"):
-            produtos = produtos.filter(preco__gte=preco_min)
-        if preco_max := request.GET.get("preco_max"):
-            produtos = produtos.filter(preco__lte=preco_max)
-
-        if qtd_min := request.GET.get("qtd_min"):
-            produtos = produtos.filter(quantidade__gte=qtd_min)
-        if qtd_max := request.GET.get("qtd_max"):
-            produtos = produtos.filter(quantidade__lte=qtd_max)
-
-        if status := request.GET.get("status_estoque"):
-            if status == "minimo":
-                produtos = produtos.filter(quantidade__lte=models.F("minimo_estoque"))
-            elif status == "ideal":
-                produtos = produtos.filter(
-                    quantidade__gt=models.F("minimo_estoque"),
-                    quantidade__lte=models.F("ideal_estoque")
-                )
-            elif status == "bom":
-                produtos = produtos.filter(quantidade__gt=models.F("ideal_estoque"))
-
-        if ordenar := request.GET.get("ordenar_por"):
-            if ordenar == "nome":
-                produtos = produtos.order_by("nome")
-            elif ordenar == "preco":
-                produtos = produtos.order_by("preco")
-            elif ordenar == "quantidade":
-                produtos = produtos.order_by("quantidade")
-            elif ordenar == "recente":
-                produtos = produtos.order_by("-id")
-
-        context["produtos"] = produtos
-
-    # -----------------
-    # PEDIDOS
-    # -----------------
+        context["produtos"] = RELATORIOS["produtos"].queryset(request.GET)
     elif tipo == "pedidos":
-        pedidos = Pedido.objects.all()
-
-        if numero := request.GET.get("numero"):
-            pedidos = pedidos.filter(numero_pedido__icontains=numero)
-
-        if cliente := request.GET.get("cliente"):
-            pedidos = pedidos.filter(cliente__username__icontains=cliente)
-
-        if status := request.GET.get("status"):
-            pedidos = pedidos.filter(status=status)
-
-        if valor_min := request.GET.get("valor_min"):
-            pedidos = pedidos.filter(total__gte=valor_min)
-        if valor_max := request.GET.get("valor_max"):
-            pedidos = pedidos.filter(total__lte=valor_max)
-
-        if data_inicio := request.GET.get("data_inicio"):
-            pedidos = pedidos.filter(data_criacao__gte=parse_date(data_inicio))
-        if data_fim := request.GET.get("data_fim"):
-            pedidos = pedidos.filter(data_criacao__lte=parse_date(data_fim))
-
-        context["pedidos"] = pedidos
-
-    # -----------------
-    # ESTOQUE
-    # -----------------
+        context["pedidos"] = RELATORIOS["pedidos"].queryset(request.GET)
     elif tipo == "estoque":
-        movs = MovimentacaoEstoque.objects.select_related("produto").all()
-
-        if produto := request.GET.get("produto"):
-            movs = movs.filter(produto__nome__icontains=produto)
-
-        if tipo_mov := request.GET.get("tipo"):
-            movs = movs.filter(tipo=tipo_mov)
-
-        if qtd_min := request.GET.get("qtd_min"):
-            movs = movs.filter(quantidade__gte=qtd_min)
-        if qtd_max := request.GET.get("qtd_max"):
-            movs = movs.filter(quantidade__lte=qtd_max)
-
-        if data_inicio := request.GET.get("data_inicio"):
-            movs = movs.filter(data__gte=parse_date(data_inicio))
-        if data_fim := request.GET.get("data_fim"):
-            movs = movs.filter(data__lte=parse_date(data_fim))
-
-        context["movs"] = movs
-
-    # -----------------
-    # FINANCEIRO
-    # -----------------
+        context["movs"] = RELATORIOS["estoque"].queryset(request.GET)
     elif tipo == "financeiro":
-        lancamentos = LancamentoFinanceiro.objects.all()
-
-        if tipo_l := request.GET.get("tipo_lancamento"):
-            lancamentos = lancamentos.filter(tipo=tipo_l)
-
-        if categoria := request.GET.get("categoria"):
-            lancamentos = lancamentos.filter(categoria__icontains=categoria)
-
-        if valor_min := request.GET.get("valor_min"):
-            lancamentos = lancamentos.filter(valor__gte=valor_min)
-        if valor_max := request.GET.get("valor_max"):
-            lancamentos = lancamentos.filter(valor__lte=valor_max)
-
-        if data_inicio := request.GET.get("data_inicio"):
-            lancamentos = lancamentos.filter(data__gte=parse_date(data_inicio))
-        if data_fim := request.GET.get("data_fim"):
-            lancamentos = lancamentos.filter(data__lte=parse_date(data_fim))
-
-        context["lancamentos"] = lancamentos
-
-    # -----------------
-    # FEEDBACKS
-    # -----------------
+        context["lancamentos"] = RELATORIO_LANCAMENTOS.queryset(request.GET)
     elif tipo == "feedbacks":
-        feedbacks = Feedback.objects.select_related("usuario", "produto").all()
-
-        if produto := request.GET.get("produto"):
-            feedbacks = feedbacks.filter(produto__nome__icontains=produto)
-
-        if usuario := request.GET.get("usuario"):
-            feedbacks = feedbacks.filter(usuario__username__icontains=usuario)
-
-        if nota := request.GET.get("nota"):
-            feedbacks = feedbacks.filter(nota=nota)
-
-        if visivel := request.GET.get("visivel"):
-            if visivel in ["True", "False"]:
-                feedbacks = feedbacks.filter(visivel=(visivel == "True"))
-
-        context["feedbacks"] = feedbacks
+        context["feedbacks"] = RELATORIOS["feedbacks"].queryset(request.GET)
 
     return render(request, "loja/gestao/relatorio_avancado.html", context)
 
@@ -722,58 +570,15 @@ def relatorio_produtos(request):
     """
     Relatório de Produtos – lista com filtros, ordenação e paginação.
     """
-    produtos = Produto.objects.all()
+    relatorio = RELATORIOS["produtos"]
 
     # --------------------------
-    # FILTROS
+    # PAGINAÇÃO (ordenação escolhida; o id desempata para o cursor)
     # --------------------------
-    nome = request.GET.get("nome")
-    preco_min = request.GET.get("preco_min")
-    preco_max = request.GET.get("preco_max")
-    qtd_min = request.GET.get("qtd_min")
-    qtd_max = request.GET.get("qtd_max")
-    status_estoque = request.GET.get("status_estoque")
-    ordenar_por = request.GET.get("ordenar_por")
-
-    if nome:
-        produtos = produtos.filter(nome__icontains=nome)
-    if preco_min:
-        produtos = produtos.filter(preco__gte=preco_min)
-    if preco_max:
-        produtos = produtos.filter(preco__lte=preco_max)
-    if qtd_min:
-        produtos = produtos.filter(quantidade__gte=qtd_min)
-    if qtd_max:
-        produtos = produtos.filter(quantidade__lte=qtd_max)
-
-    if status_estoque == "minimo":
-        produtos = produtos.filter(quantidade__lte=models.F("minimo_estoque"))
-    elif status_estoque == "ideal":
-        produtos = produtos.filter(
-            quantidade__gt=models.F("minimo_estoque"),
-            quantidade__lte=models.F("ideal_estoque"),
-        )
-    elif status_estoque == "bom":
-        produtos = produtos.filter(quantidade__gt=models.F("ideal_estoque"))
-
-    # --------------------------
-    # ORDENAÇÃO
-    # --------------------------
-    if ordenar_por == "nome":
-        produtos = produtos.order_by("nome")
-    elif ordenar_por == "preco":
-        produtos = produtos.order_by("preco")
-    elif ordenar_por == "quantidade":
-        produtos = produtos.order_by("quantidade")
-    elif ordenar_por == "recente":
-        produtos = produtos.order_by("-id")
-
-    # --------------------------
-    # PAGINAÇÃO
-    # --------------------------
-    paginator = Paginator(produtos, 10)  # 10 produtos por página
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar_por_cursor(
+        request, relatorio.queryset(request.GET), 10,
+        ordenacao=relatorio.ordenacao(request.GET), contagem="aproximada",
+    )
 
     context = {
         "page_obj": page_obj,
@@ -788,58 +593,9 @@ def relatorio_produtos(request):
 def relatorio_produtos_pdf(request):
     """
     Exporta o Relatório de Produtos para PDF, aplicando os mesmos filtros da tela.
+    Gerado em segundo plano (ver loja/exportacao.py).
     """
-    produtos = Produto.objects.all()
-
-    # 🔹 Reaproveita a lógica dos filtros (igual a relatorio_produtos)
-    nome = request.GET.get("nome")
-    preco_min = request.GET.get("preco_min")
-    preco_max = request.GET.get("preco_max")
-    qtd_min = request.GET.get("qtd_min")
-    qtd_max = request.GET.get("qtd_max")
-    status_estoque = request.GET.get("status_estoque")
-    ordenar_por = request.GET.get("ordenar_por")
-
-    if nome:
-        produtos = produtos.filter(nome__icontains=nome)
-    if preco_min:
-        produtos = produtos.filter(preco__gte=preco_min)
-    if preco_max:
-        produtos = produtos.filter(preco__lte=preco_max)
-    if qtd_min:
-        produtos = produtos.filter(quantidade__gte=qtd_min)
-    if qtd_max:
-        produtos = produtos.filter(quantidade__lte=qtd_max)
-
-    if status_estoque == "minimo":
-        produtos = produtos.filter(quantidade__lte=models.F("minimo_estoque"))
-    elif status_estoque == "ideal":
-        produtos = produtos.filter(
-            quantidade__gt=models.F("minimo_estoque"),
-            quantidade__lte=models.F("ideal_estoque"),
-        )
-    elif status_estoque == "bom":
-        produtos = produtos.filter(quantidade__gt=models.F("ideal_estoque"))
-
-    if ordenar_por == "nome":
-        produtos = produtos.order_by("nome")
-    elif ordenar_por == "preco":
-        produtos = produtos.order_by("preco")
-    elif ordenar_por == "quantidade":
-        produtos = produtos.order_by("quantidade")
-    elif ordenar_por == "recente":
-        produtos = produtos.order_by("-id")
-
-    # 🔹 Renderiza o template PDF
-    html_string = render_to_string("loja/gestao/pdf/relatorio_produtos_pdf.html", {"produtos": produtos})
-    html = weasyprint.HTML(string=html_string)
-
-    # 🔹 Gera o PDF como resposta HTTP
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="relatorio_produtos.pdf"'
-    html.write_pdf(response)
-
-    return response
+    return _exportar_pdf(request, "produtos")
 
 @login_required
 @user_passes_test(admin_required)
@@ -848,68 +604,15 @@ def relatorio_pedidos(request):
     Relatório de Pedidos – lista com filtros, paginação e exportação.
     Inclui custo_total e ordena do mais recente para o mais antigo.
     """
-    pedidos = Pedido.objects.all().prefetch_related("itens", "cliente").order_by("-data_criacao")
-
-    # --------------------------
-    # FILTROS
-    # --------------------------
-    numero = request.GET.get("numero")
-    cliente = request.GET.get("cliente")
-    status = request.GET.get("status")
-    valor_min = request.GET.get("valor_min")
-    valor_max = request.GET.get("valor_max")
-    data_inicio_raw = request.GET.get("data_inicio")
-    data_fim_raw = request.GET.get("data_fim")
-
-    if numero:
-        pedidos = pedidos.filter(numero_pedido__icontains=numero)
-    if cliente:
-        pedidos = pedidos.filter(cliente__username__icontains=cliente)
-    if status:
-        pedidos = pedidos.filter(status=status)
-
-    # ✅ Filtro por valores
-    try:
-        if valor_min:
-            pedidos = pedidos.filter(total__gte=Decimal(valor_min))
-        if valor_max:
-            pedidos = pedidos.filter(total__lte=Decimal(valor_max))
-    except (InvalidOperation, ValueError):
-        pass
-
-    # ✅ Filtro por datas
-    if data_inicio_raw:
-        data_inicio = parse_date(data_inicio_raw)
-        if data_inicio:
-            pedidos = pedidos.filter(data_criacao__gte=datetime.combine(data_inicio, time.min))
-
-    if data_fim_raw:
-        data_fim = parse_date(data_fim_raw)
-        if data_fim:
-            pedidos = pedidos.filter(data_criacao__lte=datetime.combine(data_fim, time.max))
-
-    # --------------------------
-    # CÁLCULO DE CUSTO TOTAL
-    # --------------------------
-    pedidos_data = []
-    for p in pedidos:
-        custo_total = sum(item.quantidade * item.custo_unitario for item in p.itens.all())
-        pedidos_data.append({
-            "id": p.id,
-            "numero_pedido": p.numero_pedido,
-            "cliente": p.cliente,
-            "total": p.total,
-            "custo_total": custo_total,
-            "status": p.status,
-            "data_criacao": p.data_criacao,
-        })
+    relatorio = RELATORIOS["pedidos"]
 
     # --------------------------
-    # PAGINAÇÃO
+    # PAGINAÇÃO (cursor em data_criacao, id; custo_total vem na mesma consulta)
     # --------------------------
-    paginator = Paginator(pedidos_data, 10)  # 10 pedidos por página
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar_por_cursor(
+        request, relatorio.queryset(request.GET), 10,
+        ordenacao=relatorio.ordenacao(request.GET), contagem="aproximada",
+    )
 
     context = {
         "page_obj": page_obj,
@@ -917,79 +620,16 @@ def relatorio_pedidos(request):
         "request_get": request.GET,  # mantém filtros nos links
     }
     return render(request, "loja/gestao/relatorio_pedidos.html", context)
+
 @login_required
 @user_passes_test(admin_required)
 def relatorio_pedidos_pdf(request):
     """
     Exporta o Relatório de Pedidos para PDF, aplicando os mesmos filtros da tela.
     Inclui coluna de custo e ordena do mais recente para o mais antigo.
+    Gerado em segundo plano (ver loja/exportacao.py).
     """
-    pedidos = Pedido.objects.all().prefetch_related("itens", "cliente").order_by("-data_criacao")
-
-    # 🔎 Filtros
-    numero = request.GET.get("numero")
-    cliente = request.GET.get("cliente")
-    status = request.GET.get("status")
-    valor_min = request.GET.get("valor_min")
-    valor_max = request.GET.get("valor_max")
-    data_inicio_raw = request.GET.get("data_inicio")
-    data_fim_raw = request.GET.get("data_fim")
-
-    if numero:
-        pedidos = pedidos.filter(numero_pedido__icontains=numero)
-    if cliente:
-        pedidos = pedidos.filter(cliente__username__icontains=cliente)
-    if status:
-        pedidos = pedidos.filter(status=status)
-
-    # ✅ Filtro por valores
-    try:
-        if valor_min:
-            pedidos = pedidos.filter(total__gte=Decimal(valor_min))
-        if valor_max:
-            pedidos = pedidos.filter(total__lte=Decimal(valor_max))
-    except (InvalidOperation, ValueError):
-        pass
-
-    # ✅ Filtro por datas (corrigido p/ DateTimeField)
-    if data_inicio_raw:
-        data_inicio = parse_date(data_inicio_raw)
-        if data_inicio:
-            dt_inicio = datetime.combine(data_inicio, time.min)
-            pedidos = pedidos.filter(data_criacao__gte=dt_inicio)
-
-    if data_fim_raw:
-        data_fim = parse_date(data_fim_raw)
-        if data_fim:
-            dt_fim = datetime.combine(data_fim, time.max)
-            pedidos = pedidos.filter(data_criacao__lte=dt_fim)
-
-    # 🔹 Calcula custo_total
-    pedidos_data = []
-    for p in pedidos:
-        custo_total = sum(item.quantidade * item.custo_unitario for item in p.itens.all())
-        pedidos_data.append({
-            "id": p.id,
-            "numero_pedido": p.numero_pedido,
-            "cliente": p.cliente,
-            "total": p.total,
-            "custo_total": custo_total,
-            "status": p.status,
-            "data_criacao": p.data_criacao,
-        })
-
-    # 🔹 Renderiza template PDF
-    html_string = render_to_string(
-        "loja/gestao/pdf/relatorio_pedidos_pdf.html",
-        {"pedidos": pedidos_data}
-    )
-    html = weasyprint.HTML(string=html_string)
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="relatorio_pedidos.pdf"'
-    html.write_pdf(response)
-
-    return response
+    return _exportar_pdf(request, "pedidos")
 
 from django.utils.dateparse import parse_date
 from datetime import datetime, time
@@ -1000,37 +640,15 @@ def relatorio_estoque(request):
     """
     Relatório de Estoque – lista com filtros, paginação e exportação.
     """
-    movs = MovimentacaoEstoque.objects.select_related("produto").all().order_by("-data")
-
-    # --------------------------
-    # FILTROS
-    # --------------------------
-    produto = request.GET.get("produto")
-    tipo = request.GET.get("tipo")
-    data_inicio_raw = request.GET.get("data_inicio")
-    data_fim_raw = request.GET.get("data_fim")
-
-    if produto:
-        movs = movs.filter(produto__nome__icontains=produto)
-    if tipo:
-        movs = movs.filter(tipo=tipo)
-
-    if data_inicio_raw:
-        data_inicio = parse_date(data_inicio_raw)
-        if data_inicio:
-            movs = movs.filter(data__gte=datetime.combine(data_inicio, time.min))
-
-    if data_fim_raw:
-        data_fim = parse_date(data_fim_raw)
-        if data_fim:
-            movs = movs.filter(data__lte=datetime.combine(data_fim, time.max))
+    relatorio = RELATORIOS["estoque"]
 
     # --------------------------
     # PAGINAÇÃO
     # --------------------------
-    paginator = Paginator(movs, 40)  # 10 movimentações por página
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar_por_cursor(
+        request, relatorio.queryset(request.GET), 40,
+        ordenacao=relatorio.ordenacao(request.GET), contagem="aproximada",
+    )
 
     context = {
         "page_obj": page_obj,
@@ -1038,45 +656,15 @@ def relatorio_estoque(request):
         "request_get": request.GET,  # mantém filtros na paginação
     }
     return render(request, "loja/gestao/relatorio_estoque.html", context)
+
 @login_required
 @user_passes_test(admin_required)
 def relatorio_estoque_pdf(request):
     """
     Exporta o Relatório de Estoque para PDF, aplicando os filtros da tela.
+    Gerado em segundo plano (ver loja/exportacao.py).
     """
-    movs = MovimentacaoEstoque.objects.select_related("produto").all().order_by("-data")  # 🔹 mais recente primeiro
-
-    # Filtros
-    produto = request.GET.get("produto")
-    tipo = request.GET.get("tipo")
-    data_inicio_raw = request.GET.get("data_inicio")
-    data_fim_raw = request.GET.get("data_fim")
-
-    if produto:
-        movs = movs.filter(produto__nome__icontains=produto)
-    if tipo:
-        movs = movs.filter(tipo=tipo)
-
-    if data_inicio_raw:
-        data_inicio = parse_date(data_inicio_raw)
-        if data_inicio:
-            dt_inicio = datetime.combine(data_inicio, time.min)
-            movs = movs.filter(data__gte=dt_inicio)
-
-    if data_fim_raw:
-        data_fim = parse_date(data_fim_raw)
-        if data_fim:
-            dt_fim = datetime.combine(data_fim, time.max)
-            movs = movs.filter(data__lte=dt_fim)
-
-    html_string = render_to_string("loja/gestao/pdf/relatorio_estoque_pdf.html", {"movs": movs})
-    html = weasyprint.HTML(string=html_string)
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="relatorio_estoque.pdf"'
-    html.write_pdf(response)
-
-    return response
+    return _exportar_pdf(request, "estoque")
 
 @login_required
 @user_passes_test(admin_required)
@@ -1089,60 +677,7 @@ def relatorio_financeiro(request):
     data_fim_raw = request.GET.get("data_fim")
     ordenar_por = request.GET.get("ordenar_por")
 
-    data_inicio = parse_date(data_inicio_raw) if data_inicio_raw else None
-    data_fim = parse_date(data_fim_raw) if data_fim_raw else None
-
-    pedidos = Pedido.objects.filter(status="Pago")
-    despesas = Despesa.objects.all()
-
-    if data_inicio:
-        dt_inicio = datetime.combine(data_inicio, time.min)
-        pedidos = pedidos.filter(data_criacao__gte=dt_inicio)
-        despesas = despesas.filter(data__gte=data_inicio)
-
-    if data_fim:
-        dt_fim = datetime.combine(data_fim, time.max)
-        pedidos = pedidos.filter(data_criacao__lte=dt_fim)
-        despesas = despesas.filter(data__lte=data_fim)
-
-    # 📅 Monta estrutura diária
-    dados_diarios = defaultdict(lambda: {"receita": 0, "custo": 0, "fixa": 0, "variavel": 0})
-
-    for p in pedidos:
-        dia = p.data_criacao.date()
-        dados_diarios[dia]["receita"] += float(p.total or 0)
-        for item in p.itens.all():
-            dados_diarios[dia]["custo"] += float(item.custo_unitario) * item.quantidade
-
-    for d in despesas:
-        if d.tipo == "Fixo":
-            dados_diarios[d.data]["fixa"] += float(d.valor or 0)
-        elif d.tipo == "Variável":
-            dados_diarios[d.data]["variavel"] += float(d.valor or 0)
-
-    # Monta lista final
-    tabela = []
-    for dia, valores in dados_diarios.items():
-        receita = valores["receita"]
-        custo = valores["custo"]
-        fixa = valores["fixa"]
-        variavel = valores["variavel"]
-        lucro = receita - custo - fixa - variavel
-
-        tabela.append({
-            "data": dia,
-            "receita": receita,
-            "custo": custo,
-            "fixa": fixa,
-            "variavel": variavel,
-            "lucro": lucro,
-        })
-
-    # 🔽 Ordenação
-    if ordenar_por in ["receita", "custo", "fixa", "variavel", "lucro"]:
-        tabela = sorted(tabela, key=lambda x: x[ordenar_por], reverse=True)
-    else:
-        tabela = sorted(tabela, key=lambda x: x["data"], reverse=True)
+    tabela = RELATORIOS["financeiro"].queryset(request.GET)
 
     # 📄 Paginação
     paginator = Paginator(tabela, 10)  # 10 dias por página
@@ -1152,8 +687,8 @@ def relatorio_financeiro(request):
     context = {
         "page_obj": page_obj,
         "tabela": page_obj.object_list,
-        "data_inicio": data_inicio,
-        "data_fim": data_fim,
+        "data_inicio": parse_date(data_inicio_raw) if data_inicio_raw else None,
+        "data_fim": parse_date(data_fim_raw) if data_fim_raw else None,
         "ordenar_por": ordenar_por or "data",
         "request_get": request.GET,
     }
@@ -1164,83 +699,9 @@ def relatorio_financeiro(request):
 def relatorio_financeiro_pdf(request):
     """
     Exporta o Relatório Financeiro Diário para PDF, aplicando os filtros da tela.
+    Gerado em segundo plano (ver loja/exportacao.py).
     """
-
-    # 📌 Filtros de data (iguais ao HTML)
-    data_inicio_raw = request.GET.get("data_inicio")
-    data_fim_raw = request.GET.get("data_fim")
-
-    data_inicio = parse_date(data_inicio_raw) if data_inicio_raw else None
-    data_fim = parse_date(data_fim_raw) if data_fim_raw else None
-
-    pedidos = Pedido.objects.filter(status="Pago")
-    despesas = Despesa.objects.all()
-
-    if data_inicio:
-        dt_inicio = datetime.combine(data_inicio, time.min)
-        pedidos = pedidos.filter(data_criacao__gte=dt_inicio)
-        despesas = despesas.filter(data__gte=data_inicio)
-
-    if data_fim:
-        dt_fim = datetime.combine(data_fim, time.max)
-        pedidos = pedidos.filter(data_criacao__lte=dt_fim)
-        despesas = despesas.filter(data__lte=data_fim)
-
-    # 📅 Monta estrutura por dia
-    from collections import defaultdict
-    dados_diarios = defaultdict(lambda: {"receita": 0, "custo": 0, "fixa": 0, "variavel": 0})
-
-    for p in pedidos:
-        dia = p.data_criacao.date()
-        dados_diarios[dia]["receita"] += float(p.total or 0)
-        for item in p.itens.all():
-            dados_diarios[dia]["custo"] += float(item.custo_unitario) * item.quantidade
-
-    for d in despesas:
-        if d.tipo == "Fixo":
-            dados_diarios[d.data]["fixa"] += float(d.valor or 0)
-        elif d.tipo == "Variável":
-            dados_diarios[d.data]["variavel"] += float(d.valor or 0)
-
-    # Monta lista final
-    tabela = []
-    for dia, valores in dados_diarios.items():
-        receita = valores["receita"]
-        custo = valores["custo"]
-        fixa = valores["fixa"]
-        variavel = valores["variavel"]
-        lucro = receita - custo - fixa - variavel
-
-        tabela.append({
-            "data": dia,
-            "receita": receita,
-            "custo": custo,
-            "fixa": fixa,
-            "variavel": variavel,
-            "lucro": lucro,
-        })
-
-    # 🔽 Ordenação
-    ordenar_por = request.GET.get("ordenar_por")
-    if ordenar_por in ["receita", "custo", "fixa", "variavel", "lucro"]:
-        tabela = sorted(tabela, key=lambda x: x[ordenar_por], reverse=True)
-    else:
-        tabela = sorted(tabela, key=lambda x: x["data"], reverse=True)
-
-    # 🔹 Renderiza template PDF
-    html_string = render_to_string("loja/gestao/pdf/relatorio_financeiro_pdf.html", {
-        "tabela": tabela,
-        "data_inicio": data_inicio,
-        "data_fim": data_fim,
-        "ordenar_por": ordenar_por or "data",
-    })
-    html = weasyprint.HTML(string=html_string)
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="relatorio_financeiro.pdf"'
-    html.write_pdf(response)
-
-    return response
+    return _exportar_pdf(request, "financeiro")
 
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -1254,31 +715,15 @@ def relatorio_feedbacks(request):
     Relatório de Feedbacks – lista com filtros por produto, usuário, nota e visibilidade.
     Inclui paginação e filtros persistentes.
     """
-    feedbacks = Feedback.objects.select_related("produto", "usuario").all().order_by("-id")
-
-    # --------------------------
-    # FILTROS
-    # --------------------------
-    produto = request.GET.get("produto")
-    usuario = request.GET.get("usuario")
-    nota = request.GET.get("nota")
-    visivel = request.GET.get("visivel")
-
-    if produto:
-        feedbacks = feedbacks.filter(produto__nome__icontains=produto)
-    if usuario:
-        feedbacks = feedbacks.filter(usuario__username__icontains=usuario)
-    if nota:
-        feedbacks = feedbacks.filter(nota=nota)
-    if visivel in ["True", "False"]:
-        feedbacks = feedbacks.filter(visivel=(visivel == "True"))
+    relatorio = RELATORIOS["feedbacks"]
 
     # --------------------------
     # PAGINAÇÃO
     # --------------------------
-    paginator = Paginator(feedbacks, 10)  # 10 feedbacks por página
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar_por_cursor(
+        request, relatorio.queryset(request.GET), 10,
+        ordenacao=relatorio.ordenacao(request.GET), contagem="aproximada",
+    )
 
     context = {
         "page_obj": page_obj,
@@ -1293,30 +738,101 @@ def relatorio_feedbacks(request):
 def relatorio_feedbacks_pdf(request):
     """
     Exporta o Relatório de Feedbacks para PDF, aplicando os filtros da tela.
+    Gerado em segundo plano (ver loja/exportacao.py).
+    """
+    return _exportar_pdf(request, "feedbacks")
+
+# -------------------------------
+# 📄 EXPORTAÇÃO DE PDF EM SEGUNDO PLANO
+# -------------------------------
+
+def _exportar_pdf(request, tipo):
+    """
+    Entrega o PDF do cache se os filtros e os dados não mudaram; senão enfileira
+    a geração e devolve a página que acompanha o progresso.
+    """
+    parametros, chave = preparar_exportacao(tipo, request.GET)
+
+    # 🔹 O navegador já tem exatamente este PDF
+    nao_modificado = _nao_modificado(request, chave)
+    if nao_modificado:
+        return nao_modificado
+
+    exportacao = solicitar_exportacao(tipo, parametros, chave, request.user)
+    if exportacao.status == ExportacaoRelatorio.CONCLUIDO:
+        return _resposta_pdf(exportacao)
+
+    return render(request, "loja/gestao/exportacao_status.html", {"exportacao": exportacao})
+
+def _nao_modificado(request, chave):
+    etag = quote_etag(chave)
+    resposta = get_conditional_response(request, etag=etag)
+    if resposta is not None:
+        resposta["ETag"] = etag
+    return resposta
+
+def _resposta_pdf(exportacao):
+    registrar_acesso(exportacao)
+
+    response = FileResponse(
+        exportacao.arquivo.open("rb"),
+        content_type="application/pdf",
+        filename=exportacao.nome_arquivo,
+    )
+    # A chave já identifica o conteúdo: o navegador revalida e recebe 304
+    response["ETag"] = quote_etag(exportacao.chave)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+@user_passes_test(admin_required)
+def exportacao_status(request, pk):
+    """Consultado pela página de progresso (polling)."""
+    exportacao = get_object_or_404(ExportacaoRelatorio, pk=pk)
+
+    concluida = exportacao.status == ExportacaoRelatorio.CONCLUIDO and not exportacao.expirada
+    return JsonResponse({
+        "status": exportacao.status,
+        "progresso": exportacao.progresso,
+        "erro": exportacao.erro,
+        "url": reverse("exportacao_download", args=[exportacao.pk]) if concluida else None,
+    })
+
+@login_required
+@user_passes_test(admin_required)
+def exportacao_download(request, pk):
+    exportacao = get_object_or_404(ExportacaoRelatorio, pk=pk, status=ExportacaoRelatorio.CONCLUIDO)
+
+    nao_modificado = _nao_modificado(request, exportacao.chave)
+    if nao_modificado:
+        return nao_modificado
+
+    if exportacao.expirada or not exportacao.arquivo.storage.exists(exportacao.arquivo.name):
+        raise Http404("Exportação expirada.")
+
+    return _resposta_pdf(exportacao)
+
+# -------------------------------
+# 📊 EXPORTAÇÃO EM PLANILHA (CSV/XLSX)
+# -------------------------------
+
+@login_required
+@user_passes_test(admin_required)
+def exportar_relatorio(request, tipo):
+    """
+    Baixa o relatório com os mesmos filtros da tela: CSV por padrão (streaming)
+    ou XLSX com ?formato=xlsx.
     """
-    feedbacks = Feedback.objects.all()
-
-    # 🔹 Filtros (mesmos da view normal)
-    produto = request.GET.get("produto")
-    usuario = request.GET.get("usuario")
-    nota = request.GET.get("nota")
-    visivel = request.GET.get("visivel")
-
-    if produto:
-        feedbacks = feedbacks.filter(produto__nome__icontains=produto)
-    if usuario:
-        feedbacks = feedbacks.filter(usuario__username__icontains=usuario)
-    if nota:
-        feedbacks = feedbacks.filter(nota=nota)
-    if visivel in ["True", "False"]:
-        feedbacks = feedbacks.filter(visivel=(visivel == "True"))
-
-    # 🔹 Renderiza template PDF
-    html_string = render_to_string("loja/gestao/pdf/relatorio_feedbacks_pdf.html", {"feedbacks": feedbacks})
-    html = weasyprint.HTML(string=html_string)
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="relatorio_feedbacks.pdf"'
-    html.write_pdf(response)
-
-    return response
\ No newline at end of file
+    if tipo not in PLANILHAS:
+        raise Http404("Relatório inexistente.")
+
+    if request.GET.get("formato") == "xlsx":
+        try:
+            return resposta_xlsx(tipo, request.GET)
+        except ImportError:
+            messages.error(request, "Exportação em XLSX indisponível (instale o openpyxl). Use o CSV.")
+            params = request.GET.copy()
+            params.pop("formato", None)
+            return redirect(f"{reverse(f'relatorio_{tipo}')}?{params.urlencode()}")
+
+    return resposta_csv(tipo, request.GET)
@@ -64,6 +64,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'loja.context_processors.carrinho',
             ],
         },
     },
@@ -87,6 +88,28 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Em produção com vários processos, aponte os dois para um cache compartilhado (Redis/Memcached).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tcc-default',
+    },
+    # Respostas do autocomplete de produtos (LRU limitado por MAX_ENTRIES)
+    'autocomplete': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tcc-autocomplete',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -134,6 +157,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'  # URL pública para acessar os arquivos de mídia
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # Caminho absoluto para o diretório de mídia
 
+# Exportação de relatórios em PDF (ver loja/exportacao.py)
+EXPORTACAO_WORKERS = 2           # processos do pool; 0 gera o PDF no próprio request
+EXPORTACAO_VALIDADE = 24 * 3600  # segundos que o PDF fica em MEDIA_ROOT/relatorios/ desde o último acesso
+EXPORTACAO_CACHE_MAX_BYTES = 500 * 1024 * 1024  # acima disso, apaga os PDFs menos usados (LRU)
+EXPORTACAO_TEMPO_MAXIMO = 600    # job parado há mais tempo que isso é considerado abandonado
+
+# O ajuste de estoque em lote envia qtd_<id> e obs_<id> de todos os produtos
+# (o padrão do Django, 1000 campos, barra o formulário a partir de ~500 produtos)
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+
+# Reserva de estoque feita no checkout (ver loja/estoque.py)
+RESERVA_ESTOQUE_VALIDADE = 24 * 3600  # segundos até um pedido não pago liberar as unidades (comando liberar_reservas)
+
+# Retrato do dashboard em cache (ver loja/painel.py)
+PAINEL_VALIDADE = 60  # segundos; mudanças em pedidos, despesas e feedbacks já descartam antes
+
 # Redirecionamento automático para login se não estiver autenticado
 LOGIN_URL = 'login'
 